@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡Fast, Lightweight, Programmable, TLS interception capable
+    proxy server for Application debugging, testing and development.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import sys
+import time
+from typing import List
+
+from proxy.common.constants import __homepage__
+from proxy.common.utils import build_http_request
+from proxy.http.methods import httpMethods
+
+from benchmark.utils import get_available_port, proxy_process
+
+DEFAULT_DURATION = 5
+DEFAULT_CONCURRENCY = 200
+
+
+def init_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='Measures accepted connections per second as '
+                    'number of acceptor processes grows.  Each connection '
+                    'sends a single request to proxy.py web server and waits '
+                    'for proxy.py to close the connection.',
+        epilog='Proxy.py not working? Report at: %s/issues/new' % __homepage__
+    )
+    parser.add_argument(
+        '--workers',
+        type=str,
+        default=','.join(str(2 ** i) for i in range(
+            multiprocessing.cpu_count().bit_length())),
+        help='Comma separated list of --num-workers values to benchmark.')
+    parser.add_argument(
+        '--duration',
+        type=int,
+        default=DEFAULT_DURATION,
+        help='Default: %d.  Seconds to benchmark each configuration.' % DEFAULT_DURATION)
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help='Default: %d.  Number of concurrent connecting clients.' % DEFAULT_CONCURRENCY)
+    parser.add_argument(
+        '--threadless',
+        action='store_true',
+        help='Also pass --threadless to proxy.py.')
+    return parser
+
+
+async def connect_loop(port: int, deadline: float, counter: List[int]) -> None:
+    request = build_http_request(httpMethods.GET, b'/')
+    while time.time() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        except OSError:
+            continue
+        writer.write(request)
+        await reader.read()
+        writer.close()
+        counter[0] += 1
+
+
+async def accepts_per_sec(port: int, duration: int, concurrency: int) -> float:
+    counter = [0]
+    start = time.time()
+    await asyncio.gather(*[
+        connect_loop(port, start + duration, counter) for _ in range(concurrency)])
+    return counter[0] / (time.time() - start)
+
+
+def main(input_args: List[str]) -> None:
+    args = init_parser().parse_args(input_args)
+    print('%8s %16s %16s' % ('workers', 'shared socket', 'reuse port'))
+    for num_workers in [int(w) for w in args.workers.split(',')]:
+        rates = []
+        for reuse_port in (False, True):
+            port = get_available_port()
+            proxy_args = ['--enable-web-server', '--num-workers', str(num_workers)]
+            if args.threadless:
+                proxy_args.append('--threadless')
+            if reuse_port:
+                proxy_args.append('--reuse-port')
+            with proxy_process(port, proxy_args):
+                rates.append(asyncio.get_event_loop().run_until_complete(
+                    accepts_per_sec(port, args.duration, args.concurrency)))
+        print('%8d %12.0f/sec %12.0f/sec' % (num_workers, rates[0], rates[1]))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
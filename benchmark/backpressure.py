@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡Fast, Lightweight, Programmable, TLS interception capable
+    proxy server for Application debugging, testing and development.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import argparse
+import socket
+import sys
+import threading
+import time
+from typing import Dict, List
+
+from proxy.common.constants import __homepage__, DEFAULT_BUFFER_SIZE
+
+from benchmark.utils import get_available_port, proxy_process, process_group_pids
+
+DEFAULT_SIZE_MB = 256
+DEFAULT_CLIENT_RATE_MB = 32
+
+MODES: Dict[str, List[str]] = {
+    'unbounded': ['--high-watermark', '0'],
+    'watermarks': [],
+}
+
+
+def init_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='Downloads a large body through a CONNECT tunnel from a '
+                    'fast upstream server by a slow client, and reports peak '
+                    'resident memory of proxy.py processes.  Linux only.',
+        epilog='Proxy.py not working? Report at: %s/issues/new' % __homepage__
+    )
+    parser.add_argument(
+        '--size',
+        type=int,
+        default=DEFAULT_SIZE_MB,
+        help='Default: %d.  Size of downloaded body in MB.' % DEFAULT_SIZE_MB)
+    parser.add_argument(
+        '--client-rate',
+        type=int,
+        default=DEFAULT_CLIENT_RATE_MB,
+        help='Default: %d.  Client read rate in MB/sec.' % DEFAULT_CLIENT_RATE_MB)
+    parser.add_argument(
+        '--modes',
+        type=str,
+        default=','.join(MODES.keys()),
+        help='Comma separated list of modes to benchmark.')
+    return parser
+
+
+def serve(server: socket.socket, size: int) -> None:
+    conn, _ = server.accept()
+    chunk = b'x' * DEFAULT_BUFFER_SIZE
+    remaining = size
+    try:
+        while remaining > 0:
+            conn.sendall(chunk[:remaining])
+            remaining -= len(chunk)
+    finally:
+        conn.close()
+
+
+def rss_kb(pgid: int) -> int:
+    """Total resident memory of all processes within process group."""
+    total = 0
+    for pid in process_group_pids(pgid):
+        try:
+            with open('/proc/%d/status' % pid) as status:
+                for line in status:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+        except OSError:
+            continue
+    return total
+
+
+def download(mode: str, args: argparse.Namespace) -> Dict[str, float]:
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+    upstream_port = server.getsockname()[1]
+    size = args.size * 1024 * 1024
+    serving = threading.Thread(target=serve, args=(server, size))
+    serving.start()
+    port = get_available_port()
+    try:
+        with proxy_process(port, MODES[mode] + [
+                '--threadless', '--num-workers', '1', '--disable-splice']) as proc:
+            baseline = peak = rss_kb(proc.pid)
+            with socket.create_connection(('127.0.0.1', port)) as conn:
+                conn.sendall(
+                    b'CONNECT 127.0.0.1:%d HTTP/1.1\r\n\r\n' % upstream_port)
+                conn.recv(1024)
+                received, start = 0, time.time()
+                read_size = 64 * 1024
+                while received < size:
+                    data = conn.recv(read_size)
+                    if not data:
+                        break
+                    received += len(data)
+                    # Throttle to client rate
+                    expected = received / (args.client_rate * 1024 * 1024)
+                    delay = expected - (time.time() - start)
+                    if delay > 0:
+                        time.sleep(delay)
+                        peak = max(peak, rss_kb(proc.pid))
+                elapsed = time.time() - start
+            return {
+                'seconds': elapsed,
+                'received': received / (1024 * 1024),
+                'peak': (peak - baseline) / 1024,
+            }
+    finally:
+        serving.join()
+        server.close()
+
+
+def main(input_args: List[str]) -> None:
+    args = init_parser().parse_args(input_args)
+    print('Downloading %d MB at %d MB/sec' % (args.size, args.client_rate))
+    print('%12s %10s %12s %18s' % ('mode', 'seconds', 'received MB', 'peak rss delta MB'))
+    for mode in args.modes.split(','):
+        result = download(mode, args)
+        print('%12s %10.2f %12.1f %18.1f' % (
+            mode, result['seconds'], result['received'], result['peak']))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
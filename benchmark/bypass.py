@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡Fast, Lightweight, Programmable, TLS interception capable
+    proxy server for Application debugging, testing and development.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import argparse
+import os
+import ssl
+import sys
+import tempfile
+import time
+from typing import List, Tuple
+
+from proxy.common.constants import __homepage__
+from proxy.core.bypass import InterceptionBypass
+
+from benchmark.certificates import handshake
+from benchmark.tls_interception import TlsUpstreamServer, generate_ca, serve
+from benchmark.upstream_pool import UpstreamHandler
+from benchmark.utils import get_available_port, proxy_process, percentile
+
+DEFAULT_PATTERNS = 100000
+DEFAULT_LOOKUPS = 100000
+DEFAULT_CONNECTIONS = 200
+
+
+def init_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='Compiles interception bypass lists of growing size, of '
+                    'exact hosts, suffixes and networks, and measures lookups '
+                    'of matching and other hosts.  Then opens HTTPS connections '
+                    'through proxy.py using the largest list, to an upstream '
+                    'which is intercepted and to one which is bypassed.',
+        epilog='Proxy.py not working? Report at: %s/issues/new' % __homepage__
+    )
+    parser.add_argument(
+        '--patterns',
+        type=int,
+        default=DEFAULT_PATTERNS,
+        help='Default: %d.  Size of largest bypass list.' % DEFAULT_PATTERNS)
+    parser.add_argument(
+        '--lookups',
+        type=int,
+        default=DEFAULT_LOOKUPS,
+        help='Default: %d.  Lookups per bypass list.' % DEFAULT_LOOKUPS)
+    parser.add_argument(
+        '--connections',
+        type=int,
+        default=DEFAULT_CONNECTIONS,
+        help='Default: %d.  HTTPS connections to each upstream.' % DEFAULT_CONNECTIONS)
+    return parser
+
+
+def patterns(count: int) -> List[str]:
+    """A third each of exact hosts, suffixes and /24 networks."""
+    result: List[str] = []
+    for i in range(count):
+        if i % 3 == 0:
+            result.append('host%d.site%d.com' % (i, i % 997))
+        elif i % 3 == 1:
+            result.append('.cdn%d.net' % i)
+        else:
+            result.append('10.%d.%d.0/24' % (i // 256 % 256, i % 256))
+    return result
+
+
+def lookups(bypass: InterceptionBypass, count: int) -> Tuple[float, int]:
+    """Returns nanoseconds per lookup and number of matches."""
+    hosts = []
+    for i in range(count):
+        hosts.append((
+            'host%d.site%d.com' % (i, i % 997),
+            'img.static.cdn%d.net' % i,
+            '10.%d.%d.7' % (i // 256 % 256, i % 256),
+            'www.unlisted%d.org' % i)[i % 4])
+    start = time.time()
+    matched = sum(1 for host in hosts if bypass.matches(host))
+    return (time.time() - start) * 10**9 / count, matched
+
+
+def connections(args: argparse.Namespace, directory: str, bypass_file: str) -> Tuple[List[float], List[float]]:
+    """Returns handshake latency through proxy.py to intercepted and bypassed upstream."""
+    paths = generate_ca(directory)
+    upstream = TlsUpstreamServer(
+        paths['upstream-cert'], paths['upstream-key'], 0, ('', 0), UpstreamHandler)
+    serving = serve(upstream)
+    ctx = ssl.create_default_context(cafile=paths['ca-cert'])
+    # Certificates generated using openssl command only carry subject CN
+    ctx.check_hostname = False
+    port = get_available_port()
+    # proxy.py verifies upstream certificate against benchmark CA
+    os.environ['SSL_CERT_FILE'] = paths['ca-cert']
+    try:
+        with proxy_process(port, [
+                '--threadless', '--num-workers', '1',
+                '--ca-key-file', paths['ca-key'], '--ca-cert-file', paths['ca-cert'],
+                '--ca-signing-key-file', paths['ca-signing-key'],
+                '--ca-cert-dir', paths['ca-cert-dir'],
+                '--tls-interception-bypass-file', bypass_file]):
+            # 127.0.0.1 is intercepted, 127.0.0.2 is bypassed
+            handshake(port, '127.0.0.1', upstream.server_address[1], ctx)
+            intercepted = [handshake(port, '127.0.0.1', upstream.server_address[1], ctx)
+                           for _ in range(args.connections)]
+            bypassed = [handshake(port, '127.0.0.2', upstream.server_address[1], ctx)
+                        for _ in range(args.connections)]
+        return intercepted, bypassed
+    finally:
+        del os.environ['SSL_CERT_FILE']
+        upstream.shutdown()
+        upstream.server_close()
+        serving.join()
+
+
+def main(input_args: List[str]) -> None:
+    args = init_parser().parse_args(input_args)
+    print('%10s %12s %12s %10s' % ('patterns', 'compile ms', 'lookup ns', 'matched'))
+    size = 100
+    while True:
+        listed = patterns(min(size, args.patterns))
+        start = time.time()
+        bypass = InterceptionBypass(listed)
+        compiled = (time.time() - start) * 1000
+        ns, matched = lookups(bypass, args.lookups)
+        print('%10d %12.1f %12.0f %10d' % (len(listed), compiled, ns, matched))
+        if size >= args.patterns:
+            break
+        size *= 10
+    with tempfile.TemporaryDirectory() as directory:
+        bypass_file = os.path.join(directory, 'bypass.txt')
+        with open(bypass_file, 'w') as f:
+            f.write('\n'.join(listed + ['127.0.0.2']))
+        intercepted, bypassed = connections(args, directory, bypass_file)
+    print('%10s %10s %10s' % ('upstream', 'mean ms', 'p99 ms'))
+    for name, samples in (('intercept', intercepted), ('bypass', bypassed)):
+        print('%10s %10.2f %10.2f' % (name, sum(samples) / len(samples), percentile(samples, 99)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
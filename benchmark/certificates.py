@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡Fast, Lightweight, Programmable, TLS interception capable
+    proxy server for Application debugging, testing and development.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import argparse
+import os
+import socket
+import ssl
+import sys
+import tempfile
+import time
+from typing import List, Tuple
+
+from proxy.common.constants import __homepage__
+from proxy.common.utils import build_http_request
+from proxy.http.methods import httpMethods
+
+from benchmark.tls_interception import TlsUpstreamServer, generate_ca, serve
+from benchmark.upstream_pool import UpstreamHandler
+from benchmark.utils import get_available_port, proxy_process, percentile
+
+DEFAULT_HOSTS = 100
+
+
+def init_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='Opens intercepted HTTPS connections through proxy.py to '
+                    'distinct upstream hosts, 127.0.0.1 onwards, with an empty '
+                    '--ca-cert-dir.  Reports latency until client handshake '
+                    'completes on first visit of each host, when a certificate '
+                    'is generated, and on repeat visit.  Optionally with '
+                    'certificates of all hosts warmed up before.',
+        epilog='Proxy.py not working? Report at: %s/issues/new' % __homepage__
+    )
+    parser.add_argument(
+        '--hosts',
+        type=int,
+        default=DEFAULT_HOSTS,
+        help='Default: %d.  Number of distinct hosts, at most 254.' % DEFAULT_HOSTS)
+    parser.add_argument(
+        '--warm-up',
+        action='store_true',
+        help='Pass hosts to proxy.py using --ca-cert-warm-up-file.')
+    return parser
+
+
+def handshake(proxy_port: int, host: str, upstream_port: int, ctx: ssl.SSLContext) -> float:
+    """Returns milliseconds until intercepted TLS handshake completes."""
+    netloc = b'%s:%d' % (host.encode(), upstream_port)
+    start = time.time()
+    with socket.create_connection(('127.0.0.1', proxy_port)) as conn:
+        conn.sendall(build_http_request(
+            httpMethods.CONNECT, netloc, headers={b'Host': netloc}))
+        response = b''
+        while not response.endswith(b'\r\n\r\n'):
+            response += conn.recv(65536)
+        with ctx.wrap_socket(conn) as tls:
+            elapsed = (time.time() - start) * 1000
+            tls.sendall(build_http_request(httpMethods.GET, b'/', headers={b'Host': netloc}))
+            response = b''
+            while not response.endswith(b'hello'):
+                response += tls.recv(65536)
+    return elapsed
+
+
+def benchmark(args: argparse.Namespace) -> Tuple[List[float], List[float]]:
+    """Returns first visit and repeat visit latency in milliseconds."""
+    hosts = tuple('127.0.0.%d' % i for i in range(1, args.hosts + 1))
+    with tempfile.TemporaryDirectory() as directory:
+        paths = generate_ca(directory, hosts)
+        upstream = TlsUpstreamServer(
+            paths['upstream-cert'], paths['upstream-key'], 0, ('', 0), UpstreamHandler)
+        serving = serve(upstream)
+        ctx = ssl.create_default_context(cafile=paths['ca-cert'])
+        # Certificates generated using openssl command only carry subject CN
+        ctx.check_hostname = False
+        port = get_available_port()
+        options = [
+            '--threadless', '--num-workers', '1',
+            '--ca-key-file', paths['ca-key'], '--ca-cert-file', paths['ca-cert'],
+            '--ca-signing-key-file', paths['ca-signing-key'],
+            '--ca-cert-dir', paths['ca-cert-dir']]
+        if args.warm_up:
+            warm_up_file = os.path.join(directory, 'hosts.txt')
+            with open(warm_up_file, 'w') as f:
+                f.write('\n'.join(hosts))
+            options += ['--ca-cert-warm-up-file', warm_up_file]
+        # proxy.py verifies upstream certificate against benchmark CA
+        os.environ['SSL_CERT_FILE'] = paths['ca-cert']
+        try:
+            with proxy_process(port, options):
+                first = [handshake(port, host, upstream.server_address[1], ctx) for host in hosts]
+                repeat = [handshake(port, host, upstream.server_address[1], ctx) for host in hosts]
+            return first, repeat
+        finally:
+            del os.environ['SSL_CERT_FILE']
+            upstream.shutdown()
+            upstream.server_close()
+            serving.join()
+
+
+def main(input_args: List[str]) -> None:
+    args = init_parser().parse_args(input_args)
+    print('%d hosts%s' % (args.hosts, ', warmed up' if args.warm_up else ''))
+    print('%10s %10s %10s %10s' % ('visit', 'mean ms', 'p50 ms', 'p99 ms'))
+    first, repeat = benchmark(args)
+    for visit, samples in (('first', first), ('repeat', repeat)):
+        print('%10s %10.2f %10.2f %10.2f' % (
+            visit, sum(samples) / len(samples), percentile(samples, 50), percentile(samples, 99)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡Fast, Lightweight, Programmable, TLS interception capable
+    proxy server for Application debugging, testing and development.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import argparse
+import socket
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+from proxy.common.constants import __homepage__
+from proxy.common.utils import build_http_request
+from proxy.http.methods import httpMethods
+
+from benchmark.upstream_pool import UpstreamHandler, UpstreamServer
+from benchmark.utils import get_available_port, proxy_process, percentile
+
+DEFAULT_REQUESTS = 500
+DEFAULT_CONNECT_TIMEOUT = 3
+DEFAULT_BLACKHOLES = 4
+
+
+def init_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='Sends plain HTTP requests through a single threadless '
+                    'proxy.py worker while other clients CONNECT to an '
+                    'upstream that never completes TCP handshakes.  Reports '
+                    'latency of unaffected requests and time taken for '
+                    'black-holed clients to receive 502 Bad Gateway.  Linux only.',
+        epilog='Proxy.py not working? Report at: %s/issues/new' % __homepage__
+    )
+    parser.add_argument(
+        '--requests',
+        type=int,
+        default=DEFAULT_REQUESTS,
+        help='Default: %d.  Number of requests.' % DEFAULT_REQUESTS)
+    parser.add_argument(
+        '--blackholes',
+        type=int,
+        default=DEFAULT_BLACKHOLES,
+        help='Default: %d.  Number of clients connecting to black-holed '
+             'upstream.' % DEFAULT_BLACKHOLES)
+    parser.add_argument(
+        '--connect-timeout',
+        type=int,
+        default=DEFAULT_CONNECT_TIMEOUT,
+        help='Default: %d.  Passed to proxy.py.' % DEFAULT_CONNECT_TIMEOUT)
+    return parser
+
+
+class BlackholeServer:
+    """Listener whose accept queue is full.  SYNs to it are dropped by kernel,
+    so connections to it stay in progress until connect timeout."""
+
+    def __init__(self) -> None:
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(0)
+        self.port: int = self.listener.getsockname()[1]
+        self.fillers: List[socket.socket] = []
+        while self.accepts_connections():
+            pass
+
+    def accepts_connections(self) -> bool:
+        filler = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        filler.settimeout(0.5)
+        self.fillers.append(filler)
+        try:
+            filler.connect(('127.0.0.1', self.port))
+            return True
+        except socket.timeout:
+            return False
+
+    def close(self) -> None:
+        for filler in self.fillers:
+            filler.close()
+        self.listener.close()
+
+
+def blackholed(port: int, upstream_port: int, results: List[float]) -> None:
+    start = time.time()
+    with socket.create_connection(('127.0.0.1', port)) as conn:
+        conn.sendall(b'CONNECT 127.0.0.1:%d HTTP/1.1\r\n\r\n' % upstream_port)
+        response = conn.recv(1024)
+    if response.startswith(b'HTTP/1.1 502'):
+        results.append(time.time() - start)
+
+
+def benchmark(blackholes: int, args: argparse.Namespace) -> Dict[str, float]:
+    upstream = UpstreamServer(('127.0.0.1', 0), UpstreamHandler)
+    serving = threading.Thread(target=upstream.serve_forever)
+    serving.start()
+    blackhole: Optional[BlackholeServer] = BlackholeServer() if blackholes > 0 else None
+    upstream_port = upstream.server_address[1]
+    request = build_http_request(
+        httpMethods.GET, b'http://127.0.0.1:%d/' % upstream_port,
+        headers={b'Host': b'127.0.0.1:%d' % upstream_port})
+    port = get_available_port()
+    samples: List[float] = []
+    bad_gateway: List[float] = []
+    try:
+        with proxy_process(port, [
+                '--threadless', '--num-workers', '1',
+                '--connect-timeout', str(args.connect_timeout)]):
+            clients = [
+                threading.Thread(target=blackholed, args=(port, blackhole.port, bad_gateway))
+                for _ in range(blackholes) if blackhole is not None]
+            for client in clients:
+                client.start()
+            for _ in range(args.requests):
+                start = time.time()
+                with socket.create_connection(('127.0.0.1', port)) as conn:
+                    conn.sendall(request)
+                    response = b''
+                    while not response.endswith(b'hello'):
+                        response += conn.recv(65536)
+                samples.append((time.time() - start) * 1000)
+            for client in clients:
+                client.join()
+        return {
+            'p50': percentile(samples, 50),
+            'p99': percentile(samples, 99),
+            'max': max(samples),
+            'bad_gateway': len(bad_gateway),
+            'seconds_to_502': max(bad_gateway) if bad_gateway else 0,
+        }
+    finally:
+        if blackhole is not None:
+            blackhole.close()
+        upstream.shutdown()
+        upstream.server_close()
+        serving.join()
+
+
+def main(input_args: List[str]) -> None:
+    args = init_parser().parse_args(input_args)
+    print('%d requests, connect timeout %d seconds' % (args.requests, args.connect_timeout))
+    print('%12s %10s %10s %10s %10s %16s' %
+          ('blackholes', 'p50 ms', 'p99 ms', 'max ms', '502s', 'seconds to 502'))
+    for blackholes in (0, args.blackholes):
+        result = benchmark(blackholes, args)
+        print('%12d %10.2f %10.2f %10.2f %10d %16.2f' % (
+            blackholes, result['p50'], result['p99'], result['max'],
+            result['bad_gateway'], result['seconds_to_502']))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
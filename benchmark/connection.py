@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡Fast, Lightweight, Programmable, TLS interception capable
+    proxy server for Application debugging, testing and development.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import argparse
+import selectors
+import socket
+import ssl
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+from proxy.common.constants import __homepage__, DEFAULT_BUFFER_SIZE
+from proxy.common.flags import Flags
+from proxy.core.connection import TcpClientConnection, TcpConnection, tcpConnectionTypes
+from proxy.http.handler import HttpProtocolHandler
+from proxy.main import load_plugins
+
+DEFAULT_SIZE_MB = 500
+DEFAULT_READ_SIZE = 16 * 1024
+
+
+def init_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='Relays a large body from an upstream socket to a slower '
+                    'client socket through TcpConnection queue and flush, '
+                    'i.e. what HttpProxyPlugin does for every response.  '
+                    'Compares scatter-gather write queue with a single '
+                    'bytes buffer.  Handler mode writes through '
+                    'HttpProtocolHandler, which also passes written data '
+                    'to on_response_chunk of proxy.py default plugins.',
+        epilog='Proxy.py not working? Report at: %s/issues/new' % __homepage__
+    )
+    parser.add_argument(
+        '--size',
+        type=int,
+        default=DEFAULT_SIZE_MB,
+        help='Default: %d.  Size of relayed body in MB.' % DEFAULT_SIZE_MB)
+    parser.add_argument(
+        '--read-size',
+        type=int,
+        default=DEFAULT_READ_SIZE,
+        help='Default: %d.  Bytes read by client per recv.' % DEFAULT_READ_SIZE)
+    parser.add_argument(
+        '--drain',
+        action='store_true',
+        help='Buffer whole body before writing to client, i.e. a client '
+             'which stalls and then drains.')
+    parser.add_argument(
+        '--modes',
+        type=str,
+        default='bytes,scatter-gather,handler',
+        help='Comma separated list of modes to benchmark.')
+    return parser
+
+
+class ClientConnection(TcpConnection):
+
+    def __init__(self, conn: socket.socket) -> None:
+        super().__init__(tcpConnectionTypes.CLIENT)
+        self._conn = conn
+
+    @property
+    def connection(self) -> Union[ssl.SSLSocket, socket.socket]:
+        return self._conn
+
+
+class BytesBufferConnection(ClientConnection):
+    """Queues into a single bytes buffer, i.e. the behaviour
+    prior to scatter-gather write queue."""
+
+    def __init__(self, conn: socket.socket) -> None:
+        super().__init__(conn)
+        self.data = b''
+
+    def buffer_size(self) -> int:
+        return len(self.data)
+
+    def has_buffer(self) -> bool:
+        return self.buffer_size() > 0
+
+    def queue(self, data: bytes) -> int:
+        self.data += data
+        return len(data)
+
+    def flush(self) -> int:
+        if self.buffer_size() == 0:
+            return 0
+        sent = self.send(self.data)
+        self.data = self.data[sent:]
+        return sent
+
+
+def protocol_handler(conn: socket.socket) -> HttpProtocolHandler:
+    """HttpProtocolHandler writing to conn, with proxy.py default plugins."""
+    handler = HttpProtocolHandler(
+        conn.fileno(), ('127.0.0.1', 0),
+        flags=Flags(plugins=load_plugins(
+            b'proxy.http.proxy.HttpProxyPlugin,proxy.http.server.HttpWebServerPlugin')))
+    # Write to conn itself rather than a duplicate of it
+    handler.client.connection.close()
+    handler.client = TcpClientConnection(conn, handler.addr)
+    handler.initialize()
+    return handler
+
+
+def handler_connection(conn: socket.socket) -> Tuple[TcpConnection, Callable[[], Any]]:
+    handler = protocol_handler(conn)
+    return handler.client, lambda: handler.handle_writables([conn])
+
+
+def connection(klass: Callable[[socket.socket], TcpConnection]) -> \
+        Callable[[socket.socket], Tuple[TcpConnection, Callable[[], Any]]]:
+    def create(conn: socket.socket) -> Tuple[TcpConnection, Callable[[], Any]]:
+        client = klass(conn)
+        return client, client.flush
+    return create
+
+
+def produce(sock: socket.socket, size: int) -> None:
+    chunk = b'x' * DEFAULT_BUFFER_SIZE
+    remaining = size
+    while remaining > 0:
+        sock.sendall(chunk[:remaining])
+        remaining -= len(chunk)
+    sock.close()
+
+
+def consume(sock: socket.socket, read_size: int) -> None:
+    while sock.recv(read_size):
+        pass
+
+
+def relay(create: Callable[[socket.socket], Tuple[TcpConnection, Callable[[], Any]]],
+          args: argparse.Namespace) -> Tuple[float, int]:
+    """Returns seconds taken and peak bytes buffered."""
+    upstream, producer = socket.socketpair()
+    downstream, consumer = socket.socketpair()
+    upstream.setblocking(False)
+    downstream.setblocking(False)
+    client, flush = create(downstream)
+    threads: List[threading.Thread] = [
+        threading.Thread(target=produce, args=(producer, args.size * 1024 * 1024)),
+        threading.Thread(target=consume, args=(consumer, args.read_size)),
+    ]
+    selector = selectors.DefaultSelector()
+    selector.register(upstream, selectors.EVENT_READ)
+    if not args.drain:
+        selector.register(downstream, selectors.EVENT_WRITE)
+    peak, eof = 0, False
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    try:
+        while not eof or client.has_buffer():
+            for key, _ in selector.select():
+                if key.fileobj is upstream:
+                    data = upstream.recv(DEFAULT_BUFFER_SIZE)
+                    if not data:
+                        eof = True
+                        selector.unregister(upstream)
+                        if args.drain:
+                            selector.register(downstream, selectors.EVENT_WRITE)
+                        continue
+                    client.queue(data)
+                    peak = max(peak, client.buffer_size())
+                elif client.has_buffer():
+                    flush()
+        downstream.shutdown(socket.SHUT_WR)
+        threads[1].join()
+        return time.time() - start, peak
+    finally:
+        selector.close()
+        for sock in (upstream, producer, downstream, consumer):
+            sock.close()
+        for thread in threads:
+            thread.join()
+
+
+def main(input_args: List[str]) -> None:
+    args = init_parser().parse_args(input_args)
+    modes: Dict[str, Callable[[socket.socket], Tuple[TcpConnection, Callable[[], Any]]]] = {
+        'bytes': connection(BytesBufferConnection),
+        'scatter-gather': connection(ClientConnection),
+        'handler': handler_connection,
+    }
+    print('Relaying %d MB' % args.size)
+    print('%16s %10s %10s %14s' % ('mode', 'seconds', 'MB/sec', 'peak buffer MB'))
+    for mode in args.modes.split(','):
+        elapsed, peak = relay(modes[mode], args)
+        print('%16s %10.2f %10.1f %14.1f' % (
+            mode, elapsed, args.size / elapsed, peak / (1024 * 1024)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡Fast, Lightweight, Programmable, TLS interception capable
+    proxy server for Application debugging, testing and development.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import argparse
+import multiprocessing
+import select
+import socket
+import sys
+import threading
+import time
+from typing import List
+
+from proxy.common.constants import __homepage__
+from proxy.common.utils import build_http_request
+from proxy.http.methods import httpMethods
+
+from benchmark.utils import get_available_port, proxy_process, percentile
+
+DEFAULT_LOOPS = 4
+DEFAULT_HEAVY = 4
+DEFAULT_DURATION = 5
+CHUNK = b'x' * 65536
+
+
+def init_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='Measures latency of short lived requests while a few '
+                    'long lived tunnels stream data through proxy.py.  '
+                    'Tunnels are opened in a pattern which makes round-robin '
+                    'dispatch place all of them on the same threadless loop.',
+        epilog='Proxy.py not working? Report at: %s/issues/new' % __homepage__
+    )
+    parser.add_argument(
+        '--loops',
+        type=int,
+        default=DEFAULT_LOOPS,
+        help='Default: %d.  Value of --threadless-loops.' % DEFAULT_LOOPS)
+    parser.add_argument(
+        '--heavy',
+        type=int,
+        default=DEFAULT_HEAVY,
+        help='Default: %d.  Number of streaming tunnels.' % DEFAULT_HEAVY)
+    parser.add_argument(
+        '--duration',
+        type=int,
+        default=DEFAULT_DURATION,
+        help='Default: %d.  Seconds to benchmark each policy.' % DEFAULT_DURATION)
+    parser.add_argument(
+        '--policies',
+        type=str,
+        default='round-robin,least-works,lowest-lag',
+        help='Comma separated list of --dispatch-policy values to benchmark.')
+    return parser
+
+
+def stream(conn: socket.socket) -> None:
+    try:
+        while True:
+            conn.sendall(CHUNK)
+    except OSError:
+        pass
+    finally:
+        conn.close()
+
+
+def upstream_server(sock: socket.socket) -> None:
+    """Streams data forever to every client."""
+    while True:
+        conn, _ = sock.accept()
+        threading.Thread(target=stream, args=(conn,), daemon=True).start()
+
+
+def drain(socks: List[socket.socket]) -> None:
+    """Reads from streaming tunnels as fast as possible."""
+    while True:
+        readables, _, _ = select.select(socks, [], [])
+        for sock in readables:
+            sock.recv(1024 * 1024)
+
+
+def latencies(port: int, duration: int) -> List[float]:
+    request = build_http_request(httpMethods.GET, b'/')
+    samples: List[float] = []
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        start = time.time()
+        with socket.create_connection(('127.0.0.1', port)) as conn:
+            conn.sendall(request)
+            while conn.recv(65536):
+                pass
+        samples.append((time.time() - start) * 1000)
+    return samples
+
+
+def benchmark(policy: str, upstream_port: int, args: argparse.Namespace) -> List[float]:
+    port = get_available_port()
+    proxy_args = [
+        '--enable-web-server', '--threadless', '--num-workers', '1',
+        '--threadless-loops', str(args.loops), '--dispatch-policy', policy,
+        '--timeout', str(args.duration * 10)]
+    with proxy_process(port, proxy_args):
+        heavy: List[socket.socket] = []
+        idle: List[socket.socket] = []
+        for _ in range(args.heavy):
+            conn = socket.create_connection(('127.0.0.1', port))
+            conn.sendall(build_http_request(
+                httpMethods.CONNECT, b'127.0.0.1:%d' % upstream_port,
+                headers={b'Host': b'127.0.0.1:%d' % upstream_port}))
+            heavy.append(conn)
+            time.sleep(0.05)
+            # Skew: every loop but one receives an idle connection
+            for _ in range(args.loops - 1):
+                idle.append(socket.create_connection(('127.0.0.1', port)))
+                time.sleep(0.05)
+        drainer = multiprocessing.Process(target=drain, args=(heavy,), daemon=True)
+        drainer.start()
+        # Let loops report their lag
+        time.sleep(1)
+        try:
+            return latencies(port, args.duration)
+        finally:
+            drainer.terminate()
+            drainer.join()
+            for conn in heavy + idle:
+                conn.close()
+
+
+def main(input_args: List[str]) -> None:
+    args = init_parser().parse_args(input_args)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(100)
+    upstream = multiprocessing.Process(
+        target=upstream_server, args=(sock,), daemon=True)
+    upstream.start()
+    try:
+        print('%12s %10s %10s %10s %10s %10s' %
+              ('policy', 'requests', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms'))
+        for policy in args.policies.split(','):
+            samples = benchmark(policy, sock.getsockname()[1], args)
+            print('%12s %10d %10.2f %10.2f %10.2f %10.2f' % (
+                policy, len(samples), percentile(samples, 50), percentile(samples, 90),
+                percentile(samples, 99), max(samples) if samples else 0))
+    finally:
+        upstream.terminate()
+        upstream.join()
+        sock.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
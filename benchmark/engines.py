@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡Fast, Lightweight, Programmable, TLS interception capable
+    proxy server for Application debugging, testing and development.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import argparse
+import socket
+import sys
+import threading
+import time
+from typing import Dict, List
+
+from proxy.common.constants import __homepage__
+from proxy.common.utils import build_http_request
+from proxy.http.methods import httpMethods
+
+from benchmark.utils import get_available_port, proxy_process, percentile
+
+DEFAULT_CLIENTS = 16
+DEFAULT_DURATION = 5
+DEFAULT_IDLE = 1000
+
+ENGINES: Dict[str, List[str]] = {
+    'threaded': [],
+    'threadless': ['--threadless'],
+    'asyncio': ['--asyncio'],
+    'thread-pool': ['--thread-pool-size', '4'],
+}
+
+
+def init_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='Measures requests per second and latency of proxy.py '
+                    'web server for each engine, while many idle client '
+                    'connections are open.',
+        epilog='Proxy.py not working? Report at: %s/issues/new' % __homepage__
+    )
+    parser.add_argument(
+        '--clients',
+        type=int,
+        default=DEFAULT_CLIENTS,
+        help='Default: %d.  Number of concurrent clients.' % DEFAULT_CLIENTS)
+    parser.add_argument(
+        '--idle',
+        type=int,
+        default=DEFAULT_IDLE,
+        help='Default: %d.  Number of idle connections.' % DEFAULT_IDLE)
+    parser.add_argument(
+        '--duration',
+        type=int,
+        default=DEFAULT_DURATION,
+        help='Default: %d.  Seconds to benchmark each engine.' % DEFAULT_DURATION)
+    parser.add_argument(
+        '--engines',
+        type=str,
+        default=','.join(ENGINES.keys()),
+        help='Comma separated list of engines to benchmark.')
+    parser.add_argument(
+        '--event-loop-policy',
+        type=str,
+        default='auto',
+        help='Default: auto.  Value of --event-loop-policy for asyncio engine.')
+    return parser
+
+
+def client(port: int, deadline: float, samples: List[float]) -> None:
+    request = build_http_request(httpMethods.GET, b'/')
+    while time.time() < deadline:
+        start = time.time()
+        with socket.create_connection(('127.0.0.1', port)) as conn:
+            conn.sendall(request)
+            while conn.recv(65536):
+                pass
+        samples.append((time.time() - start) * 1000)
+
+
+def benchmark(engine: str, args: argparse.Namespace) -> List[float]:
+    port = get_available_port()
+    proxy_args = ENGINES[engine] + [
+        '--enable-web-server', '--num-workers', '1',
+        '--event-loop-policy', args.event_loop_policy,
+        '--timeout', str(args.duration * 10)]
+    with proxy_process(port, proxy_args):
+        idle = [socket.create_connection(('127.0.0.1', port)) for _ in range(args.idle)]
+        samples: List[float] = []
+        deadline = time.time() + args.duration
+        try:
+            clients = [
+                threading.Thread(target=client, args=(port, deadline, samples))
+                for _ in range(args.clients)]
+            for thread in clients:
+                thread.start()
+            for thread in clients:
+                thread.join()
+            return samples
+        finally:
+            for conn in idle:
+                conn.close()
+
+
+def main(input_args: List[str]) -> None:
+    args = init_parser().parse_args(input_args)
+    print('%12s %10s %10s %10s %10s %10s' %
+          ('engine', 'req/sec', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms'))
+    for engine in args.engines.split(','):
+        samples = benchmark(engine, args)
+        print('%12s %10.1f %10.2f %10.2f %10.2f %10.2f' % (
+            engine, len(samples) / args.duration, percentile(samples, 50),
+            percentile(samples, 90), percentile(samples, 99),
+            max(samples) if samples else 0))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
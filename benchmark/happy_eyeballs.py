@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡Fast, Lightweight, Programmable, TLS interception capable
+    proxy server for Application debugging, testing and development.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import argparse
+import contextlib
+import select
+import socket
+import sys
+import time
+from typing import Any, ContextManager, List, Tuple
+from unittest import mock
+
+from proxy.common.constants import __homepage__
+from proxy.core.connection import TcpServerConnection
+from proxy.core.happy_eyeballs import AddressFamilyStats, family_name
+from proxy.core.per_process import PerProcess
+
+DEFAULT_CONNECTIONS = 20
+DEFAULT_TIMEOUT = 3.0
+
+
+def init_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='Connects to a dual-stack upstream whose IPv6 address never '
+                    'completes TCP handshakes, using non-blocking TcpServerConnection '
+                    'as HttpProxyPlugin does.  Compares sequential attempts, where '
+                    'next address is tried only once previous fails, with Happy '
+                    'Eyeballs racing.  Requires IPv6 loopback.',
+        epilog='Proxy.py not working? Report at: %s/issues/new' % __homepage__
+    )
+    parser.add_argument(
+        '--connections',
+        type=int,
+        default=DEFAULT_CONNECTIONS,
+        help='Default: %d.  Number of sequential connections.' % DEFAULT_CONNECTIONS)
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help='Default: %.1f.  Seconds after which a connection is '
+             'given up, i.e. --connect-timeout.' % DEFAULT_TIMEOUT)
+    return parser
+
+
+def blackhole() -> Tuple[socket.socket, List[socket.socket]]:
+    """IPv6 listener with full accept queue, SYNs to it are dropped."""
+    listener = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
+    listener.bind(('::1', 0))
+    listener.listen(0)
+    fillers: List[socket.socket] = []
+    while True:
+        filler = socket.socket(socket.AF_INET6, socket.SOCK_STREAM)
+        filler.settimeout(0.2)
+        fillers.append(filler)
+        try:
+            filler.connect(listener.getsockname()[:2])
+        except socket.timeout:
+            return listener, fillers
+
+
+def connect(addrinfos: List[Tuple[Any, ...]], timeout: float) -> Tuple[float, str]:
+    """Returns seconds taken and family of winning address."""
+    start = time.time()
+    conn = TcpServerConnection('dual.stack.host', 443)
+    with mock.patch('socket.getaddrinfo', return_value=addrinfos):
+        conn.connect(nonblocking=True)
+    try:
+        while not conn.connected:
+            now = time.time()
+            if now - start >= timeout:
+                return timeout, 'timeout'
+            wakeup = start + timeout
+            if conn.next_attempt_at is not None:
+                wakeup = min(wakeup, conn.next_attempt_at)
+            _, ready, _ = select.select([], list(conn.attempts), [], max(0.0, wakeup - now))
+            if ready:
+                conn.finish_connect(ready)
+            else:
+                conn.start_due_attempt()
+        return time.time() - start, family_name(conn.connection.family)
+    finally:
+        conn.close_attempts()
+        if conn.connected:
+            conn.close()
+
+
+def main(input_args: List[str]) -> None:
+    args = init_parser().parse_args(input_args)
+    dead, fillers = blackhole()
+    live = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    live.bind(('127.0.0.1', 0))
+    live.listen(1024)
+    addrinfos = [
+        (socket.AF_INET6, socket.SOCK_STREAM, 6, '', dead.getsockname()),
+        (socket.AF_INET, socket.SOCK_STREAM, 6, '', live.getsockname()),
+    ]
+    print('%d connections, timeout %.1f seconds' % (args.connections, args.timeout))
+    print('%12s %12s %12s %12s %10s' % ('mode', 'first ms', 'mean ms', 'max ms', 'timeouts'))
+    try:
+        for mode in ('sequential', 'racing'):
+            # Start afresh, without family preferred by previous mode
+            PerProcess.registry.pop(AddressFamilyStats, None)
+            # Sequential never starts next attempt before previous one fails
+            attempt_delay: ContextManager[Any] = mock.patch(
+                'proxy.core.connection.CONNECTION_ATTEMPT_DELAY', args.timeout * 10) \
+                if mode == 'sequential' else contextlib.nullcontext()
+            samples: List[float] = []
+            timeouts = 0
+            with attempt_delay:
+                for _ in range(args.connections):
+                    elapsed, family = connect(addrinfos, args.timeout)
+                    samples.append(elapsed * 1000)
+                    timeouts += family == 'timeout'
+                    # Drain accept queue of live listener
+                    live.setblocking(False)
+                    try:
+                        while True:
+                            live.accept()[0].close()
+                    except BlockingIOError:
+                        pass
+            print('%12s %12.1f %12.1f %12.1f %10d' % (
+                mode, samples[0], sum(samples) / len(samples), max(samples), timeouts))
+    finally:
+        for sock in fillers + [dead, live]:
+            sock.close()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
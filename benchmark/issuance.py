@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡Fast, Lightweight, Programmable, TLS interception capable
+    proxy server for Application debugging, testing and development.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import argparse
+import os
+import ssl
+import sys
+import tempfile
+import time
+from typing import List, Optional, Tuple
+
+from proxy.common.constants import __homepage__
+from proxy.core.pki import CertificateAuthority
+from proxy.core.stats import Stats
+
+from benchmark.tls_interception import generate_ca, openssl
+
+DEFAULT_HANDSHAKES = 200
+
+# Hosts contacted while loading a handful of news, video and shopping sites
+RECORDED_HOSTS = (
+    'www.nytimes.com', 'static01.nyt.com', 'a.nytimes.com', 'als-svc.nytimes.com',
+    'samizdat-graphql.nytimes.com', 'purr.nytimes.com', 'meter-svc.nytimes.com',
+    'www.youtube.com', 'i.ytimg.com', 's.ytimg.com', 'yt3.ggpht.com',
+    'fonts.googleapis.com', 'fonts.gstatic.com', 'www.gstatic.com',
+    'www.google.com', 'apis.google.com', 'play.google.com', 'accounts.google.com',
+    'www.googletagmanager.com', 'www.google-analytics.com', 'stats.g.doubleclick.net',
+    'securepubads.g.doubleclick.net', 'googleads.g.doubleclick.net',
+    'www.amazon.com', 'images-na.ssl-images-amazon.com', 'm.media-amazon.com',
+    'completion.amazon.com', 'unagi.amazon.com', 'fls-na.amazon.com',
+    'www.bbc.co.uk', 'static.files.bbci.co.uk', 'ichef.bbci.co.uk', 'nav.files.bbci.co.uk',
+    'emp.bbc.co.uk', 'cdn.cookielaw.org', 'geolocation.onetrust.com',
+    'connect.facebook.net', 'www.facebook.com', 'static.xx.fbcdn.net',
+    'cdn.jsdelivr.net', 'cdnjs.cloudflare.com', 'ajax.cloudflare.com',
+    'github.com', 'api.github.com', 'avatars.githubusercontent.com',
+    'github.githubassets.com', 'raw.githubusercontent.com', 'collector.github.com',
+)
+
+
+def init_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='Issues interception certificates, in-process, for a recorded '
+                    'list of hosts, one certificate per host and wildcard '
+                    'certificates shared by sibling hosts.  Then measures full TLS '
+                    'handshakes using RSA 2048 and ECDSA P-256 leaf keys.',
+        epilog='Proxy.py not working? Report at: %s/issues/new' % __homepage__
+    )
+    parser.add_argument(
+        '--hosts-file',
+        type=str,
+        default=None,
+        help='Default: None.  File listing hosts, one per line.  Uses a built-in '
+             'recording of %d hosts when not given.' % len(RECORDED_HOSTS))
+    parser.add_argument(
+        '--handshakes',
+        type=int,
+        default=DEFAULT_HANDSHAKES,
+        help='Default: %d.  Full handshakes per leaf key type.' % DEFAULT_HANDSHAKES)
+    return parser
+
+
+def read_hosts(hosts_file: Optional[str]) -> List[str]:
+    if hosts_file is None:
+        return list(RECORDED_HOSTS)
+    with open(hosts_file) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+def issue(ca_cert: str, ca_key: str, signing_key: str, ca_cert_dir: str,
+          hosts: List[str], wildcard: bool) -> Tuple[int, float]:
+    """Returns number of certificates signed and milliseconds taken."""
+    os.mkdir(ca_cert_dir)
+    stats = Stats('benchmark')
+    ca = CertificateAuthority(
+        ca_cert, ca_key, signing_key, ca_cert_dir, len(hosts), wildcard=wildcard, stats=stats)
+    start = time.time()
+    for host in hosts:
+        ca.context(host)
+    return len(stats.samples.get('sign_ms', [])), (time.time() - start) * 1000
+
+
+def handshake(server_ctx: ssl.SSLContext, client_ctx: ssl.SSLContext) -> None:
+    """Completes a full handshake between in-memory client and server."""
+    c_in, c_out, s_in, s_out = ssl.MemoryBIO(), ssl.MemoryBIO(), ssl.MemoryBIO(), ssl.MemoryBIO()
+    client = client_ctx.wrap_bio(c_in, c_out)
+    server = server_ctx.wrap_bio(s_in, s_out, server_side=True)
+    done = [False, False]
+    while not all(done):
+        for i, (obj, out, peer_in) in enumerate(((client, c_out, s_in), (server, s_out, c_in))):
+            if not done[i]:
+                try:
+                    obj.do_handshake()
+                    done[i] = True
+                except ssl.SSLWantReadError:
+                    pass
+            peer_in.write(out.read())
+
+
+def handshakes(ca: CertificateAuthority, ca_cert: str, count: int) -> float:
+    """Returns mean milliseconds per full handshake."""
+    server_ctx = ca.context('www.example.com')
+    client_ctx = ssl.create_default_context(cafile=ca_cert)
+    client_ctx.check_hostname = False
+    start = time.time()
+    for _ in range(count):
+        handshake(server_ctx, client_ctx)
+    return (time.time() - start) * 1000 / count
+
+
+def main(input_args: List[str]) -> None:
+    args = init_parser().parse_args(input_args)
+    hosts = read_hosts(args.hosts_file)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = generate_ca(directory)
+        print('%d hosts' % len(hosts))
+        print('%10s %14s %14s' % ('policy', 'certificates', 'issue ms'))
+        results = []
+        for policy, wildcard in (('exact', False), ('wildcard', True)):
+            signed, elapsed = issue(
+                paths['ca-cert'], paths['ca-key'], paths['ca-signing-key'],
+                os.path.join(directory, policy), hosts, wildcard)
+            results.append(signed)
+            print('%10s %14d %14.1f' % (policy, signed, elapsed))
+        print('%d certificates saved' % (results[0] - results[1]))
+
+        ec_signing_key = os.path.join(directory, 'ec-signing-key.pem')
+        openssl('ecparam', '-name', 'prime256v1', '-genkey', '-noout', '-out', ec_signing_key)
+        print('%10s %14s' % ('leaf key', 'handshake ms'))
+        for key_type, signing_key in (('rsa-2048', paths['ca-signing-key']), ('ec-p256', ec_signing_key)):
+            ca_cert_dir = os.path.join(directory, key_type)
+            os.mkdir(ca_cert_dir)
+            ca = CertificateAuthority(
+                paths['ca-cert'], paths['ca-key'], signing_key, ca_cert_dir, 1, stats=Stats('benchmark'))
+            print('%10s %14.3f' % (key_type, handshakes(ca, paths['ca-cert'], args.handshakes)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
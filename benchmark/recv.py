@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡Fast, Lightweight, Programmable, TLS interception capable
+    proxy server for Application debugging, testing and development.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import argparse
+import multiprocessing
+import resource
+import socket
+import sys
+import time
+from multiprocessing import connection
+from typing import Dict, List, Tuple
+
+from proxy.common.constants import __homepage__, DEFAULT_CLIENT_RECVBUF_SIZE
+from proxy.core.connection import BufferPool, TcpClientConnection
+
+DEFAULT_CONNECTIONS = 2000
+DEFAULT_ROUNDS = 10
+DEFAULT_MESSAGE_SIZE = 512
+
+
+def init_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='Measures cost of small reads through TcpConnection.recv '
+                    'with default 1 MB receive buffer size, with and without '
+                    'a BufferPool.  Each mode runs in its own process.  Last '
+                    'received chunk of each connection is retained, like '
+                    'parsers of idle connections do.',
+        epilog='Proxy.py not working? Report at: %s/issues/new' % __homepage__
+    )
+    parser.add_argument(
+        '--connections',
+        type=int,
+        default=DEFAULT_CONNECTIONS,
+        help='Default: %d.  Number of connections, each uses 2 file '
+             'descriptors.' % DEFAULT_CONNECTIONS)
+    parser.add_argument(
+        '--rounds',
+        type=int,
+        default=DEFAULT_ROUNDS,
+        help='Default: %d.  Reads per connection.' % DEFAULT_ROUNDS)
+    parser.add_argument(
+        '--message-size',
+        type=int,
+        default=DEFAULT_MESSAGE_SIZE,
+        help='Default: %d.  Bytes received per read.' % DEFAULT_MESSAGE_SIZE)
+    return parser
+
+
+def measure(pooled: bool, args: argparse.Namespace, results: connection.Connection) -> None:
+    if pooled:
+        BufferPool.install(BufferPool())
+    pairs: List[Tuple[socket.socket, socket.socket]] = [
+        socket.socketpair() for _ in range(args.connections)]
+    conns = [TcpClientConnection(ours, ('127.0.0.1', 0)) for ours, _ in pairs]
+    retained: Dict[int, bytes] = {}
+    message = b'x' * args.message_size
+    reads, elapsed = 0, 0.0
+    before = resource.getrusage(resource.RUSAGE_SELF)
+    for _ in range(args.rounds):
+        for _, theirs in pairs:
+            theirs.sendall(message)
+        start = time.time()
+        for index, conn in enumerate(conns):
+            data = conn.recv(DEFAULT_CLIENT_RECVBUF_SIZE)
+            assert data is not None
+            retained[index] = data
+            reads += 1
+        elapsed += time.time() - start
+    after = resource.getrusage(resource.RUSAGE_SELF)
+    results.send((
+        elapsed / reads * 1000000,
+        (after.ru_minflt - before.ru_minflt) / reads,
+        after.ru_maxrss / 1024))
+    for ours, theirs in pairs:
+        ours.close()
+        theirs.close()
+
+
+def main(input_args: List[str]) -> None:
+    args = init_parser().parse_args(input_args)
+    print('%d connections, %d reads of %d bytes each' %
+          (args.connections, args.rounds, args.message_size))
+    print('%10s %10s %14s %14s' % ('mode', 'us/read', 'faults/read', 'max rss MB'))
+    for mode, pooled in (('recv', False), ('pooled', True)):
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(target=measure, args=(pooled, args, sender))
+        process.start()
+        us, faults, rss = receiver.recv()
+        process.join()
+        print('%10s %10.2f %14.2f %14.1f' % (mode, us, faults, rss))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡Fast, Lightweight, Programmable, TLS interception capable
+    proxy server for Application debugging, testing and development.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import argparse
+import socket
+import sys
+import threading
+import time
+from typing import Dict, List
+
+from proxy.common.constants import __homepage__
+from proxy.common.utils import build_http_request
+from proxy.http.methods import httpMethods
+
+from benchmark.upstream_pool import UpstreamHandler, UpstreamServer
+from benchmark.utils import get_available_port, proxy_process, percentile
+
+DEFAULT_REQUESTS = 2000
+DEFAULT_HOSTNAME = 'localhost'
+
+MODES: Dict[str, List[str]] = {
+    'no-cache': ['--dns-cache-ttl', '0'],
+    'cache': [],
+}
+
+
+def init_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='Sends plain HTTP requests through proxy.py to an upstream '
+                    'server addressed by hostname, each over a new client '
+                    'connection and without upstream connection pool.  Reports '
+                    'latency with and without resolver cache.',
+        epilog='Proxy.py not working? Report at: %s/issues/new' % __homepage__
+    )
+    parser.add_argument(
+        '--requests',
+        type=int,
+        default=DEFAULT_REQUESTS,
+        help='Default: %d.  Number of requests.' % DEFAULT_REQUESTS)
+    parser.add_argument(
+        '--hostname',
+        type=str,
+        default=DEFAULT_HOSTNAME,
+        help='Default: %s.  Name resolving to local upstream server.' % DEFAULT_HOSTNAME)
+    parser.add_argument(
+        '--modes',
+        type=str,
+        default=','.join(MODES.keys()),
+        help='Comma separated list of modes to benchmark.')
+    return parser
+
+
+def benchmark(mode: str, args: argparse.Namespace) -> List[float]:
+    upstream = UpstreamServer(('127.0.0.1', 0), UpstreamHandler)
+    serving = threading.Thread(target=upstream.serve_forever)
+    serving.start()
+    netloc = b'%s:%d' % (args.hostname.encode(), upstream.server_address[1])
+    request = build_http_request(
+        httpMethods.GET, b'http://%s/' % netloc, headers={b'Host': netloc})
+    port = get_available_port()
+    samples: List[float] = []
+    try:
+        with proxy_process(port, MODES[mode] + [
+                '--threadless', '--num-workers', '1', '--pool-max-idle-per-host', '0']):
+            for _ in range(args.requests):
+                start = time.time()
+                with socket.create_connection(('127.0.0.1', port)) as conn:
+                    conn.sendall(request)
+                    response = b''
+                    while not response.endswith(b'hello'):
+                        response += conn.recv(65536)
+                samples.append((time.time() - start) * 1000)
+        return samples
+    finally:
+        upstream.shutdown()
+        upstream.server_close()
+        serving.join()
+
+
+def main(input_args: List[str]) -> None:
+    args = init_parser().parse_args(input_args)
+    print('%d requests to %s' % (args.requests, args.hostname))
+    print('%10s %10s %10s %10s' % ('mode', 'req/sec', 'p50 ms', 'p99 ms'))
+    for mode in args.modes.split(','):
+        samples = benchmark(mode, args)
+        print('%10s %10.1f %10.2f %10.2f' % (
+            mode, len(samples) / (sum(samples) / 1000),
+            percentile(samples, 50), percentile(samples, 99)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡Fast, Lightweight, Programmable, TLS interception capable
+    proxy server for Application debugging, testing and development.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import selectors
+import socket
+import sys
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Generator, List, Optional, Tuple, Union
+
+from proxy.common.constants import __homepage__
+from proxy.common.flags import Flags
+from proxy.common.types import HasFileno
+from proxy.core.event import EventQueue
+from proxy.core.threadless import Threadless, ThreadlessWork
+
+DEFAULT_IDLE = 10000
+DEFAULT_ACTIVE = 100
+DEFAULT_ITERATIONS = 20
+
+
+def init_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='Measures selector syscalls and time spent per Threadless '
+                    'loop iteration when few works are active among many idle ones.  '
+                    'Compares persistent selector registrations with rebuilding '
+                    'registrations on every iteration.',
+        epilog='Proxy.py not working? Report at: %s/issues/new' % __homepage__
+    )
+    parser.add_argument(
+        '--idle',
+        type=int,
+        default=DEFAULT_IDLE,
+        help='Default: %d.  Number of idle works.' % DEFAULT_IDLE)
+    parser.add_argument(
+        '--active',
+        type=int,
+        default=DEFAULT_ACTIVE,
+        help='Default: %d.  Number of works receiving data every iteration.' % DEFAULT_ACTIVE)
+    parser.add_argument(
+        '--iterations',
+        type=int,
+        default=DEFAULT_ITERATIONS,
+        help='Default: %d.  Number of loop iterations to measure.' % DEFAULT_ITERATIONS)
+    return parser
+
+
+class EchoWork(ThreadlessWork):
+    """Echoes back received data."""
+
+    def __init__(
+            self,
+            fileno: int,
+            addr: Tuple[str, int],
+            flags: Optional[Flags],
+            event_queue: Optional[EventQueue] = None,
+            uid: Optional[str] = None) -> None:
+        super().__init__(fileno, addr, flags, event_queue, uid)
+        # Threadless closes fileno on cleanup, hence no dup here.
+        self.conn = socket.socket(fileno=fileno)
+        self.buffer = b''
+        self.last_activity = time.time()
+
+    def initialize(self) -> None:
+        self.conn.setblocking(False)
+
+    def is_inactive(self) -> bool:
+        return time.time() - self.last_activity > self.flags.timeout
+
+    def deadline(self) -> Optional[float]:
+        return self.last_activity + self.flags.timeout
+
+    def get_events(self) -> Dict[socket.socket, int]:
+        events = selectors.EVENT_READ
+        if self.buffer:
+            events |= selectors.EVENT_WRITE
+        return {self.conn: events}
+
+    def handle_events(
+            self,
+            readables: List[Union[int, HasFileno]],
+            writables: List[Union[int, HasFileno]]) -> bool:
+        if self.conn in writables and self.buffer:
+            self.buffer = self.buffer[self.conn.send(self.buffer):]
+        if self.conn in readables:
+            data = self.conn.recv(65536)
+            if not data:
+                return True
+            self.buffer += data
+            self.last_activity = time.time()
+        return False
+
+    def shutdown(self) -> None:
+        self.conn.detach()
+
+    def run(self) -> None:
+        pass    # pragma: no cover
+
+
+class RebuildingThreadless(Threadless):
+    """Registers interest of all works before and unregisters after
+    every select, i.e. the behaviour prior to persistent registrations."""
+
+    @contextlib.contextmanager
+    def selected_events(self) -> Generator[Dict[Optional[int],
+                                                Tuple[List[Union[int, HasFileno]],
+                                                      List[Union[int, HasFileno]]]],
+                                           None, None]:
+        assert self.selector is not None
+        events: Dict[socket.socket, int] = {}
+        for work_id, work in self.works.items():
+            work_events = work.get_events()
+            for fd in work_events:
+                self.selector.register(fd, work_events[fd], work_id)
+            events.update(work_events)
+        with super().selected_events() as ready:
+            yield ready
+        for fd in events.keys():
+            self.selector.unregister(fd)
+
+    def update_registrations(self, work_id: int) -> None:
+        pass
+
+
+class CountingEpoll:
+    """Wraps selector's underlying epoll/poll object to count syscalls."""
+
+    CALLS = ('register', 'modify', 'unregister', 'poll', 'select', 'control')
+
+    def __init__(self, wrapped: Any) -> None:
+        self.wrapped = wrapped
+        self.calls: Counter[str] = Counter()
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.wrapped, name)
+        if name not in self.CALLS:
+            return attr
+
+        def counted(*args: Any, **kwargs: Any) -> Any:
+            self.calls[name] += 1
+            return attr(*args, **kwargs)
+        return counted
+
+
+def measure(klass: Callable[..., Threadless], args: argparse.Namespace) -> Tuple[Counter[str], float]:
+    threadless = klass(client_queue=None, flags=Flags(), work_klass=EchoWork)
+    threadless.selector = selectors.DefaultSelector()
+    counting = CountingEpoll(threadless.selector._selector)     # type: ignore
+    threadless.selector._selector = counting    # type: ignore
+    threadless.loop = asyncio.new_event_loop()
+    # Idle works share a single (never readable) socket via duplicated
+    # descriptors, which keeps file descriptor usage low.  Each descriptor
+    # is still registered with the selector individually.
+    idle, idle_peer = socket.socketpair()
+    active: List[socket.socket] = []
+    try:
+        for _ in range(args.idle):
+            threadless.create_work(os.dup(idle.fileno()), ('127.0.0.1', 0))
+        for _ in range(args.active):
+            ours, theirs = socket.socketpair()
+            threadless.create_work(ours.detach(), ('127.0.0.1', 0))
+            active.append(theirs)
+        counting.calls.clear()
+        start = time.time()
+        for _ in range(args.iterations):
+            for peer in active:
+                peer.send(b'x')
+            threadless.run_once()
+            for peer in active:
+                with contextlib.suppress(BlockingIOError):
+                    peer.recv(65536, socket.MSG_DONTWAIT)
+        elapsed = (time.time() - start) / args.iterations
+        return Counter(counting.calls), elapsed
+    finally:
+        for work_id in list(threadless.works):
+            threadless.cleanup(work_id)
+        for peer in active:
+            peer.close()
+        idle.close()
+        idle_peer.close()
+        threadless.loop.close()
+        threadless.selector.close()
+
+
+def main(input_args: List[str]) -> None:
+    args = init_parser().parse_args(input_args)
+    print('%d idle and %d active works, per iteration averages over %d iterations' %
+          (args.idle, args.active, args.iterations))
+    print('%12s %10s %10s %10s %10s %10s' %
+          ('mode', 'register', 'modify', 'unregister', 'total', 'ms'))
+    for name, klass in (('rebuild', RebuildingThreadless), ('persistent', Threadless)):
+        calls, elapsed = measure(klass, args)
+        print('%12s %10.1f %10.1f %10.1f %10.1f %10.2f' % (
+            name,
+            calls['register'] / args.iterations,
+            calls['modify'] / args.iterations,
+            calls['unregister'] / args.iterations,
+            sum(calls.values()) / args.iterations,
+            elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡Fast, Lightweight, Programmable, TLS interception capable
+    proxy server for Application debugging, testing and development.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import argparse
+import os
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+from proxy.common.constants import __homepage__
+from proxy.common.utils import build_http_request
+from proxy.http.methods import httpMethods
+
+from benchmark.upstream_pool import UpstreamHandler, UpstreamServer
+from benchmark.utils import get_available_port, proxy_process, percentile
+
+DEFAULT_CONNECTIONS = 8
+DEFAULT_REQUESTS = 25
+DEFAULT_UPSTREAM_DELAY = 50
+
+
+def init_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='Opens intercepted HTTPS connections through a single '
+                    'threadless proxy.py worker to an upstream server which '
+                    'is slow to respond to TLS handshakes.  Meanwhile plain '
+                    'HTTP requests are sent through the same worker.  Reports '
+                    'HTTPS connection rate and plain request latency.',
+        epilog='Proxy.py not working? Report at: %s/issues/new' % __homepage__
+    )
+    parser.add_argument(
+        '--connections',
+        type=int,
+        default=DEFAULT_CONNECTIONS,
+        help='Default: %d.  Number of concurrent HTTPS clients.' % DEFAULT_CONNECTIONS)
+    parser.add_argument(
+        '--requests',
+        type=int,
+        default=DEFAULT_REQUESTS,
+        help='Default: %d.  Intercepted connections opened by each HTTPS client.' % DEFAULT_REQUESTS)
+    parser.add_argument(
+        '--upstream-delay',
+        type=int,
+        default=DEFAULT_UPSTREAM_DELAY,
+        help='Default: %d.  Milliseconds before upstream responds to a handshake, '
+             'i.e. emulated round trip time.' % DEFAULT_UPSTREAM_DELAY)
+    return parser
+
+
+def openssl(*args: str) -> None:
+    subprocess.run(['openssl'] + list(args), check=True, capture_output=True)
+
+
+def generate_ca(directory: str, upstream_ips: Tuple[str, ...] = ('127.0.0.1',)) -> Dict[str, str]:
+    """Generates CA and signing key for proxy.py, as does `make ca-certificates`,
+    and a certificate signed by CA for upstream server at upstream_ips."""
+    paths = {name: os.path.join(directory, '%s.pem' % name) for name in (
+        'ca-key', 'ca-cert', 'ca-signing-key', 'upstream-key', 'upstream-cert')}
+    paths['ca-cert-dir'] = os.path.join(directory, 'certificates')
+    os.mkdir(paths['ca-cert-dir'])
+    openssl('genrsa', '-out', paths['ca-key'], '2048')
+    openssl('req', '-new', '-x509', '-days', '1', '-key', paths['ca-key'],
+            '-subj', '/CN=proxy.py benchmark CA', '-out', paths['ca-cert'])
+    openssl('genrsa', '-out', paths['ca-signing-key'], '2048')
+    openssl('genrsa', '-out', paths['upstream-key'], '2048')
+    csr = os.path.join(directory, 'upstream.csr')
+    openssl('req', '-new', '-key', paths['upstream-key'], '-subj', '/CN=%s' % upstream_ips[0], '-out', csr)
+    extensions = os.path.join(directory, 'upstream.ext')
+    with open(extensions, 'w') as f:
+        f.write('subjectAltName=%s\n' % ','.join('IP:%s' % ip for ip in upstream_ips))
+    openssl('x509', '-req', '-days', '1', '-in', csr, '-CA', paths['ca-cert'],
+            '-CAkey', paths['ca-key'], '-set_serial', '1', '-extfile', extensions,
+            '-out', paths['upstream-cert'])
+    return paths
+
+
+class TlsUpstreamServer(UpstreamServer):
+    """Responds to TLS handshakes after delay seconds."""
+
+    def __init__(self, certfile: str, keyfile: str, delay: float, *args: Any) -> None:
+        super().__init__(*args)
+        self.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self.context.load_cert_chain(certfile, keyfile)
+        self.delay = delay
+        # Whether session was resumed, for each completed handshake
+        self.resumed: List[bool] = []
+
+    def finish_request(self, request: Any, client_address: Any) -> None:
+        time.sleep(self.delay)
+        try:
+            conn = self.context.wrap_socket(request, server_side=True)
+        except OSError:
+            return
+        self.resumed.append(conn.session_reused is True)
+        super().finish_request(conn, client_address)
+
+
+def serve(server: UpstreamServer) -> threading.Thread:
+    serving = threading.Thread(target=server.serve_forever)
+    serving.start()
+    return serving
+
+
+def https_client(proxy_port: int, upstream_port: int, cafile: str, requests: int,
+                 failures: List[int]) -> None:
+    ctx = ssl.create_default_context(cafile=cafile)
+    # Certificates generated using openssl command only carry subject CN
+    ctx.check_hostname = False
+    netloc = b'127.0.0.1:%d' % upstream_port
+    for _ in range(requests):
+        try:
+            with socket.create_connection(('127.0.0.1', proxy_port)) as conn:
+                conn.sendall(build_http_request(
+                    httpMethods.CONNECT, netloc, headers={b'Host': netloc}))
+                response = b''
+                while not response.endswith(b'\r\n\r\n'):
+                    response += conn.recv(65536)
+                with ctx.wrap_socket(conn) as tls:
+                    tls.sendall(build_http_request(httpMethods.GET, b'/', headers={b'Host': netloc}))
+                    response = b''
+                    while not response.endswith(b'hello'):
+                        chunk = tls.recv(65536)
+                        if not chunk:
+                            raise ConnectionError('Connection closed by proxy')
+                        response += chunk
+        except OSError:
+            failures.append(1)
+
+
+def benchmark(args: argparse.Namespace) -> Tuple[float, int, List[float]]:
+    """Returns intercepted connections per second, failed intercepted
+    connections and latency of plain requests in milliseconds."""
+    with tempfile.TemporaryDirectory() as directory:
+        paths = generate_ca(directory)
+        upstream = UpstreamServer(('127.0.0.1', 0), UpstreamHandler)
+        tls_upstream = TlsUpstreamServer(
+            paths['upstream-cert'], paths['upstream-key'], args.upstream_delay / 1000,
+            ('127.0.0.1', 0), UpstreamHandler)
+        servings = [serve(upstream), serve(tls_upstream)]
+        netloc = b'127.0.0.1:%d' % upstream.server_address[1]
+        request = build_http_request(
+            httpMethods.GET, b'http://%s/' % netloc, headers={b'Host': netloc})
+        port = get_available_port()
+        # proxy.py verifies upstream certificate against benchmark CA
+        os.environ['SSL_CERT_FILE'] = paths['ca-cert']
+        samples: List[float] = []
+        failures: List[int] = []
+        try:
+            with proxy_process(port, [
+                    '--threadless', '--num-workers', '1',
+                    '--ca-key-file', paths['ca-key'], '--ca-cert-file', paths['ca-cert'],
+                    '--ca-signing-key-file', paths['ca-signing-key'],
+                    '--ca-cert-dir', paths['ca-cert-dir']]):
+                # Generates certificate for upstream once, before measurements
+                https_client(port, tls_upstream.server_address[1], paths['ca-cert'], 1, failures)
+                clients = [threading.Thread(target=https_client, args=(
+                    port, tls_upstream.server_address[1], paths['ca-cert'], args.requests, failures))
+                    for _ in range(args.connections)]
+                start = time.time()
+                for client in clients:
+                    client.start()
+                while any(client.is_alive() for client in clients):
+                    sample_start = time.time()
+                    with socket.create_connection(('127.0.0.1', port)) as conn:
+                        conn.sendall(request)
+                        response = b''
+                        while not response.endswith(b'hello'):
+                            response += conn.recv(65536)
+                    samples.append((time.time() - sample_start) * 1000)
+                elapsed = time.time() - start
+                for client in clients:
+                    client.join()
+            return args.connections * args.requests / elapsed, len(failures), samples
+        finally:
+            del os.environ['SSL_CERT_FILE']
+            for server in (upstream, tls_upstream):
+                server.shutdown()
+                server.server_close()
+            for serving in servings:
+                serving.join()
+
+
+def main(input_args: List[str]) -> None:
+    args = init_parser().parse_args(input_args)
+    print('%d clients x %d intercepted connections, upstream handshake delay %d ms' % (
+        args.connections, args.requests, args.upstream_delay))
+    rate, failed, samples = benchmark(args)
+    print('%14s %8s %14s %14s %14s' % (
+        'https conn/sec', 'failed', 'plain requests', 'plain p50 ms', 'plain p99 ms'))
+    print('%14.1f %8d %14d %14.2f %14.2f' % (
+        rate, failed, len(samples), percentile(samples, 50), percentile(samples, 99)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡Fast, Lightweight, Programmable, TLS interception capable
+    proxy server for Application debugging, testing and development.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import argparse
+import socket
+import ssl
+import sys
+import tempfile
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from proxy.common.constants import __homepage__
+from proxy.common.utils import build_http_request
+from proxy.http.methods import httpMethods
+
+from benchmark.tls_interception import generate_ca
+from benchmark.upstream_pool import UpstreamHandler, UpstreamServer
+from benchmark.utils import get_available_port, proxy_process, percentile
+
+DEFAULT_CONNECTIONS = 1000
+MODES = ('full', 'resume')
+
+
+def init_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='Sends plain HTTP requests through proxy.py started with '
+                    '--cert-file and --key-file, each over a new TLS connection.  '
+                    'Reports handshakes per second with full handshakes and '
+                    'with clients resuming previous session.',
+        epilog='Proxy.py not working? Report at: %s/issues/new' % __homepage__
+    )
+    parser.add_argument(
+        '--connections',
+        type=int,
+        default=DEFAULT_CONNECTIONS,
+        help='Default: %d.  Number of sequential connections per mode.' % DEFAULT_CONNECTIONS)
+    parser.add_argument(
+        '--modes',
+        type=str,
+        default=','.join(MODES),
+        help='Comma separated list of modes to benchmark.')
+    return parser
+
+
+def benchmark(args: argparse.Namespace) -> List[Tuple[str, List[float], int]]:
+    """Returns connection latency in milliseconds and number of
+    resumed sessions for each mode."""
+    results: List[Tuple[str, List[float], int]] = []
+    with tempfile.TemporaryDirectory() as directory:
+        paths = generate_ca(directory)
+        upstream = UpstreamServer(('127.0.0.1', 0), UpstreamHandler)
+        serving = threading.Thread(target=upstream.serve_forever)
+        serving.start()
+        netloc = b'127.0.0.1:%d' % upstream.server_address[1]
+        request = build_http_request(
+            httpMethods.GET, b'http://%s/' % netloc, headers={b'Host': netloc})
+        ctx = ssl.create_default_context(cafile=paths['ca-cert'])
+        port = get_available_port()
+        try:
+            with proxy_process(port, [
+                    '--threadless', '--num-workers', '1',
+                    '--cert-file', paths['upstream-cert'], '--key-file', paths['upstream-key']]):
+                for mode in args.modes.split(','):
+                    samples: List[float] = []
+                    resumed = 0
+                    session: Optional[ssl.SSLSession] = None
+                    for _ in range(args.connections):
+                        start = time.time()
+                        with socket.create_connection(('127.0.0.1', port)) as conn:
+                            with ctx.wrap_socket(
+                                    conn, server_hostname='127.0.0.1',
+                                    session=session if mode == 'resume' else None) as tls:
+                                tls.sendall(request)
+                                response = b''
+                                while not response.endswith(b'hello'):
+                                    response += tls.recv(65536)
+                                resumed += tls.session_reused is True
+                                session = tls.session
+                        samples.append((time.time() - start) * 1000)
+                    results.append((mode, samples, resumed))
+            return results
+        finally:
+            upstream.shutdown()
+            upstream.server_close()
+            serving.join()
+
+
+def main(input_args: List[str]) -> None:
+    args = init_parser().parse_args(input_args)
+    print('%d connections per mode' % args.connections)
+    print('%10s %14s %10s %10s %10s' % ('mode', 'handshake/sec', 'p50 ms', 'p99 ms', 'resumed'))
+    for mode, samples, resumed in benchmark(args):
+        print('%10s %14.1f %10.2f %10.2f %10d' % (
+            mode, len(samples) / (sum(samples) / 1000),
+            percentile(samples, 50), percentile(samples, 99), resumed))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
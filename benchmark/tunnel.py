@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡Fast, Lightweight, Programmable, TLS interception capable
+    proxy server for Application debugging, testing and development.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import argparse
+import socket
+import sys
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from proxy.common.constants import __homepage__, DEFAULT_BUFFER_SIZE
+
+from benchmark.utils import get_available_port, proxy_process, cpu_seconds
+
+DEFAULT_SIZE_MB = 1024
+
+MODES: Dict[str, List[str]] = {
+    'python': ['--disable-splice'],
+    'splice': [],
+}
+
+
+def init_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='Downloads a large body through a CONNECT tunnel and '
+                    'reports throughput and CPU time consumed by proxy.py '
+                    'processes, with and without splice(2).  Linux only.',
+        epilog='Proxy.py not working? Report at: %s/issues/new' % __homepage__
+    )
+    parser.add_argument(
+        '--size',
+        type=int,
+        default=DEFAULT_SIZE_MB,
+        help='Default: %d.  Size of downloaded body in MB.' % DEFAULT_SIZE_MB)
+    parser.add_argument(
+        '--modes',
+        type=str,
+        default=','.join(MODES.keys()),
+        help='Comma separated list of modes to benchmark.')
+    return parser
+
+
+def serve(server: socket.socket, size: int) -> None:
+    conn, _ = server.accept()
+    # Wait for client to start the transfer, i.e. tunnel has been established
+    conn.recv(1)
+    chunk = b'x' * DEFAULT_BUFFER_SIZE
+    remaining = size
+    try:
+        while remaining > 0:
+            conn.sendall(chunk[:remaining])
+            remaining -= len(chunk)
+    finally:
+        conn.close()
+
+
+def download(mode: str, args: argparse.Namespace) -> Tuple[float, float]:
+    """Returns seconds taken and proxy.py CPU seconds consumed."""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+    upstream_port = server.getsockname()[1]
+    size = args.size * 1024 * 1024
+    serving = threading.Thread(target=serve, args=(server, size))
+    serving.start()
+    port = get_available_port()
+    try:
+        with proxy_process(port, MODES[mode] + ['--threadless', '--num-workers', '1']) as proc:
+            with socket.create_connection(('127.0.0.1', port)) as conn:
+                conn.sendall(
+                    b'CONNECT 127.0.0.1:%d HTTP/1.1\r\n\r\n' % upstream_port)
+                conn.recv(1024)
+                cpu, start = cpu_seconds(proc.pid), time.time()
+                conn.sendall(b'\x00')
+                received = 0
+                while received < size:
+                    data = conn.recv(DEFAULT_BUFFER_SIZE)
+                    if not data:
+                        break
+                    received += len(data)
+                return time.time() - start, cpu_seconds(proc.pid) - cpu
+    finally:
+        serving.join()
+        server.close()
+
+
+def main(input_args: List[str]) -> None:
+    args = init_parser().parse_args(input_args)
+    print('Downloading %d MB' % args.size)
+    print('%10s %10s %10s %14s' % ('mode', 'seconds', 'MB/sec', 'cpu seconds'))
+    for mode in args.modes.split(','):
+        elapsed, cpu = download(mode, args)
+        print('%10s %10.2f %10.1f %14.2f' % (
+            mode, elapsed, args.size / elapsed, cpu))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡Fast, Lightweight, Programmable, TLS interception capable
+    proxy server for Application debugging, testing and development.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import argparse
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+from proxy.common.constants import __homepage__
+from proxy.common.utils import build_http_request
+from proxy.http.methods import httpMethods
+
+from benchmark.utils import get_available_port, proxy_process, percentile
+
+DEFAULT_REQUESTS = 2000
+
+MODES: Dict[str, List[str]] = {
+    'no-pool': ['--pool-max-idle-per-host', '0'],
+    'pool': [],
+}
+
+
+def init_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='Sends plain HTTP requests through proxy.py, each over a '
+                    'new client connection, to a keep-alive upstream server.  '
+                    'Reports latency and number of upstream connections, '
+                    'with and without upstream connection pool.',
+        epilog='Proxy.py not working? Report at: %s/issues/new' % __homepage__
+    )
+    parser.add_argument(
+        '--requests',
+        type=int,
+        default=DEFAULT_REQUESTS,
+        help='Default: %d.  Number of requests.' % DEFAULT_REQUESTS)
+    parser.add_argument(
+        '--modes',
+        type=str,
+        default=','.join(MODES.keys()),
+        help='Comma separated list of modes to benchmark.')
+    return parser
+
+
+class UpstreamHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, avoid delayed ACK stalls
+    # on kept-alive connections
+    disable_nagle_algorithm = True
+
+    def do_GET(self) -> None:
+        body = b'hello'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: str) -> None:
+        pass
+
+
+class UpstreamServer(ThreadingHTTPServer):
+    """Counts accepted connections."""
+
+    daemon_threads = True
+    accepted = 0
+
+    def get_request(self) -> Tuple[socket.socket, Tuple[str, int]]:
+        self.accepted += 1
+        conn, addr = self.socket.accept()
+        return conn, addr
+
+
+def benchmark(mode: str, args: argparse.Namespace) -> Tuple[List[float], int]:
+    upstream = UpstreamServer(('127.0.0.1', 0), UpstreamHandler)
+    serving = threading.Thread(target=upstream.serve_forever)
+    serving.start()
+    upstream_port = upstream.server_address[1]
+    request = build_http_request(
+        httpMethods.GET, b'http://127.0.0.1:%d/' % upstream_port,
+        headers={b'Host': b'127.0.0.1:%d' % upstream_port})
+    port = get_available_port()
+    samples: List[float] = []
+    try:
+        with proxy_process(port, MODES[mode] + ['--threadless', '--num-workers', '1']):
+            for _ in range(args.requests):
+                start = time.time()
+                with socket.create_connection(('127.0.0.1', port)) as conn:
+                    conn.sendall(request)
+                    response = b''
+                    while not response.endswith(b'hello'):
+                        response += conn.recv(65536)
+                samples.append((time.time() - start) * 1000)
+        return samples, upstream.accepted
+    finally:
+        upstream.shutdown()
+        upstream.server_close()
+        serving.join()
+
+
+def main(input_args: List[str]) -> None:
+    args = init_parser().parse_args(input_args)
+    print('%10s %10s %10s %10s %22s' %
+          ('mode', 'req/sec', 'p50 ms', 'p99 ms', 'upstream connections'))
+    for mode in args.modes.split(','):
+        samples, accepted = benchmark(mode, args)
+        print('%10s %10.1f %10.2f %10.2f %22d' % (
+            mode, len(samples) / (sum(samples) / 1000), percentile(samples, 50),
+            percentile(samples, 99), accepted))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
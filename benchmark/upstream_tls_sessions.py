@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡Fast, Lightweight, Programmable, TLS interception capable
+    proxy server for Application debugging, testing and development.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import argparse
+import os
+import ssl
+import sys
+import tempfile
+from typing import List, Tuple
+
+from proxy.common.constants import __homepage__
+
+from benchmark.certificates import handshake
+from benchmark.tls_interception import TlsUpstreamServer, generate_ca, serve
+from benchmark.upstream_pool import UpstreamHandler
+from benchmark.utils import cpu_seconds, get_available_port, proxy_process, percentile
+
+DEFAULT_CONNECTIONS = 500
+
+
+def init_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description='Opens intercepted HTTPS connections, one after another, '
+                    'through proxy.py to the same upstream.  proxy.py trusts '
+                    'system CA certificates besides benchmark CA.  Reports '
+                    'latency until client handshake completes, CPU time of '
+                    'proxy.py per connection and share of upstream handshakes '
+                    'which resumed a session.',
+        epilog='Proxy.py not working? Report at: %s/issues/new' % __homepage__
+    )
+    parser.add_argument(
+        '--connections',
+        type=int,
+        default=DEFAULT_CONNECTIONS,
+        help='Default: %d.  Intercepted connections to open.' % DEFAULT_CONNECTIONS)
+    parser.add_argument(
+        '--disable-sessions',
+        action='store_true',
+        help='Start proxy.py with --upstream-tls-session-cache-size 0.')
+    return parser
+
+
+def benchmark(args: argparse.Namespace) -> Tuple[List[float], float, float]:
+    """Returns latency samples in milliseconds, proxy.py CPU milliseconds
+    per connection and ratio of resumed upstream handshakes."""
+    with tempfile.TemporaryDirectory() as directory:
+        paths = generate_ca(directory)
+        trusted = os.path.join(directory, 'trusted.pem')
+        with open(trusted, 'w') as f:
+            cafile = ssl.get_default_verify_paths().cafile
+            if cafile is not None:
+                with open(cafile) as system:
+                    f.write(system.read())
+            with open(paths['ca-cert']) as ca:
+                f.write(ca.read())
+        upstream = TlsUpstreamServer(
+            paths['upstream-cert'], paths['upstream-key'], 0, ('127.0.0.1', 0), UpstreamHandler)
+        serving = serve(upstream)
+        ctx = ssl.create_default_context(cafile=paths['ca-cert'])
+        # Certificates generated using openssl command only carry subject CN
+        ctx.check_hostname = False
+        port = get_available_port()
+        options = [
+            '--threadless', '--num-workers', '1',
+            '--ca-key-file', paths['ca-key'], '--ca-cert-file', paths['ca-cert'],
+            '--ca-signing-key-file', paths['ca-signing-key'],
+            '--ca-cert-dir', paths['ca-cert-dir']]
+        if args.disable_sessions:
+            options += ['--upstream-tls-session-cache-size', '0']
+        # proxy.py verifies upstream certificate against system and benchmark CA
+        os.environ['SSL_CERT_FILE'] = trusted
+        try:
+            with proxy_process(port, options) as proc:
+                # Generates certificate for upstream once, before measurements
+                handshake(port, '127.0.0.1', upstream.server_address[1], ctx)
+                del upstream.resumed[:]
+                cpu = cpu_seconds(proc.pid)
+                samples = [handshake(port, '127.0.0.1', upstream.server_address[1], ctx)
+                           for _ in range(args.connections)]
+                cpu = cpu_seconds(proc.pid) - cpu
+            resumed = sum(upstream.resumed) / max(1, len(upstream.resumed))
+            return samples, cpu * 1000 / args.connections, resumed
+        finally:
+            del os.environ['SSL_CERT_FILE']
+            upstream.shutdown()
+            upstream.server_close()
+            serving.join()
+
+
+def main(input_args: List[str]) -> None:
+    args = init_parser().parse_args(input_args)
+    print('%d intercepted connections' % args.connections)
+    samples, cpu, resumed = benchmark(args)
+    print('%10s %10s %10s %14s %10s' % ('mean ms', 'p50 ms', 'p99 ms', 'proxy cpu ms', 'resumed'))
+    print('%10.2f %10.2f %10.2f %14.2f %9.0f%%' % (
+        sum(samples) / len(samples), percentile(samples, 50), percentile(samples, 99), cpu, resumed * 100))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
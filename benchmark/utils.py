@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡Fast, Lightweight, Programmable, TLS interception capable
+    proxy server for Application debugging, testing and development.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import contextlib
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from typing import Generator, List
+
+
+def get_available_port() -> int:
+    with contextlib.closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as sock:
+        sock.bind(('127.0.0.1', 0))
+        _, port = sock.getsockname()
+        return int(port)
+
+
+def wait_for_port(port: int, timeout: float = 10.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError('proxy.py did not start listening on port %d' % port)
+
+
+@contextlib.contextmanager
+def proxy_process(port: int, args: List[str]) -> Generator['subprocess.Popen[bytes]', None, None]:
+    """Starts proxy.py in a subprocess listening on 127.0.0.1:port.
+
+    proxy.py is started in its own process group so that acceptor
+    and threadless processes are also interrupted on exit."""
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'proxy',
+         '--hostname', '127.0.0.1',
+         '--port', str(port),
+         '--log-level', 'WARNING'] + args,
+        start_new_session=True)
+    try:
+        wait_for_port(port)
+        yield proc
+    finally:
+        os.killpg(proc.pid, signal.SIGINT)
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+            proc.wait()
+
+
+def process_group_pids(pgid: int) -> List[int]:
+    """Pids of all processes within process group.  Linux only."""
+    pids: List[int] = []
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            if os.getpgid(int(pid)) == pgid:
+                pids.append(int(pid))
+        except ProcessLookupError:
+            continue
+    return pids
+
+
+def cpu_seconds(pgid: int) -> float:
+    """User and system CPU time consumed by live processes within process group."""
+    total = 0.0
+    for pid in process_group_pids(pgid):
+        try:
+            with open('/proc/%d/stat' % pid) as stat:
+                fields = stat.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        # utime and stime, fields 14 and 15 of proc(5)
+        total += (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    return total
+
+
+def percentile(samples: List[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
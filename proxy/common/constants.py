@@ -40,39 +40,67 @@ PROXY_AGENT_HEADER = PROXY_AGENT_HEADER_KEY + \
     COLON + WHITESPACE + PROXY_AGENT_HEADER_VALUE
 
 # Defaults
+DEFAULT_ACCEPT_BATCH_SIZE = 16
+DEFAULT_ASYNCIO = False
 DEFAULT_BACKLOG = 100
 DEFAULT_BASIC_AUTH = None
 DEFAULT_BUFFER_SIZE = 1024 * 1024
+DEFAULT_CA_CERT_CACHE_SIZE = 1024
 DEFAULT_CA_CERT_DIR = None
 DEFAULT_CA_CERT_FILE = None
+DEFAULT_CA_CERT_WARM_UP_FILE = None
+DEFAULT_CA_CERT_WILDCARD = False
 DEFAULT_CA_KEY_FILE = None
 DEFAULT_CA_SIGNING_KEY_FILE = None
 DEFAULT_CERT_FILE = None
 DEFAULT_CLIENT_RECVBUF_SIZE = DEFAULT_BUFFER_SIZE
+DEFAULT_CONNECT_TIMEOUT = 10
 DEFAULT_DEVTOOLS_WS_PATH = b'/devtools'
 DEFAULT_DISABLE_HEADERS: List[bytes] = []
 DEFAULT_DISABLE_HTTP_PROXY = False
+DEFAULT_DISABLE_SPLICE = False
+DEFAULT_DISPATCH_POLICY = 'round-robin'
+DEFAULT_DNS_CACHE_TTL = 60
+DEFAULT_DNS_NEGATIVE_CACHE_TTL = 5
+DEFAULT_DNS_RESOLVER_THREADS = 4
 DEFAULT_ENABLE_DEVTOOLS = False
 DEFAULT_ENABLE_EVENTS = False
 DEFAULT_EVENTS_QUEUE = None
 DEFAULT_ENABLE_STATIC_SERVER = False
 DEFAULT_ENABLE_WEB_SERVER = False
+DEFAULT_EVENT_LOOP_POLICY = 'auto'
+DEFAULT_HIGH_WATERMARK = 4 * DEFAULT_BUFFER_SIZE
 DEFAULT_IPV4_HOSTNAME = ipaddress.IPv4Address('127.0.0.1')
 DEFAULT_IPV6_HOSTNAME = ipaddress.IPv6Address('::1')
 DEFAULT_KEY_FILE = None
+DEFAULT_LOCAL_EXECUTOR = False
 DEFAULT_LOG_FILE = None
 DEFAULT_LOG_FORMAT = '%(asctime)s - pid:%(process)d [%(levelname)-.1s] %(funcName)s:%(lineno)d - %(message)s'
 DEFAULT_LOG_LEVEL = 'INFO'
+DEFAULT_LOW_WATERMARK = DEFAULT_BUFFER_SIZE
 DEFAULT_NUM_WORKERS = 0
 DEFAULT_OPEN_FILE_LIMIT = 1024
 DEFAULT_PAC_FILE = None
 DEFAULT_PAC_FILE_URL_PATH = b'/'
 DEFAULT_PID_FILE = None
 DEFAULT_PLUGINS = ''
+DEFAULT_POOL_IDLE_TTL = 30
+DEFAULT_POOL_MAX_IDLE_PER_HOST = 8
 DEFAULT_PORT = 8899
+DEFAULT_REUSE_PORT = False
 DEFAULT_SERVER_RECVBUF_SIZE = DEFAULT_BUFFER_SIZE
 DEFAULT_STATIC_SERVER_DIR = os.path.join(
     os.path.dirname(PROXY_PY_DIR), 'public')
+DEFAULT_STATS_INTERVAL = 0
+DEFAULT_STATS_SAMPLES = 1000
 DEFAULT_THREADLESS = False
+DEFAULT_THREADLESS_LOOPS = 1
+DEFAULT_THREAD_POOL_MAX_INFLIGHT = 0
+DEFAULT_THREAD_POOL_QUEUE_SIZE = 1024
+DEFAULT_THREAD_POOL_SIZE = 0
+DEFAULT_THREAD_STACK_SIZE = 0
 DEFAULT_TIMEOUT = 10
+DEFAULT_TLS_INTERCEPTION_BYPASS_FILE = None
+DEFAULT_UPSTREAM_TLS_SESSION_CACHE_SIZE = 1024
+DEFAULT_UPSTREAM_TLS_SESSION_TTL = 3600
 DEFAULT_VERSION = False
@@ -23,9 +23,20 @@ from .constants import DEFAULT_TIMEOUT, DEFAULT_DEVTOOLS_WS_PATH, DEFAULT_DISABL
 from .constants import DEFAULT_ENABLE_STATIC_SERVER, DEFAULT_ENABLE_EVENTS, DEFAULT_ENABLE_DEVTOOLS
 from .constants import DEFAULT_ENABLE_WEB_SERVER, DEFAULT_THREADLESS, DEFAULT_CERT_FILE, DEFAULT_KEY_FILE
 from .constants import DEFAULT_CA_CERT_DIR, DEFAULT_CA_CERT_FILE, DEFAULT_CA_KEY_FILE, DEFAULT_CA_SIGNING_KEY_FILE
+from .constants import DEFAULT_CA_CERT_CACHE_SIZE, DEFAULT_CA_CERT_WARM_UP_FILE, DEFAULT_CA_CERT_WILDCARD
 from .constants import DEFAULT_PAC_FILE_URL_PATH, DEFAULT_PAC_FILE, DEFAULT_PLUGINS, DEFAULT_PID_FILE, DEFAULT_PORT
 from .constants import DEFAULT_NUM_WORKERS, DEFAULT_VERSION, DEFAULT_OPEN_FILE_LIMIT, DEFAULT_IPV6_HOSTNAME
 from .constants import DEFAULT_SERVER_RECVBUF_SIZE, DEFAULT_CLIENT_RECVBUF_SIZE, DEFAULT_STATIC_SERVER_DIR
+from .constants import DEFAULT_REUSE_PORT, DEFAULT_ACCEPT_BATCH_SIZE, DEFAULT_STATS_INTERVAL
+from .constants import DEFAULT_LOCAL_EXECUTOR, DEFAULT_THREADLESS_LOOPS, DEFAULT_DISPATCH_POLICY
+from .constants import DEFAULT_ASYNCIO, DEFAULT_EVENT_LOOP_POLICY
+from .constants import DEFAULT_THREAD_POOL_SIZE, DEFAULT_THREAD_POOL_MAX_INFLIGHT, DEFAULT_THREAD_POOL_QUEUE_SIZE
+from .constants import DEFAULT_THREAD_STACK_SIZE, DEFAULT_HIGH_WATERMARK, DEFAULT_LOW_WATERMARK
+from .constants import DEFAULT_DISABLE_SPLICE, DEFAULT_POOL_IDLE_TTL, DEFAULT_POOL_MAX_IDLE_PER_HOST
+from .constants import DEFAULT_CONNECT_TIMEOUT
+from .constants import DEFAULT_DNS_CACHE_TTL, DEFAULT_DNS_NEGATIVE_CACHE_TTL, DEFAULT_DNS_RESOLVER_THREADS
+from .constants import DEFAULT_UPSTREAM_TLS_SESSION_CACHE_SIZE, DEFAULT_UPSTREAM_TLS_SESSION_TTL
+from .constants import DEFAULT_TLS_INTERCEPTION_BYPASS_FILE
 from .constants import COMMA
 from .constants import __homepage__
 from .version import __version__
@@ -38,6 +49,21 @@ def init_parser() -> argparse.ArgumentParser:
         epilog='Proxy.py not working? Report at: %s/issues/new' % __homepage__
     )
     # Argument names are ordered alphabetically.
+    parser.add_argument(
+        '--accept-batch-size',
+        type=int,
+        default=DEFAULT_ACCEPT_BATCH_SIZE,
+        help='Default: ' + str(DEFAULT_ACCEPT_BATCH_SIZE) + '.  Maximum number of '
+             'pending connections an acceptor accepts per wakeup before '
+             'dispatching them to workers.')
+    parser.add_argument(
+        '--asyncio',
+        action='store_true',
+        default=DEFAULT_ASYNCIO,
+        help='Default: False.  When enabled, client connections are handled by '
+             'asyncio event loop processes instead of threadless processes.  '
+             'Implies --threadless.  See --event-loop-policy.'
+    )
     parser.add_argument(
         '--backlog',
         type=int,
@@ -56,6 +82,15 @@ def init_parser() -> argparse.ArgumentParser:
         help='Default: None. CA key to use for signing dynamically generated '
              'HTTPS certificates.  If used, must also pass --ca-cert-file and --ca-signing-key-file'
     )
+    parser.add_argument(
+        '--ca-cert-cache-size',
+        type=int,
+        default=DEFAULT_CA_CERT_CACHE_SIZE,
+        help='Default: 1024.  Maximum number of hosts for which certificates '
+             'generated for TLS interception are kept ready in memory, per process.  '
+             'Least recently used are evicted, certificates remain cached '
+             'within --ca-cert-dir.'
+    )
     parser.add_argument(
         '--ca-cert-dir',
         type=str,
@@ -70,6 +105,21 @@ def init_parser() -> argparse.ArgumentParser:
         help='Default: None. Signing certificate to use for signing dynamically generated '
              'HTTPS certificates.  If used, must also pass --ca-key-file and --ca-signing-key-file'
     )
+    parser.add_argument(
+        '--ca-cert-warm-up-file',
+        type=str,
+        default=DEFAULT_CA_CERT_WARM_UP_FILE,
+        help='Default: None.  File listing hosts, one per line, for which certificates '
+             'are generated and loaded before accepting connections.  Requires TLS '
+             'interception, see --ca-key-file'
+    )
+    parser.add_argument(
+        '--ca-cert-wildcard',
+        action='store_true',
+        default=DEFAULT_CA_CERT_WILDCARD,
+        help='Default: False.  Issue wildcard certificates for TLS interception, '
+             'e.g. *.example.com for api.example.com, reused for its sibling hosts.'
+    )
     parser.add_argument(
         '--ca-signing-key-file',
         type=str,
@@ -92,6 +142,13 @@ def init_parser() -> argparse.ArgumentParser:
              'client in a single recv() operation. Bump this '
              'value for faster uploads at the expense of '
              'increased RAM.')
+    parser.add_argument(
+        '--connect-timeout',
+        type=int,
+        default=DEFAULT_CONNECT_TIMEOUT,
+        help='Default: %d.  Seconds to wait for upstream connection to be '
+             'established.  Client receives a 502 Bad Gateway response '
+             'on timeout.' % DEFAULT_CONNECT_TIMEOUT)
     parser.add_argument(
         '--devtools-ws-path',
         type=str,
@@ -110,6 +167,44 @@ def init_parser() -> argparse.ArgumentParser:
         action='store_true',
         default=DEFAULT_DISABLE_HTTP_PROXY,
         help='Default: False.  Whether to disable proxy.HttpProxyPlugin.')
+    parser.add_argument(
+        '--disable-splice',
+        action='store_true',
+        default=DEFAULT_DISABLE_SPLICE,
+        help='Default: False.  By default, on Linux, CONNECT tunnels are relayed '
+             'within kernel using splice(2) when TLS interception is disabled '
+             'and no loaded plugin inspects tunnel data.  Use this flag to '
+             'always relay tunnel data through proxy.py.')
+    parser.add_argument(
+        '--dispatch-policy',
+        type=str,
+        default=DEFAULT_DISPATCH_POLICY,
+        choices=['round-robin', 'least-works', 'lowest-lag'],
+        help='Default: ' + DEFAULT_DISPATCH_POLICY + '.  Only applicable when '
+             '--threadless-loops is greater than 1.  Decides which threadless '
+             'process receives next accepted client.  least-works picks process '
+             'managing fewest connections, lowest-lag picks process which spent '
+             'least time handling its last wakeup.'
+    )
+    parser.add_argument(
+        '--dns-cache-ttl',
+        type=int,
+        default=DEFAULT_DNS_CACHE_TTL,
+        help='Default: %d.  Seconds for which resolved upstream addresses '
+             'are cached by each process.  Use 0 to disable '
+             'caching.' % DEFAULT_DNS_CACHE_TTL)
+    parser.add_argument(
+        '--dns-negative-cache-ttl',
+        type=int,
+        default=DEFAULT_DNS_NEGATIVE_CACHE_TTL,
+        help='Default: %d.  Seconds for which failed upstream name lookups '
+             'are cached by each process.' % DEFAULT_DNS_NEGATIVE_CACHE_TTL)
+    parser.add_argument(
+        '--dns-resolver-threads',
+        type=int,
+        default=DEFAULT_DNS_RESOLVER_THREADS,
+        help='Default: %d.  Number of threads per process resolving upstream '
+             'names, off the event loop.' % DEFAULT_DNS_RESOLVER_THREADS)
     parser.add_argument(
         '--enable-devtools',
         action='store_true',
@@ -137,6 +232,24 @@ def init_parser() -> argparse.ArgumentParser:
         action='store_true',
         default=DEFAULT_ENABLE_WEB_SERVER,
         help='Default: False.  Whether to enable proxy.HttpWebServerPlugin.')
+    parser.add_argument(
+        '--event-loop-policy',
+        type=str,
+        default=DEFAULT_EVENT_LOOP_POLICY,
+        help='Default: ' + DEFAULT_EVENT_LOOP_POLICY + '.  Only applicable with --asyncio.  '
+             'auto uses uvloop when installed, otherwise asyncio default event loop.  '
+             'Use asyncio to always use default event loop or pass fully qualified '
+             'name of an event loop policy class e.g. uvloop.EventLoopPolicy'
+    )
+    parser.add_argument(
+        '--high-watermark',
+        type=int,
+        default=DEFAULT_HIGH_WATERMARK,
+        help='Default: 4 MB.  Once data buffered for a client or upstream '
+             'server reaches this size, proxy stops reading from the other '
+             'side of the connection.  Reads resume once buffered data drains '
+             'to --low-watermark.  Use 0 to disable.'
+    )
     parser.add_argument('--hostname',
                         type=str,
                         default=str(DEFAULT_IPV6_HOSTNAME),
@@ -148,6 +261,15 @@ def init_parser() -> argparse.ArgumentParser:
         help='Default: None. Server key file to enable end-to-end TLS encryption with clients. '
              'If used, must also pass --cert-file.'
     )
+    parser.add_argument(
+        '--local-executor',
+        action='store_true',
+        default=DEFAULT_LOCAL_EXECUTOR,
+        help='Default: False.  When enabled, acceptor processes run the '
+             'threadless event loop themselves and accept client connections '
+             'directly into the loop.  No separate threadless processes are '
+             'started.  Use with --reuse-port to avoid thundering herd.'
+    )
     parser.add_argument(
         '--log-level',
         type=str,
@@ -159,6 +281,12 @@ def init_parser() -> argparse.ArgumentParser:
                         help='Default: sys.stdout. Log file destination.')
     parser.add_argument('--log-format', type=str, default=DEFAULT_LOG_FORMAT,
                         help='Log format for Python logger.')
+    parser.add_argument(
+        '--low-watermark',
+        type=int,
+        default=DEFAULT_LOW_WATERMARK,
+        help='Default: 1 MB.  See --high-watermark.'
+    )
     parser.add_argument('--num-workers', type=int, default=DEFAULT_NUM_WORKERS,
                         help='Defaults to number of CPU cores.')
     parser.add_argument(
@@ -190,8 +318,31 @@ def init_parser() -> argparse.ArgumentParser:
         type=str,
         default=DEFAULT_PLUGINS,
         help='Comma separated plugins')
+    parser.add_argument(
+        '--pool-idle-ttl',
+        type=int,
+        default=DEFAULT_POOL_IDLE_TTL,
+        help='Default: %d.  Seconds after which an idle pooled upstream '
+             'connection is closed.' % DEFAULT_POOL_IDLE_TTL)
+    parser.add_argument(
+        '--pool-max-idle-per-host',
+        type=int,
+        default=DEFAULT_POOL_MAX_IDLE_PER_HOST,
+        help='Default: %d.  Maximum number of idle keep-alive upstream '
+             'connections kept per host and port by each process, for reuse '
+             'by subsequent plain HTTP requests.  Use 0 to disable '
+             'upstream connection pooling.' % DEFAULT_POOL_MAX_IDLE_PER_HOST)
     parser.add_argument('--port', type=int, default=DEFAULT_PORT,
                         help='Default: 8899. Server port.')
+    parser.add_argument(
+        '--reuse-port',
+        action='store_true',
+        default=DEFAULT_REUSE_PORT,
+        help='Default: False.  When enabled, each acceptor process binds '
+             'its own listening socket using SO_REUSEPORT and kernel '
+             'load balances incoming connections across acceptors.  '
+             'When disabled, acceptors share a single listening socket.'
+    )
     parser.add_argument(
         '--server-recvbuf-size',
         type=int,
@@ -208,6 +359,49 @@ def init_parser() -> argparse.ArgumentParser:
              'This option is only applicable when static server is also enabled. '
              'See --enable-static-server.'
     )
+    parser.add_argument(
+        '--stats-interval',
+        type=int,
+        default=DEFAULT_STATS_INTERVAL,
+        help='Default: 0.  Number of seconds after which acceptor, threadless, '
+             'asyncio and thread pool event loops log internal stats of their '
+             'process.  Use 0 to disable.'
+    )
+    parser.add_argument(
+        '--thread-pool-max-inflight',
+        type=int,
+        default=DEFAULT_THREAD_POOL_MAX_INFLIGHT,
+        help='Default: ' + str(DEFAULT_THREAD_POOL_MAX_INFLIGHT) + '.  Maximum number of '
+             'client connections handled by thread pool of an acceptor at a time.  '
+             'Further connections wait in queue.  Use 0 for no limit.  '
+             'Only applicable with --thread-pool-size.'
+    )
+    parser.add_argument(
+        '--thread-pool-queue-size',
+        type=int,
+        default=DEFAULT_THREAD_POOL_QUEUE_SIZE,
+        help='Default: ' + str(DEFAULT_THREAD_POOL_QUEUE_SIZE) + '.  Maximum number of '
+             'client connections waiting for thread pool.  Connections accepted '
+             'while queue is full are closed.  '
+             'Only applicable with --thread-pool-max-inflight.'
+    )
+    parser.add_argument(
+        '--thread-pool-size',
+        type=int,
+        default=DEFAULT_THREAD_POOL_SIZE,
+        help='Default: ' + str(DEFAULT_THREAD_POOL_SIZE) + '.  When non-zero, each acceptor '
+             'hands client connections to a fixed pool of threads, each running an '
+             'event loop, instead of spawning a new thread for each client connection.  '
+             'Not applicable with --threadless.'
+    )
+    parser.add_argument(
+        '--thread-stack-size',
+        type=int,
+        default=DEFAULT_THREAD_STACK_SIZE,
+        help='Default: ' + str(DEFAULT_THREAD_STACK_SIZE) + '.  Stack size in bytes of '
+             'threads started by acceptors.  Use 0 for platform default.  '
+             'Minimum is 32768.'
+    )
     parser.add_argument(
         '--threadless',
         action='store_true',
@@ -215,6 +409,13 @@ def init_parser() -> argparse.ArgumentParser:
         help='Default: False.  When disabled a new thread is spawned '
              'to handle each client connection.'
     )
+    parser.add_argument(
+        '--threadless-loops',
+        type=int,
+        default=DEFAULT_THREADLESS_LOOPS,
+        help='Default: ' + str(DEFAULT_THREADLESS_LOOPS) + '.  Number of threadless '
+             'processes started by each acceptor.  Only applicable with --threadless.'
+    )
     parser.add_argument(
         '--timeout',
         type=int,
@@ -224,6 +425,29 @@ def init_parser() -> argparse.ArgumentParser:
              'an inactive connection must be dropped.  Inactivity is defined by no '
              'data sent or received by the client.'
     )
+    parser.add_argument(
+        '--tls-interception-bypass-file',
+        type=str,
+        default=DEFAULT_TLS_INTERCEPTION_BYPASS_FILE,
+        help='Default: None.  File listing upstream hosts whose CONNECT tunnels '
+             'are not intercepted, one per line.  Exact host e.g. example.com, '
+             'host and its subdomains e.g. .example.com, or network e.g. 10.0.0.0/8.'
+    )
+    parser.add_argument(
+        '--upstream-tls-session-cache-size',
+        type=int,
+        default=DEFAULT_UPSTREAM_TLS_SESSION_CACHE_SIZE,
+        help='Default: %d.  Maximum number of upstream host and port pairs for '
+             'which TLS sessions are kept by each process, for abbreviated '
+             'handshakes on repeat connections during TLS interception.  '
+             'Use 0 to disable.' % DEFAULT_UPSTREAM_TLS_SESSION_CACHE_SIZE)
+    parser.add_argument(
+        '--upstream-tls-session-ttl',
+        type=int,
+        default=DEFAULT_UPSTREAM_TLS_SESSION_TTL,
+        help='Default: %d.  Seconds for which upstream TLS sessions are kept, '
+             'unless upstream announces a shorter lifetime.  Use 0 to '
+             'disable.' % DEFAULT_UPSTREAM_TLS_SESSION_TTL)
     parser.add_argument(
         '--version',
         '-v',
@@ -265,8 +489,34 @@ class Flags:
             devtools_ws_path: bytes = DEFAULT_DEVTOOLS_WS_PATH,
             timeout: int = DEFAULT_TIMEOUT,
             threadless: bool = DEFAULT_THREADLESS,
-            enable_events: bool = DEFAULT_ENABLE_EVENTS) -> None:
-        self.threadless = threadless
+            enable_events: bool = DEFAULT_ENABLE_EVENTS,
+            reuse_port: bool = DEFAULT_REUSE_PORT,
+            accept_batch_size: int = DEFAULT_ACCEPT_BATCH_SIZE,
+            stats_interval: int = DEFAULT_STATS_INTERVAL,
+            local_executor: bool = DEFAULT_LOCAL_EXECUTOR,
+            threadless_loops: int = DEFAULT_THREADLESS_LOOPS,
+            dispatch_policy: str = DEFAULT_DISPATCH_POLICY,
+            asyncio: bool = DEFAULT_ASYNCIO,
+            event_loop_policy: str = DEFAULT_EVENT_LOOP_POLICY,
+            thread_pool_size: int = DEFAULT_THREAD_POOL_SIZE,
+            thread_pool_max_inflight: int = DEFAULT_THREAD_POOL_MAX_INFLIGHT,
+            thread_pool_queue_size: int = DEFAULT_THREAD_POOL_QUEUE_SIZE,
+            thread_stack_size: int = DEFAULT_THREAD_STACK_SIZE,
+            high_watermark: int = DEFAULT_HIGH_WATERMARK,
+            low_watermark: int = DEFAULT_LOW_WATERMARK,
+            disable_splice: bool = DEFAULT_DISABLE_SPLICE,
+            pool_max_idle_per_host: int = DEFAULT_POOL_MAX_IDLE_PER_HOST,
+            pool_idle_ttl: int = DEFAULT_POOL_IDLE_TTL,
+            connect_timeout: int = DEFAULT_CONNECT_TIMEOUT,
+            dns_cache_ttl: int = DEFAULT_DNS_CACHE_TTL,
+            dns_negative_cache_ttl: int = DEFAULT_DNS_NEGATIVE_CACHE_TTL,
+            dns_resolver_threads: int = DEFAULT_DNS_RESOLVER_THREADS,
+            ca_cert_cache_size: int = DEFAULT_CA_CERT_CACHE_SIZE,
+            ca_cert_wildcard: bool = DEFAULT_CA_CERT_WILDCARD,
+            upstream_tls_session_cache_size: int = DEFAULT_UPSTREAM_TLS_SESSION_CACHE_SIZE,
+            upstream_tls_session_ttl: int = DEFAULT_UPSTREAM_TLS_SESSION_TTL,
+            tls_interception_bypass_file: Optional[str] = DEFAULT_TLS_INTERCEPTION_BYPASS_FILE) -> None:
+        self.threadless = threadless or asyncio
         self.timeout = timeout
         self.auth_code = auth_code
         self.server_recvbuf_size = server_recvbuf_size
@@ -290,6 +540,32 @@ class Flags:
         self.family: socket.AddressFamily = socket.AF_INET6 if hostname.version == 6 else socket.AF_INET
         self.port: int = port
         self.backlog: int = backlog
+        self.reuse_port: bool = reuse_port
+        self.accept_batch_size: int = max(1, accept_batch_size)
+        self.stats_interval: int = stats_interval
+        self.local_executor: bool = local_executor
+        self.threadless_loops: int = max(1, threadless_loops)
+        self.dispatch_policy: str = dispatch_policy
+        self.asyncio: bool = asyncio
+        self.event_loop_policy: str = event_loop_policy
+        self.thread_pool_size: int = thread_pool_size
+        self.thread_pool_max_inflight: int = thread_pool_max_inflight
+        self.thread_pool_queue_size: int = thread_pool_queue_size
+        self.thread_stack_size: int = thread_stack_size
+        self.high_watermark: int = high_watermark
+        self.low_watermark: int = low_watermark
+        self.disable_splice: bool = disable_splice
+        self.pool_max_idle_per_host: int = pool_max_idle_per_host
+        self.pool_idle_ttl: int = pool_idle_ttl
+        self.connect_timeout: int = connect_timeout
+        self.dns_cache_ttl: int = dns_cache_ttl
+        self.dns_negative_cache_ttl: int = dns_negative_cache_ttl
+        self.dns_resolver_threads: int = dns_resolver_threads
+        self.ca_cert_cache_size: int = ca_cert_cache_size
+        self.ca_cert_wildcard: bool = ca_cert_wildcard
+        self.upstream_tls_session_cache_size: int = upstream_tls_session_cache_size
+        self.upstream_tls_session_ttl: int = upstream_tls_session_ttl
+        self.tls_interception_bypass_file: Optional[str] = tls_interception_bypass_file
 
         self.enable_static_server: bool = enable_static_server
         self.static_server_dir: str = static_server_dir
@@ -12,13 +12,17 @@ import multiprocessing
 import selectors
 import socket
 import threading
-# import time
+import time
 from multiprocessing import connection
 from multiprocessing.reduction import send_handle, recv_handle
-from typing import List, Optional, Type, Tuple
+from typing import Dict, List, Optional, Type, Tuple
 
-from .threadless import ThreadlessWork, Threadless
+from .threadless import ThreadlessWork, Threadless, BATCHED_HANDOFF, send_clients
+from .asyncio_executor import AsyncioExecutor
+from .dispatch import ThreadlessLoad, DispatchPolicy, dispatch_policies
 from .event import EventQueue, EventDispatcher, eventNames
+from .stats import Stats
+from .thread_pool import ThreadPool
 from ..common.flags import Flags
 
 logger = logging.getLogger(__name__)
@@ -30,6 +34,9 @@ class AcceptorPool:
     Pre-spawns worker processes to utilize all cores available on the system.  Server socket connection is
     dispatched over a pipe to workers.  Each worker accepts incoming client request and spawns a
     separate thread to handle the client request.
+
+    When --reuse-port is enabled, no server socket is dispatched.  Instead, each worker
+    binds its own SO_REUSEPORT listening socket and kernel balances incoming connections.
     """
 
     def __init__(self, flags: Flags, work_klass: Type[ThreadlessWork]) -> None:
@@ -105,11 +112,18 @@ class AcceptorPool:
     def setup(self) -> None:
         """Listen on port, setup workers and pass server socket to workers."""
         self.running = True
-        self.listen()
+        if not self.flags.reuse_port:
+            self.listen()
         if self.flags.enable_events:
             self.start_event_dispatcher()
         self.start_workers()
 
+        if self.flags.reuse_port:
+            # Acceptors bind their own listening socket.
+            for index in range(self.flags.num_workers):
+                self.work_queues[index].close()
+            return
+
         # Send server socket to all acceptor processes.
         assert self.socket is not None
         for index in range(self.flags.num_workers):
@@ -127,6 +141,23 @@ class Acceptor(multiprocessing.Process):
 
     Accepts client connection over received server socket handle and
     starts a new work thread.
+
+    With --reuse-port, acceptor binds its own listening socket and
+    accepts without synchronizing with other acceptors.
+
+    Upon each wakeup, up to --accept-batch-size pending connections
+    are accepted and then dispatched to workers in one go.
+
+    With --threadless, accepted clients are dispatched to one of
+    --threadless-loops Threadless processes as per --dispatch-policy.
+
+    With --asyncio, AsyncioExecutor processes are used instead of Threadless.
+
+    With --local-executor, acceptor runs Threadless event loop itself
+    and accepts client connections directly into the loop.
+
+    With --thread-pool-size, accepted clients are handed to a fixed
+    pool of threads instead of a new thread for each client.
     """
 
     lock = multiprocessing.Lock()
@@ -148,38 +179,63 @@ class Acceptor(multiprocessing.Process):
         self.running = False
         self.selector: Optional[selectors.DefaultSelector] = None
         self.sock: Optional[socket.socket] = None
-        self.threadless_process: Optional[multiprocessing.Process] = None
-        self.threadless_client_queue: Optional[connection.Connection] = None
-
-    def start_threadless_process(self) -> None:
-        pipe = multiprocessing.Pipe()
-        self.threadless_client_queue = pipe[0]
-        self.threadless_process = Threadless(
-            client_queue=pipe[1],
-            flags=self.flags,
-            work_klass=self.work_klass,
-            event_queue=self.event_queue
-        )
-        self.threadless_process.start()
-        logger.debug('Started process %d', self.threadless_process.pid)
+        self.threadless_processes: List[Threadless] = []
+        self.threadless_client_queues: List[connection.Connection] = []
+        self.threadless_client_socks: List[socket.socket] = []
+        self.threadless_loads: List[ThreadlessLoad] = []
+        self.dispatcher: Optional[DispatchPolicy] = None
+        self.thread_pool: Optional[ThreadPool] = None
+        self.stats: Optional[Stats] = None
+        self.last_wakeup: float = 0
+
+    def start_threadless_processes(self) -> None:
+        for _ in range(self.flags.threadless_loops):
+            pipe = multiprocessing.Pipe()
+            load = ThreadlessLoad()
+            threadless_process = self.executor_klass()(
+                client_queue=pipe[1],
+                flags=self.flags,
+                work_klass=self.work_klass,
+                event_queue=self.event_queue,
+                load=load
+            )
+            threadless_process.start()
+            # Threadless owns the other end of the pipe from now on
+            pipe[1].close()
+            if BATCHED_HANDOFF:
+                self.threadless_client_socks.append(socket.fromfd(
+                    pipe[0].fileno(), socket.AF_UNIX, socket.SOCK_STREAM))
+            self.threadless_client_queues.append(pipe[0])
+            self.threadless_processes.append(threadless_process)
+            self.threadless_loads.append(load)
+            logger.debug('Started process %d', threadless_process.pid)
+        self.dispatcher = dispatch_policies[self.flags.dispatch_policy](
+            self.threadless_loads)
+
+    def executor_klass(self) -> Type[Threadless]:
+        return AsyncioExecutor if self.flags.asyncio else Threadless
 
-    def shutdown_threadless_process(self) -> None:
-        assert self.threadless_process and self.threadless_client_queue
-        logger.debug('Stopped process %d', self.threadless_process.pid)
-        self.threadless_process.join()
-        self.threadless_client_queue.close()
+    def shutdown_threadless_processes(self) -> None:
+        for threadless_process in self.threadless_processes:
+            threadless_process.join()
+            logger.debug('Stopped process %d', threadless_process.pid)
+        for client_sock in self.threadless_client_socks:
+            client_sock.close()
+        for client_queue in self.threadless_client_queues:
+            client_queue.close()
 
     def start_work(self, conn: socket.socket, addr: Tuple[str, int]) -> None:
-        if self.flags.threadless and \
-                self.threadless_client_queue and \
-                self.threadless_process:
-            self.threadless_client_queue.send(addr)
+        if self.flags.threadless and self.dispatcher:
+            index = self.dispatcher.dispatch()
+            self.threadless_client_queues[index].send(addr)
             send_handle(
-                self.threadless_client_queue,
+                self.threadless_client_queues[index],
                 conn.fileno(),
-                self.threadless_process.pid
+                self.threadless_processes[index].pid
             )
             conn.close()
+        elif self.thread_pool is not None:
+            self.thread_pool.submit([(conn, addr)])
         else:
             work = self.work_klass(
                 fileno=conn.fileno(),
@@ -195,39 +251,130 @@ class Acceptor(multiprocessing.Process):
             )
             work_thread.start()
 
-    def run_once(self) -> None:
+    def start_works(
+            self, accepted: List[Tuple[socket.socket, Tuple[str, int]]]) -> None:
+        if self.flags.threadless and self.dispatcher and self.threadless_client_socks:
+            # Send accepted clients to each threadless process at once
+            batches: Dict[int, List[Tuple[int, Tuple[str, int]]]] = {}
+            for conn, addr in accepted:
+                batches.setdefault(self.dispatcher.dispatch(), []).append(
+                    (conn.fileno(), addr))
+            for index, clients in batches.items():
+                send_clients(self.threadless_client_socks[index], clients)
+            for conn, _ in accepted:
+                conn.close()
+            return
+        if self.thread_pool is not None:
+            self.thread_pool.submit(accepted)
+            return
+        for conn, addr in accepted:
+            self.start_work(conn, addr)
+
+    def listen(self) -> socket.socket:
+        sock = socket.socket(self.flags.family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((str(self.flags.hostname), self.flags.port))
+        sock.listen(self.flags.backlog)
+        sock.setblocking(False)
+        logger.debug(
+            'Acceptor %d listening on %s:%d' %
+            (self.idd, self.flags.hostname, self.flags.port))
+        return sock
+
+    def accept(self) -> List[Tuple[socket.socket, Tuple[str, int]]]:
+        """Accepts pending connections until backlog is drained
+        or --accept-batch-size connections have been accepted."""
         assert self.selector and self.sock
-        with self.lock:
-            events = self.selector.select(timeout=1)
-            if len(events) == 0:
-                return
-            conn, addr = self.sock.accept()
-        # now = time.time()
-        # fileno: int = conn.fileno()
-        self.start_work(conn, addr)
-        # logger.info('Work started for fd %d in %f seconds', fileno, time.time() - now)
+        accepted: List[Tuple[socket.socket, Tuple[str, int]]] = []
+        events = self.selector.select(timeout=1)
+        if len(events) == 0:
+            return accepted
+        self.last_wakeup = time.time()
+        while len(accepted) < self.flags.accept_batch_size:
+            try:
+                accepted.append(self.sock.accept())
+            except BlockingIOError:
+                # Backlog drained or another acceptor won the race
+                break
+        return accepted
+
+    def run_once(self) -> None:
+        assert self.stats
+        if self.flags.reuse_port:
+            # Listening socket is private to this acceptor,
+            # no need to synchronize with other acceptors.
+            accepted = self.accept()
+        else:
+            with self.lock:
+                accepted = self.accept()
+        if len(accepted) > 0:
+            self.start_works(accepted)
+            # Accept latency is measured from wakeup until
+            # accepted connections are handed over to workers.
+            latency_ms = (time.time() - self.last_wakeup) * 1000
+            self.stats.incr('accepted', len(accepted))
+            self.stats.observe('accept_batch_size', len(accepted))
+            for _ in accepted:
+                self.stats.observe('accept_latency_ms', latency_ms)
+        Stats.report(self.flags.stats_interval)
+
+    def run_local_executor(self) -> None:
+        """Runs Threadless event loop within acceptor process.
+
+        Event loop accepts client connections directly from
+        our listening socket, no fd passing or extra process involved."""
+        self.executor_klass()(
+            client_queue=None,
+            flags=self.flags,
+            work_klass=self.work_klass,
+            event_queue=self.event_queue,
+            listener=self.sock
+        ).run()
 
     def run(self) -> None:
         self.running = True
         self.selector = selectors.DefaultSelector()
-        fileno = recv_handle(self.work_queue)
-        self.work_queue.close()
-        self.sock = socket.fromfd(
-            fileno,
-            family=self.flags.family,
-            type=socket.SOCK_STREAM
-        )
+        self.stats = Stats.get('acceptor-%d' % self.idd)
+        if self.flags.thread_stack_size > 0:
+            # Applies to all threads started by this process from now on
+            threading.stack_size(self.flags.thread_stack_size)
+        if self.flags.reuse_port:
+            self.work_queue.close()
+            self.sock = self.listen()
+        else:
+            fileno = recv_handle(self.work_queue)
+            self.work_queue.close()
+            self.sock = socket.fromfd(
+                fileno,
+                family=self.flags.family,
+                type=socket.SOCK_STREAM
+            )
+            self.sock.setblocking(False)
         try:
-            self.selector.register(self.sock, selectors.EVENT_READ)
-            if self.flags.threadless:
-                self.start_threadless_process()
-            while self.running:
-                self.run_once()
+            if self.flags.local_executor:
+                self.run_local_executor()
+            else:
+                self.selector.register(self.sock, selectors.EVENT_READ)
+                if self.flags.threadless:
+                    self.start_threadless_processes()
+                elif self.flags.thread_pool_size > 0:
+                    self.thread_pool = ThreadPool(
+                        flags=self.flags,
+                        work_klass=self.work_klass,
+                        event_queue=self.event_queue,
+                        stats=Stats.get('thread-pool-%d' % self.idd))
+                    self.thread_pool.start()
+                while self.running:
+                    self.run_once()
         except KeyboardInterrupt:
             pass
         finally:
-            self.selector.unregister(self.sock)
-            if self.flags.threadless:
-                self.shutdown_threadless_process()
+            if not self.flags.local_executor:
+                self.selector.unregister(self.sock)
+                if self.flags.threadless:
+                    self.shutdown_threadless_processes()
+                elif self.thread_pool is not None:
+                    self.thread_pool.shutdown()
             self.sock.close()
             self.running = False
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡ Fast, Lightweight, Programmable Proxy Server in a single Python file.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import time
+import asyncio
+import importlib
+import logging
+import selectors
+import socket
+from multiprocessing import connection
+from typing import Dict, List, Optional, Tuple, Type, Union
+
+from .event import EventQueue
+from .connection import BufferPool
+from .dispatch import ThreadlessLoad
+from .stats import Stats
+from .threadless import Threadless, ThreadlessWork, MAX_SELECT_TIMEOUT
+from ..common.flags import Flags
+from ..common.types import HasFileno
+
+logger = logging.getLogger(__name__)
+
+
+def new_event_loop_policy(name: str) -> asyncio.AbstractEventLoopPolicy:
+    """Returns event loop policy for --event-loop-policy.
+
+    auto uses uvloop when installed and falls back to asyncio default policy.
+    Otherwise name must be asyncio or dotted path to an event loop policy class."""
+    if name == 'auto':
+        try:
+            uvloop = importlib.import_module('uvloop')
+            policy: asyncio.AbstractEventLoopPolicy = uvloop.EventLoopPolicy()
+            return policy
+        except ImportError:
+            name = 'asyncio'
+    if name == 'asyncio':
+        return asyncio.DefaultEventLoopPolicy()
+    module_name, klass_name = name.rsplit('.', 1)
+    policy = getattr(importlib.import_module(module_name), klass_name)()
+    return policy
+
+
+class AsyncioExecutor(Threadless):
+    """AsyncioExecutor drives ThreadlessWork using asyncio event loop.
+
+    Used instead of Threadless when --asyncio option is enabled.  Interest of
+    works is registered with the loop using add_reader and add_writer, and
+    handle_events is invoked directly from loop callbacks with the ready
+    descriptor.  Readiness is never queued, since the loop may report a
+    descriptor again before a queued event is handled.
+
+    Client handoff, work lifecycle and deadlines are same as Threadless.
+    Event loop is created from the --event-loop-policy, which allows
+    uvloop to drive the works when installed.
+    """
+
+    def __init__(
+            self,
+            client_queue: Optional[connection.Connection],
+            flags: Flags,
+            work_klass: Type[ThreadlessWork],
+            event_queue: Optional[EventQueue] = None,
+            listener: Optional[socket.socket] = None,
+            load: Optional[ThreadlessLoad] = None) -> None:
+        super().__init__(client_queue, flags, work_klass, event_queue, listener, load)
+        # Work currently owning a registered descriptor
+        self.owners: Dict[int, int] = {}
+        # Loop time at which expire timer fires next and its wall clock
+        # deadline, comparable with deadlines of timers
+        self.expire_at: float = 0
+        self.expire_deadline: float = 0
+        self.expire_handle: Optional[asyncio.TimerHandle] = None
+
+    def update_registrations(self, work_id: int) -> None:
+        assert self.loop is not None
+        previous = self.registrations.get(work_id, {})
+        current: Dict[int, Tuple[Union[int, HasFileno], int]] = {}
+        for fileobj, events in self.works[work_id].get_events().items():
+            fd = fileobj if isinstance(fileobj, int) else fileobj.fileno()
+            current[fd] = (fileobj, events)
+            if fd in previous and previous[fd][0] is fileobj and \
+                    self.owners.get(fd) == work_id:
+                registered = previous[fd][1]
+            else:
+                # New descriptor, replaced connection object or reused descriptor
+                self.remove_handler(fd, selectors.EVENT_READ)
+                self.remove_handler(fd, selectors.EVENT_WRITE)
+                registered = 0
+            self.owners[fd] = work_id
+            for event in (selectors.EVENT_READ, selectors.EVENT_WRITE):
+                if events & event and not registered & event:
+                    self.add_handler(fd, event, work_id, fileobj)
+                elif registered & event and not events & event:
+                    self.remove_handler(fd, event)
+        for fd in previous:
+            if fd not in current:
+                self.unregister(work_id, fd, previous[fd][0])
+        self.registrations[work_id] = current
+
+    def unregister(self, work_id: int, fd: int, fileobj: Union[int, HasFileno]) -> None:
+        if self.owners.get(fd) != work_id:
+            return
+        del self.owners[fd]
+        self.remove_handler(fd, selectors.EVENT_READ)
+        self.remove_handler(fd, selectors.EVENT_WRITE)
+
+    def add_handler(
+            self, fd: int, event: int, work_id: int,
+            fileobj: Union[int, HasFileno]) -> None:
+        assert self.loop is not None
+        uid = self.works[work_id].uid
+        if event == selectors.EVENT_READ:
+            self.loop.add_reader(fd, self.dispatch, work_id, uid, [fileobj], [])
+        else:
+            self.loop.add_writer(fd, self.dispatch, work_id, uid, [], [fileobj])
+
+    def remove_handler(self, fd: int, event: int) -> None:
+        assert self.loop is not None
+        try:
+            if event == selectors.EVENT_READ:
+                self.loop.remove_reader(fd)
+            else:
+                self.loop.remove_writer(fd)
+        except OSError:
+            # Descriptor already closed
+            pass
+
+    def dispatch(
+            self, work_id: int, uid: str,
+            readables: List[Union[int, HasFileno]],
+            writables: List[Union[int, HasFileno]]) -> None:
+        """Invokes handle_events of work which owns the ready descriptor."""
+        if work_id not in self.works or self.works[work_id].uid != uid:
+            return
+        try:
+            teardown = self.works[work_id].handle_events(readables, writables)
+        except Exception as e:
+            logger.exception('Exception while handling work %d' % work_id, exc_info=e)
+            teardown = True
+        if teardown:
+            self.cleanup(work_id)
+            return
+        self.update_registrations(work_id)
+        self.schedule(work_id)
+
+    def schedule(self, work_id: int) -> None:
+        """Also brings expire timer forward when work has the earliest deadline."""
+        super().schedule(work_id)
+        if self.loop is None or self.expire_handle is None or len(self.timers) == 0:
+            return
+        deadline = self.timers[0][0]
+        if deadline < self.expire_deadline:
+            self.expire_handle.cancel()
+            self.arm(deadline)
+
+    def arm(self, deadline: float) -> None:
+        """Arms expire timer for a wall clock deadline."""
+        assert self.loop is not None
+        self.expire_deadline = deadline
+        self.expire_at = self.loop.time() + max(0.0, deadline - time.time())
+        self.expire_handle = self.loop.call_at(self.expire_at, self.expire)
+
+    def expire(self) -> None:
+        """Periodically shuts down inactive works, reports load and logs stats.
+
+        Lag is how late this timer fired, i.e. time the loop spent in
+        callbacks of busy works."""
+        assert self.loop is not None
+        lag_ms = max(0.0, self.loop.time() - self.expire_at) * 1000
+        self.cleanup_inactive()
+        self.report_load(lag_ms)
+        Stats.report(self.flags.stats_interval)
+        self.arm(time.time() + self.select_timeout())
+
+    def run(self) -> None:
+        BufferPool.install(BufferPool())
+        policy = new_event_loop_policy(self.flags.event_loop_policy)
+        self.loop = policy.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        logger.debug('Using event loop %r', self.loop)
+        try:
+            if self.client_queue is not None:
+                self.open_client_queue()
+                self.loop.add_reader(self.client_queue.fileno(), self.accept_client)
+            if self.listener is not None:
+                self.loop.add_reader(self.listener.fileno(), self.accept_connections)
+            self.arm(time.time() + MAX_SELECT_TIMEOUT)
+            self.loop.run_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if self.client_queue is not None:
+                self.loop.remove_reader(self.client_queue.fileno())
+                self.close_client_queue()
+            if self.listener is not None:
+                # Listening socket is owned and closed by Acceptor
+                self.loop.remove_reader(self.listener.fileno())
+            self.loop.close()
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡ Fast, Lightweight, Programmable Proxy Server in a single Python file.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import socket
+import ipaddress
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from .per_process import PerProcess
+from ..common.flags import Flags
+
+# Markers within label trie nodes, never valid labels themselves
+EXACT = ''
+SUFFIX = '*'
+
+
+def is_address(text: str) -> bool:
+    """Cheap check whether text may be an IP address or network, names rarely start with a digit."""
+    return text[:1].isdigit() or ':' in text
+
+
+def read_patterns(path: str) -> List[str]:
+    """Returns patterns listed in file, one per line, skipping blank and # comment lines."""
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+
+
+class InterceptionBypass(PerProcess):
+    """Per-process list of upstream hosts whose tunnels are never intercepted.
+
+    Patterns are one of:
+
+        example.com         Exact host.
+        .example.com        Host and all its subdomains, *.example.com also works.
+        10.0.0.0/8          Addresses within network, 10.0.0.1 for a single address.
+
+    Hosts are matched using a trie of labels in reverse order, i.e. com then
+    example.  Addresses are matched using a set of network prefixes for each
+    prefix length in use.  Lookups cost at most number of labels in host or
+    prefix lengths in use, irrespective of number of patterns.  Networks
+    also match connected upstream address of hosts given by name."""
+
+    def __init__(self, patterns: Iterable[str] = ()) -> None:
+        self.labels: Dict[str, Any] = {}
+        # IP version => prefix length => network addresses without host bits
+        self.networks: Dict[int, Dict[int, Set[int]]] = {}
+        self.size = 0
+        for pattern in patterns:
+            self.add(pattern)
+
+    @classmethod
+    def from_flags(cls, flags: Optional[Flags]) -> 'InterceptionBypass':
+        assert flags is not None
+        return cls(
+            read_patterns(flags.tls_interception_bypass_file)
+            if flags.tls_interception_bypass_file else ())
+
+    def add(self, pattern: str) -> None:
+        """Raises ValueError for invalid patterns."""
+        normalized = pattern.strip().lower().rstrip('.')
+        try:
+            if not is_address(normalized):
+                raise ValueError(normalized)
+            network = ipaddress.ip_network(normalized, strict=False)
+        except ValueError:
+            pass
+        else:
+            self.networks.setdefault(network.version, {}).setdefault(network.prefixlen, set()).add(
+                int(network.network_address) >> (network.max_prefixlen - network.prefixlen))
+            self.size += 1
+            return
+        marker = EXACT
+        if normalized.startswith('*.'):
+            normalized = normalized[1:]
+        if normalized.startswith('.'):
+            marker = SUFFIX
+            normalized = normalized[1:]
+        labels = normalized.split('.')
+        if any(label in (EXACT, SUFFIX) or SUFFIX in label for label in labels):
+            raise ValueError('Invalid interception bypass pattern %r' % pattern)
+        node = self.labels
+        for label in reversed(labels):
+            node = node.setdefault(label, {})
+        node[marker] = True
+        self.size += 1
+
+    def matches(self, host: str) -> bool:
+        """Returns True if host, a name or an IP address, is bypassed."""
+        if self.size == 0:
+            return False
+        host = host.lower().rstrip('.')
+        if self.networks and is_address(host.lstrip('[')):
+            try:
+                return self.matches_address(host.strip('[]'))
+            except ValueError:
+                pass
+        node = self.labels
+        for label in reversed(host.split('.')):
+            child = node.get(label)
+            if not isinstance(child, dict):
+                return False
+            if SUFFIX in child:
+                return True
+            node = child
+        return EXACT in node
+
+    def matches_address(self, address: str) -> bool:
+        """Raises ValueError unless address is an IP address."""
+        ip = ipaddress.ip_address(address)
+        if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped is not None:
+            ip = ip.ipv4_mapped
+        value = int(ip)
+        for length, prefixes in self.networks.get(ip.version, {}).items():
+            if value >> (ip.max_prefixlen - length) in prefixes:
+                return True
+        return False
+
+    def matches_peer(self, conn: socket.socket) -> bool:
+        """Returns True if connected peer address of conn is bypassed."""
+        if not self.networks:
+            return False
+        try:
+            return self.matches_address(conn.getpeername()[0])
+        except (OSError, ValueError):
+            return False
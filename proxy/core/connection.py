@@ -7,13 +7,23 @@
     :copyright: (c) 2013-present by Abhinav Singh and contributors.
     :license: BSD, see LICENSE for more details.
 """
+import os
+import errno
 import socket
+import selectors
 import ssl
 import logging
+import itertools
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import NamedTuple, Optional, Union, Tuple
+from collections import deque
+from typing import NamedTuple, Optional, Union, Tuple, Deque, Dict, List, Any, Sequence
 
+from .happy_eyeballs import CONNECTION_ATTEMPT_DELAY, AddressFamilyStats, interleave
+from .resolver import Lookup, Resolver
 from ..common.constants import DEFAULT_BUFFER_SIZE
+from ..common.types import HasFileno
 from ..common.utils import new_socket_connection
 
 logger = logging.getLogger(__name__)
@@ -25,22 +35,98 @@ TcpConnectionTypes = NamedTuple('TcpConnectionTypes', [
 ])
 tcpConnectionTypes = TcpConnectionTypes(1, 2)
 
+# Upper bound on number of queued segments written by a single
+# sendmsg call, well within IOV_MAX of supported platforms.
+MAX_SEGMENTS_PER_FLUSH = 64
+# Buffers retained by a BufferPool.  Buffers are only held for the
+# duration of a read, hence a single thread needs a single buffer.
+MAX_POOLED_BUFFERS = 4
+
 
 class TcpConnectionUninitializedException(Exception):
     pass
 
 
+class BufferPool:
+    """Reusable buffers for reading from connections using recv_into.
+
+    socket.recv(buffer_size) allocates buffer_size bytes for every read,
+    only to shrink it to received data.  With 1 MB receive buffers even
+    tiny reads cost a large allocation and page faults.  BufferPool reads
+    into a reusable buffer and returns a copy of received data only.
+
+    A pool is installed per thread, see install.  Threadless installs one
+    for its event loop.  Elsewhere, TcpConnection reads using recv."""
+
+    local = threading.local()
+
+    def __init__(self, max_buffers: int = MAX_POOLED_BUFFERS) -> None:
+        self.max_buffers = max_buffers
+        self.buffers: List[bytearray] = []
+        self.allocated: int = 0
+
+    @classmethod
+    def install(cls, pool: Optional['BufferPool']) -> None:
+        """TcpConnection reads within current thread use pool from now on."""
+        cls.local.pool = pool
+
+    @classmethod
+    def current(cls) -> Optional['BufferPool']:
+        pool: Optional[BufferPool] = getattr(cls.local, 'pool', None)
+        return pool
+
+    def acquire(self, size: int) -> bytearray:
+        while len(self.buffers) > 0:
+            buffer = self.buffers.pop()
+            if len(buffer) >= size:
+                return buffer
+        self.allocated += 1
+        return bytearray(size)
+
+    def release(self, buffer: bytearray) -> None:
+        if len(self.buffers) < self.max_buffers:
+            self.buffers.append(buffer)
+
+    def recv(self, conn: Union[ssl.SSLSocket, socket.socket], buffer_size: int) -> bytes:
+        buffer = self.acquire(buffer_size)
+        try:
+            with memoryview(buffer) as view:
+                received = conn.recv_into(view, buffer_size)
+                return bytes(view[:received])
+        finally:
+            self.release(buffer)
+
+
 class TcpConnection(ABC):
     """TCP server/client connection abstraction.
 
     Main motivation of this class is to provide a buffer management
     when reading and writing into the socket.
 
+    Queued data is held as a list of memoryview segments and written
+    using scatter-gather sendmsg, without joining segments.  Partial
+    writes slice the head segment, which doesn't copy remaining data.
+
+    When watermarks are set, paused becomes True once queued data reaches
+    high watermark and False again once it drains to low watermark.
+    Users must stop reading data destined for a paused connection.
+    Number of times connection got paused is kept in pauses.
+
+    Total bytes ever queued is kept in queued_bytes, use tail to obtain
+    data queued since, without joining data queued before.
+
     Implement the connection property abstract method to return
     a socket connection object."""
 
     def __init__(self, tag: int):
-        self.buffer: bytes = b''
+        self._buffer: Deque[memoryview] = deque()
+        self._buffer_size: int = 0
+        self.high_watermark: int = 0
+        self.low_watermark: int = 0
+        self.paused: bool = False
+        self.pauses: int = 0
+        self.queued_bytes: int = 0
+        self.peak_buffer_size: int = 0
         self.closed: bool = False
         self.tag: str = 'server' if tag == tcpConnectionTypes.SERVER else 'client'
 
@@ -50,13 +136,46 @@ class TcpConnection(ABC):
         """Must return the socket connection to use in this class."""
         raise TcpConnectionUninitializedException()     # pragma: no cover
 
-    def send(self, data: bytes) -> int:
+    @property
+    def buffer(self) -> bytes:
+        """Queued data yet to be flushed.
+
+        Copies queued data unless it is a single unsliced segment,
+        use buffer_size and has_buffer where possible."""
+        if len(self._buffer) == 1 and isinstance(self._buffer[0].obj, bytes) and \
+                self._buffer[0].nbytes == len(self._buffer[0].obj):
+            return self._buffer[0].obj
+        return b''.join(self._buffer)
+
+    def tail(self, size: int) -> bytes:
+        """Last size bytes of queued data, at most buffer_size.
+
+        Only copies segments which hold them, and none when they are
+        a single unsliced segment."""
+        parts: List[memoryview] = []
+        for segment in reversed(self._buffer):
+            if size <= 0:
+                break
+            if len(segment) > size:
+                segment = segment[len(segment) - size:]
+            parts.append(segment)
+            size -= len(segment)
+        if len(parts) == 1 and isinstance(parts[0].obj, bytes) and \
+                parts[0].nbytes == len(parts[0].obj):
+            return parts[0].obj
+        return b''.join(reversed(parts))
+
+    def send(self, data: Union[bytes, memoryview]) -> int:
         """Users must handle BrokenPipeError exceptions"""
         return self.connection.send(data)
 
     def recv(self, buffer_size: int = DEFAULT_BUFFER_SIZE) -> Optional[bytes]:
         """Users must handle socket.error exceptions"""
-        data: bytes = self.connection.recv(buffer_size)
+        pool = BufferPool.current()
+        if pool is None:
+            data: bytes = self.connection.recv(buffer_size)
+        else:
+            data = pool.recv(self.connection, buffer_size)
         if len(data) == 0:
             return None
         logger.debug(
@@ -65,6 +184,21 @@ class TcpConnection(ABC):
         # logger.info(data)
         return data
 
+    def handshake(self) -> int:
+        """Advances TLS handshake of a non-blocking connection wrapped with
+        do_handshake_on_connect=False.  Returns 0 once handshake has completed,
+        otherwise the selector event to wait for before invoking it again.
+
+        Users must handle ssl.SSLError and OSError exceptions"""
+        assert isinstance(self.connection, ssl.SSLSocket)
+        try:
+            self.connection.do_handshake()
+        except ssl.SSLWantReadError:
+            return selectors.EVENT_READ
+        except ssl.SSLWantWriteError:
+            return selectors.EVENT_WRITE
+        return 0
+
     def close(self) -> bool:
         if not self.closed:
             self.connection.close()
@@ -72,33 +206,92 @@ class TcpConnection(ABC):
         return self.closed
 
     def buffer_size(self) -> int:
-        return len(self.buffer)
+        return self._buffer_size
 
     def has_buffer(self) -> bool:
-        return self.buffer_size() > 0
+        return self._buffer_size > 0
+
+    def set_watermarks(self, high: int, low: int) -> None:
+        """High watermark of 0 disables pausing."""
+        self.high_watermark = high
+        self.low_watermark = min(low, high)
 
     def queue(self, data: bytes) -> int:
-        self.buffer += data
+        """Queues data for flush.  Data is not copied and hence
+        must not be modified once queued."""
+        if len(data) > 0:
+            self._buffer.append(memoryview(data))
+            self._buffer_size += len(data)
+            self.queued_bytes += len(data)
+            if self._buffer_size > self.peak_buffer_size:
+                self.peak_buffer_size = self._buffer_size
+            if 0 < self.high_watermark <= self._buffer_size and not self.paused:
+                self.paused = True
+                self.pauses += 1
         return len(data)
 
     def flush(self) -> int:
         """Users must handle BrokenPipeError exceptions"""
-        if self.buffer_size() == 0:
+        if self._buffer_size == 0:
             return 0
-        sent: int = self.send(self.buffer)
-        # logger.info(self.buffer[:sent])
-        self.buffer = self.buffer[sent:]
+        if len(self._buffer) == 1 or isinstance(self.connection, ssl.SSLSocket):
+            # SSL sockets do not support sendmsg
+            sent: int = self.send(self._buffer[0])
+        else:
+            sent = self.connection.sendmsg(
+                list(itertools.islice(self._buffer, MAX_SEGMENTS_PER_FLUSH)))
+        self.consume(sent)
         logger.debug('flushed %d bytes to %s' % (sent, self.tag))
         return sent
 
+    def consume(self, sent: int) -> None:
+        """Drops sent bytes from the head of queued segments."""
+        self._buffer_size -= sent
+        if self.paused and self._buffer_size <= self.low_watermark:
+            self.paused = False
+        while sent > 0:
+            head = self._buffer[0]
+            if sent < len(head):
+                self._buffer[0] = head[sent:]
+                break
+            sent -= len(head)
+            self._buffer.popleft()
+
 
 class TcpServerConnection(TcpConnection):
-    """Establishes connection to upstream server."""
+    """Establishes connection to upstream server.
+
+    Optionally wraps an already established connection, e.g. from a ConnectionPool.
+
+    With connect(nonblocking=True), connection is initiated without waiting
+    for the handshake.  Resolved addresses are raced as per Happy Eyeballs,
+    RFC 8305.  Address families are interleaved and a new attempt starts
+    every CONNECTION_ATTEMPT_DELAY seconds, or as soon as previous attempts
+    fail, until one of them connects.  Caller must wait for attempts to become
+    writable and invoke finish_connect, as well as invoke start_due_attempt
+    at next_attempt_at, until connected is True.  Data queued meanwhile is
+    flushed once connected.
+
+    When a Resolver is also given, host may still be resolving after connect.
+    Caller must then wait for lookup.reader to become readable and invoke
+    finish_resolve before waiting for attempts."""
 
-    def __init__(self, host: str, port: int):
+    def __init__(self, host: str, port: int,
+                 conn: Optional[Union[ssl.SSLSocket, socket.socket]] = None):
         super().__init__(tcpConnectionTypes.SERVER)
-        self._conn: Optional[Union[ssl.SSLSocket, socket.socket]] = None
+        self._conn: Optional[Union[ssl.SSLSocket, socket.socket]] = conn
         self.addr: Tuple[str, int] = (host, int(port))
+        self.connected: bool = conn is not None
+        # Pending resolution of host during non-blocking connect
+        self.lookup: Optional[Lookup] = None
+        # Remaining resolved addresses to try during non-blocking connect
+        self.addrinfos: Deque[Tuple[Any, ...]] = deque()
+        # In-flight connection attempts and their address family
+        self.attempts: Dict[socket.socket, int] = {}
+        # Time at which next attempt starts unless an attempt completes before
+        self.next_attempt_at: Optional[float] = None
+        self.connect_started: float = 0
+        self.error: int = errno.EHOSTUNREACH
 
     @property
     def connection(self) -> Union[ssl.SSLSocket, socket.socket]:
@@ -106,10 +299,114 @@ class TcpServerConnection(TcpConnection):
             raise TcpConnectionUninitializedException()
         return self._conn
 
-    def connect(self) -> None:
-        if self._conn is not None:
+    def connect(self, nonblocking: bool = False, resolver: Optional[Resolver] = None) -> None:
+        if self._conn is not None or self.lookup is not None or len(self.attempts) > 0:
+            return
+        if nonblocking and resolver is not None:
+            lookup = resolver.resolve(self.addr[0], self.addr[1])
+            if not lookup.done():
+                self.lookup = lookup
+                return
+            self.start_attempts(lookup.result())
+            return
+        if nonblocking:
+            self.start_attempts(socket.getaddrinfo(
+                self.addr[0], self.addr[1], type=socket.SOCK_STREAM))
             return
         self._conn = new_socket_connection(self.addr)
+        self.connected = True
+
+    def finish_resolve(self, resolver: Resolver) -> None:
+        """Invoke once lookup is readable.  Initiates non-blocking connection
+        to resolved addresses.
+
+        Raises OSError if resolution or connection has failed."""
+        assert self.lookup is not None
+        lookup, self.lookup = self.lookup, None
+        resolver.release(lookup)
+        self.start_attempts(lookup.result())
+
+    def start_attempts(self, addrinfos: List[Tuple[Any, ...]]) -> None:
+        self.addrinfos = deque(interleave(
+            addrinfos, AddressFamilyStats.get().preferred_family(self.addr[0])))
+        self.connect_started = time.time()
+        self.connect_next()
+
+    def connect_next(self) -> None:
+        """Starts connection attempt to next resolved address.  Addresses
+        which fail immediately are skipped.
+
+        Raises OSError once all addresses have failed."""
+        self.next_attempt_at = None
+        while len(self.addrinfos) > 0:
+            family, type_, proto, _, sockaddr = self.addrinfos.popleft()
+            try:
+                conn = socket.socket(family, type_, proto)
+            except OSError as e:
+                # e.g. EAFNOSUPPORT for AF_INET6 on hosts with IPv6 disabled
+                self.attempt_failed(None, family, e.errno or errno.EAFNOSUPPORT)
+                continue
+            conn.setblocking(False)
+            error = conn.connect_ex(sockaddr)
+            if error == 0:
+                self.attempt_connected(conn, family)
+                return
+            if error == errno.EINPROGRESS:
+                self.attempts[conn] = family
+                if len(self.addrinfos) > 0:
+                    self.next_attempt_at = time.time() + CONNECTION_ATTEMPT_DELAY
+                return
+            self.attempt_failed(conn, family, error)
+        if len(self.attempts) == 0:
+            raise OSError(self.error, os.strerror(self.error))
+
+    def start_due_attempt(self) -> None:
+        """Starts next attempt once previous attempts have been
+        in progress for CONNECTION_ATTEMPT_DELAY seconds.
+
+        Raises OSError once all addresses have failed."""
+        if self.next_attempt_at is not None and time.time() >= self.next_attempt_at:
+            self.connect_next()
+
+    def finish_connect(self, writables: Sequence[Union[int, HasFileno]]) -> bool:
+        """Invoke once any of the attempts is writable.  Returns True when
+        connected, False while attempts are still in progress.
+
+        Raises OSError once all addresses have failed."""
+        for conn in [conn for conn in self.attempts if conn in writables]:
+            family = self.attempts.pop(conn)
+            error = conn.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if error == 0:
+                self.attempt_connected(conn, family)
+                return True
+            self.attempt_failed(conn, family, error)
+        if len(self.attempts) == 0:
+            # Don't wait for attempt delay once previous attempts have failed
+            self.connect_next()
+        return self.connected
+
+    def attempt_connected(self, conn: socket.socket, family: int) -> None:
+        # Cancel attempts which lost the race
+        self.close_attempts()
+        self.addrinfos.clear()
+        self.next_attempt_at = None
+        self._conn = conn
+        self.connected = True
+        family_stats = AddressFamilyStats.get()
+        family_stats.record(self.addr[0], family, True)
+        family_stats.stats.observe('connect_ms', (time.time() - self.connect_started) * 1000)
+
+    def attempt_failed(self, conn: Optional[socket.socket], family: int, error: int) -> None:
+        if conn is not None:
+            conn.close()
+        self.error = error
+        AddressFamilyStats.get().record(self.addr[0], family, False)
+
+    def close_attempts(self) -> None:
+        for conn in self.attempts:
+            conn.close()
+        self.attempts.clear()
+        self.next_attempt_at = None
 
 
 class TcpClientConnection(TcpConnection):
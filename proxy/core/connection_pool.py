@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡ Fast, Lightweight, Programmable Proxy Server in a single Python file.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import socket
+import ssl
+import time
+import logging
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple, Union
+
+from .connection import TcpServerConnection
+from .per_process import PerProcess
+from .stats import Stats
+from ..common.flags import Flags
+
+logger = logging.getLogger(__name__)
+
+# Pool key, upstream host, port and whether connection is TLS
+PoolKey = Tuple[str, int, bool]
+
+
+class ConnectionPool(PerProcess):
+    """Per-process pool of idle upstream connections, keyed by host, port and TLS.
+
+    Connections are released into the pool once a response has completed on
+    a keep-alive connection.  At most max_idle_per_host connections are kept
+    for a key, for at most idle_ttl seconds.  Most recently released
+    connection is reused first, after checking it hasn't been closed by upstream."""
+
+    def __init__(
+            self,
+            max_idle_per_host: int,
+            idle_ttl: float,
+            stats: Optional[Stats] = None) -> None:
+        self.max_idle_per_host = max_idle_per_host
+        self.idle_ttl = idle_ttl
+        self.stats = stats if stats is not None else Stats.get('connection-pool')
+        # Accessed from client threads unless threadless
+        self.lock = threading.Lock()
+        self.idle: Dict[PoolKey, Deque[Tuple[Union[ssl.SSLSocket, socket.socket], float]]] = {}
+        self.last_sweep: float = 0
+
+    @classmethod
+    def from_flags(cls, flags: Optional[Flags]) -> 'ConnectionPool':
+        assert flags is not None
+        return cls(flags.pool_max_idle_per_host, flags.pool_idle_ttl)
+
+    def acquire(self, key: PoolKey) -> Optional[TcpServerConnection]:
+        """Returns an idle connection to upstream, if any."""
+        now = time.time()
+        with self.lock:
+            self.sweep(now)
+            idle = self.idle.get(key)
+            while idle:
+                conn, released_at = idle.pop()
+                if now - released_at < self.idle_ttl and self.is_alive(conn):
+                    self.stats.incr('hit')
+                    self.update_gauges()
+                    return TcpServerConnection(key[0], key[1], conn=conn)
+                self.discard(conn)
+            self.stats.incr('miss')
+            self.update_gauges()
+        return None
+
+    def release(self, key: PoolKey, conn: Union[ssl.SSLSocket, socket.socket]) -> bool:
+        """Takes an idle connection back.  Returns False if pool is disabled,
+        in which case caller still owns the connection."""
+        if self.max_idle_per_host <= 0:
+            return False
+        now = time.time()
+        with self.lock:
+            idle = self.idle.setdefault(key, deque())
+            if len(idle) >= self.max_idle_per_host:
+                self.discard(idle.popleft()[0])
+            idle.append((conn, now))
+            self.stats.incr('released')
+            self.sweep(now)
+            self.update_gauges()
+        return True
+
+    def sweep(self, now: float) -> None:
+        """Closes connections idle for longer than idle_ttl, at most once a second."""
+        if now - self.last_sweep < 1:
+            return
+        self.last_sweep = now
+        for key in list(self.idle.keys()):
+            idle = self.idle[key]
+            while idle and now - idle[0][1] >= self.idle_ttl:
+                self.discard(idle.popleft()[0])
+            if not idle:
+                del self.idle[key]
+
+    def discard(self, conn: Union[ssl.SSLSocket, socket.socket]) -> None:
+        self.stats.incr('evicted')
+        try:
+            conn.close()
+        except OSError:     # pragma: no cover
+            pass
+
+    def update_gauges(self) -> None:
+        self.stats.gauge('idle', sum(len(idle) for idle in self.idle.values()))
+
+    @staticmethod
+    def is_alive(conn: Union[ssl.SSLSocket, socket.socket]) -> bool:
+        """Idle connection must neither be closed nor have unsolicited data."""
+        try:
+            if isinstance(conn, ssl.SSLSocket):
+                if conn.pending() > 0:
+                    return False
+                # Peek underlying socket, SSLSocket doesn't support flags
+                raw = socket.socket(fileno=conn.fileno())
+                try:
+                    return ConnectionPool.is_alive(raw)
+                finally:
+                    raw.detach()
+            conn.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT)
+        except BlockingIOError:
+            return True
+        except OSError:
+            pass
+        return False
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡ Fast, Lightweight, Programmable Proxy Server in a single Python file.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import ctypes
+import multiprocessing
+from abc import ABC, abstractmethod
+from typing import Dict, List, Type
+
+
+class ThreadlessLoad:
+    """Load of a Threadless event loop, shared with its Acceptor.
+
+    Values live in shared memory and are only written by the Threadless
+    process.  Acceptor reads them without any synchronization, hence
+    readings can be slightly stale.
+    """
+
+    WORKS = 0
+    LAG_MS = 1
+    RECEIVED = 2
+
+    def __init__(self) -> None:
+        self.values = multiprocessing.RawArray(ctypes.c_double, 3)
+
+    @property
+    def works(self) -> int:
+        """Number of works currently managed by the loop."""
+        return int(self.values[self.WORKS])
+
+    @property
+    def lag_ms(self) -> float:
+        """Time spent by the loop handling its last wakeup."""
+        return float(self.values[self.LAG_MS])
+
+    @property
+    def received(self) -> int:
+        """Total number of clients received by the loop."""
+        return int(self.values[self.RECEIVED])
+
+    def update(self, works: int, lag_ms: float) -> None:
+        self.values[self.WORKS] = works
+        self.values[self.LAG_MS] = lag_ms
+
+    def incr_received(self, count: int = 1) -> None:
+        self.values[self.RECEIVED] += count
+
+
+class DispatchPolicy(ABC):
+    """Decides which Threadless loop receives the next client.
+
+    Clients dispatched by Acceptor but not yet received by the loop
+    are accounted for, so that a batch of clients dispatched in one go
+    is spread across loops even though reported load is stale."""
+
+    def __init__(self, loads: List[ThreadlessLoad]) -> None:
+        self.loads = loads
+        self.dispatched: List[int] = [0] * len(loads)
+
+    def pending(self, index: int) -> int:
+        return max(0, self.dispatched[index] - self.loads[index].received)
+
+    def works(self, index: int) -> int:
+        """Works managed by the loop, including those still in transit."""
+        return self.loads[index].works + self.pending(index)
+
+    def dispatch(self) -> int:
+        index = self.select()
+        self.dispatched[index] += 1
+        return index
+
+    @abstractmethod
+    def select(self) -> int:
+        """Returns index of the loop to dispatch next client to."""
+        raise NotImplementedError()     # pragma: no cover
+
+
+class RoundRobinPolicy(DispatchPolicy):
+    """Cycles through loops irrespective of their load."""
+
+    def __init__(self, loads: List[ThreadlessLoad]) -> None:
+        super().__init__(loads)
+        self.next = 0
+
+    def select(self) -> int:
+        index = self.next
+        self.next = (self.next + 1) % len(self.loads)
+        return index
+
+
+class LeastWorksPolicy(DispatchPolicy):
+    """Picks loop managing fewest works.  Ties go to the lowest index."""
+
+    def select(self) -> int:
+        return min(range(len(self.loads)), key=self.works)
+
+
+class LowestLagPolicy(DispatchPolicy):
+    """Picks loop which spent least time handling its last wakeup.
+
+    Long-lived but busy works (e.g. tunnels streaming data) increase
+    loop lag without increasing number of works.  Reported lag is scaled
+    by clients still in transit to the loop and ties are broken by
+    number of works, so that idle loops still share a batch of clients."""
+
+    def select(self) -> int:
+        return min(
+            range(len(self.loads)),
+            key=lambda index: (
+                self.loads[index].lag_ms * (1 + self.pending(index)),
+                self.works(index)))
+
+
+dispatch_policies: Dict[str, Type[DispatchPolicy]] = {
+    'round-robin': RoundRobinPolicy,
+    'least-works': LeastWorksPolicy,
+    'lowest-lag': LowestLagPolicy,
+}
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡ Fast, Lightweight, Programmable Proxy Server in a single Python file.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import socket
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .per_process import PerProcess
+from .stats import Stats
+
+# Delay before starting next connection attempt while previous
+# attempts are still in progress, see RFC 8305 section 5.
+CONNECTION_ATTEMPT_DELAY = 0.25
+
+# Maximum number of hosts for which address family outcomes are tracked
+MAX_TRACKED_HOSTS = 4096
+
+
+def family_name(family: int) -> str:
+    return 'ipv6' if family == socket.AF_INET6 else 'ipv4'
+
+
+def interleave(addrinfos: List[Tuple[Any, ...]], preferred: Optional[int]) -> List[Tuple[Any, ...]]:
+    """Orders resolved addresses by alternating address families, see RFC 8305
+    section 4.  Starts with preferred family, otherwise with family of first
+    address.  Order within each family is preserved."""
+    if len(addrinfos) == 0:
+        return addrinfos
+    families: Dict[int, List[Tuple[Any, ...]]] = {}
+    for addrinfo in addrinfos:
+        families.setdefault(addrinfo[0], []).append(addrinfo)
+    order = list(families.keys())
+    if preferred in families:
+        order.remove(preferred)
+        order.insert(0, preferred)
+    ordered: List[Tuple[Any, ...]] = []
+    index = 0
+    while len(ordered) < len(addrinfos):
+        for family in order:
+            if index < len(families[family]):
+                ordered.append(families[family][index])
+        index += 1
+    return ordered
+
+
+class AddressFamilyStats(PerProcess):
+    """Per-process outcomes of connection attempts by host and address family.
+
+    Family which last connected to a host is attempted first for next
+    connections to it."""
+
+    def __init__(self, stats: Optional[Stats] = None) -> None:
+        self.stats = stats if stats is not None else Stats.get('happy-eyeballs')
+        # Accessed from client threads unless threadless
+        self.lock = threading.Lock()
+        # host => family => [connected, failed]
+        self.hosts: 'OrderedDict[str, Dict[int, List[int]]]' = OrderedDict()
+        self.preferred: Dict[str, int] = {}
+
+    def preferred_family(self, host: str) -> Optional[int]:
+        with self.lock:
+            return self.preferred.get(host)
+
+    def record(self, host: str, family: int, connected: bool) -> None:
+        self.stats.incr('%s_%s' % (family_name(family), 'connected' if connected else 'failed'))
+        with self.lock:
+            counts = self.hosts.setdefault(host, {}).setdefault(family, [0, 0])
+            counts[0 if connected else 1] += 1
+            self.hosts.move_to_end(host)
+            if connected:
+                self.preferred[host] = family
+            while len(self.hosts) > MAX_TRACKED_HOSTS:
+                evicted, _ = self.hosts.popitem(last=False)
+                self.preferred.pop(evicted, None)
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡ Fast, Lightweight, Programmable Proxy Server in a single Python file.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+from typing import Any, Dict, Optional, Tuple, Type, TypeVar, cast
+
+from ..common.flags import Flags
+
+T = TypeVar('T', bound='PerProcess')
+
+
+class PerProcess:
+    """Base of objects shared by all clients handled within a process,
+    e.g. caches and pools.
+
+    Use Klass.get(flags) to obtain the instance for current process, built
+    by Klass.from_flags.  Instance is kept for the Flags it was built from,
+    which every client of a process is handled with.  Invoking get with
+    other Flags, e.g. once proxy.main runs again within the same process,
+    replaces the instance.  Classes not configured by flags use Klass.get()."""
+
+    # Class => (Flags, instance) for current process
+    registry: Dict[type, Tuple[Optional[Flags], Any]] = {}
+
+    @classmethod
+    def get(cls: Type[T], flags: Optional[Flags] = None) -> T:
+        entry = PerProcess.registry.get(cls)
+        if entry is not None and entry[0] is flags:
+            return cast(T, entry[1])
+        instance = cls.from_flags(flags)
+        PerProcess.registry[cls] = (flags, instance)
+        return instance
+
+    @classmethod
+    def from_flags(cls: Type[T], flags: Optional[Flags]) -> T:
+        return cls()
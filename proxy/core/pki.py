@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡ Fast, Lightweight, Programmable Proxy Server in a single Python file.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import os
+import ssl
+import time
+import datetime
+import ipaddress
+import logging
+import tempfile
+import threading
+import contextlib
+import subprocess
+from collections import OrderedDict
+from typing import Any, Generator, Iterable, List, Optional, Tuple
+
+from .per_process import PerProcess
+from .stats import Stats
+from .tls import build_server_context
+from ..common.flags import Flags
+
+try:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.x509.oid import NameOID
+    HAS_CRYPTOGRAPHY = True
+except ImportError:     # pragma: no cover
+    HAS_CRYPTOGRAPHY = False
+
+try:
+    import fcntl
+    HAS_FCNTL = True
+except ImportError:     # pragma: no cover
+    HAS_FCNTL = False
+
+logger = logging.getLogger(__name__)
+
+# Validity of generated certificates.  Backdated to tolerate clock skew of clients.
+CERTIFICATE_VALIDITY_DAYS = 365
+CERTIFICATE_BACKDATE_DAYS = 1
+
+# Common second level labels under two letter country code TLDs.  Approximates
+# public suffixes such as co.uk, clients reject wildcards issued for them.
+SECOND_LEVEL_LABELS = frozenset(('ac', 'co', 'com', 'edu', 'go', 'gov', 'ne', 'net', 'or', 'org'))
+
+
+def cert_file_path(ca_cert_dir: str, name: str) -> str:
+    # Wildcard names are stored as _.parent-domain.pem
+    return os.path.join(ca_cert_dir, '%s.pem' % name.replace('*', '_'))
+
+
+def certificate_name(host: str) -> str:
+    """Returns wildcard name of certificate to share between host and its siblings.
+
+    www.example.com and example.com are both issued *.example.com, which also
+    carries example.com as subjectAltName.  IP addresses, single label hosts
+    and public suffixes are issued for themselves."""
+    try:
+        ipaddress.ip_address(host)
+        return host
+    except ValueError:
+        pass
+    labels = host.split('.')
+    suffix = 2 if len(labels) > 1 and len(labels[-1]) == 2 and \
+        labels[-2] in SECOND_LEVEL_LABELS else 1
+    if len(labels) <= suffix:
+        return host
+    if len(labels) == suffix + 1:
+        return '*.%s' % host
+    return '*.%s' % '.'.join(labels[1:])
+
+
+def subject_alt_names(name: str) -> str:
+    """Returns subjectAltName extension value of certificate name for openssl."""
+    try:
+        ipaddress.ip_address(name)
+        return 'IP:%s' % name
+    except ValueError:
+        pass
+    if name.startswith('*.'):
+        return 'DNS:%s,DNS:%s' % (name, name[2:])
+    return 'DNS:%s' % name
+
+
+def random_serial_number() -> int:
+    """Returns a positive random serial number of at most 159 bits, as
+    cryptography x509.random_serial_number does."""
+    return int.from_bytes(os.urandom(20), 'big') >> 1
+
+
+def read(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def temporary_path(path: str) -> str:
+    """Returns path of a new empty file next to path, to be renamed onto path."""
+    fd, tmp = tempfile.mkstemp(
+        dir=os.path.dirname(path), prefix='.%s.' % os.path.basename(path), suffix='.tmp')
+    os.close(fd)
+    return tmp
+
+
+@contextlib.contextmanager
+def file_lock(path: str) -> Generator[None, None, None]:
+    """Holds an exclusive lock on path across processes.
+
+    Lock is advisory and only taken where fcntl is available.  Lock files
+    are left in place, removing them would race with waiting lockers."""
+    with open(path, 'a') as f:
+        if HAS_FCNTL:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        # Closing the file releases the lock
+        yield
+
+
+class CertificateAuthority(PerProcess):
+    """Per-process issuer of certificates for TLS interception.
+
+    Certificates for intercepted hosts use --ca-signing-key-file as their key,
+    whose type e.g. RSA or ECDSA hence is the leaf key type, and are signed
+    by --ca-cert-file and --ca-key-file.  With wildcard, sibling hosts share
+    a certificate issued for their parent domain, see certificate_name.
+    Server side SSLContexts loaded with certificates are kept ready in an
+    LRU of at most max_contexts.  Certificates are also written to
+    ca_cert_dir, a second tier cache which outlives processes and is shared
+    by them.  A certificate is signed by only one process at a time, others
+    wait for it and then read it.  Certificates are renamed into place once
+    complete, so readers never see partially written files.  Certificates
+    are signed in-process when cryptography package is installed, otherwise
+    using openssl command."""
+
+    def __init__(
+            self,
+            ca_cert_file: str,
+            ca_key_file: str,
+            signing_key_file: str,
+            ca_cert_dir: str,
+            max_contexts: int,
+            wildcard: bool = False,
+            stats: Optional[Stats] = None) -> None:
+        self.ca_cert_file = ca_cert_file
+        self.ca_key_file = ca_key_file
+        self.signing_key_file = signing_key_file
+        self.ca_cert_dir = ca_cert_dir
+        self.max_contexts = max_contexts
+        self.wildcard = wildcard
+        self.stats = stats if stats is not None else Stats.get('certificate-authority')
+        # Accessed from client threads unless threadless
+        self.lock = threading.Lock()
+        # Serializes signing, cache lookups do not wait for it
+        self.sign_lock = threading.Lock()
+        self.contexts: 'OrderedDict[str, ssl.SSLContext]' = OrderedDict()
+        # CA certificate, CA key and public key of signing key, once loaded
+        self.keys: Optional[Tuple[Any, Any, Any]] = None
+
+    @classmethod
+    def from_flags(cls, flags: Optional[Flags]) -> 'CertificateAuthority':
+        assert flags is not None and flags.ca_cert_file and flags.ca_key_file and \
+            flags.ca_signing_key_file and flags.ca_cert_dir
+        return cls(
+            flags.ca_cert_file, flags.ca_key_file, flags.ca_signing_key_file,
+            flags.ca_cert_dir, flags.ca_cert_cache_size, flags.ca_cert_wildcard)
+
+    def context(self, host: str) -> ssl.SSLContext:
+        """Returns server side SSLContext to intercept host with.
+
+        Contexts are shared by sibling hosts when issuing wildcard certificates.
+        Users must handle OSError and ssl.SSLError exceptions."""
+        name = self.certificate_name(host)
+        with self.lock:
+            ctx = self.contexts.get(name)
+            if ctx is not None:
+                self.contexts.move_to_end(name)
+                self.stats.incr('hit')
+                return ctx
+        self.stats.incr('miss')
+        ctx = build_server_context(self.certificate(name), self.signing_key_file)
+        with self.lock:
+            self.contexts[name] = ctx
+            self.contexts.move_to_end(name)
+            while len(self.contexts) > self.max_contexts:
+                self.contexts.popitem(last=False)
+                self.stats.incr('evicted')
+            self.stats.gauge('cached', len(self.contexts))
+        return ctx
+
+    def certificate_name(self, host: str) -> str:
+        return certificate_name(host) if self.wildcard else host
+
+    def warm_up(self, hosts: Iterable[str]) -> None:
+        """Signs certificates for hosts, unless found in ca_cert_dir, and loads their contexts."""
+        start = time.time()
+        names = set()
+        count = 0
+        for host in hosts:
+            self.context(host)
+            names.add(self.certificate_name(host))
+            count += 1
+        logger.info('Warmed up %d certificates for %d hosts in %.1f ms',
+                    len(names), count, (time.time() - start) * 1000)
+
+    def certificate(self, name: str) -> str:
+        """Returns path of certificate for name, signed unless found in ca_cert_dir."""
+        path = cert_file_path(self.ca_cert_dir, name)
+        if os.path.isfile(path):
+            self.stats.incr('disk_hit')
+            return path
+        with self.sign_lock, file_lock('%s.lock' % path):
+            # Another process may have signed it while we waited
+            if os.path.isfile(path):
+                self.stats.incr('disk_hit')
+                return path
+            logger.debug('Generating certificates %s', path)
+            start = time.time()
+            tmp = temporary_path(path)
+            try:
+                if HAS_CRYPTOGRAPHY:
+                    self.sign(name, tmp)
+                else:   # pragma: no cover
+                    self.sign_using_openssl(name, tmp)
+                os.replace(tmp, path)
+            except BaseException:
+                os.remove(tmp)
+                raise
+            self.stats.observe('sign_ms', (time.time() - start) * 1000)
+        return path
+
+    def sign(self, name: str, path: str) -> None:
+        if self.keys is None:
+            self.keys = (
+                x509.load_pem_x509_certificate(read(self.ca_cert_file)),
+                serialization.load_pem_private_key(read(self.ca_key_file), password=None),
+                serialization.load_pem_private_key(read(self.signing_key_file), password=None).public_key())
+        keys: Tuple[Any, Any, Any] = self.keys
+        ca_cert, ca_key, public_key = keys
+        try:
+            sans: List[Any] = [x509.IPAddress(ipaddress.ip_address(name))]
+        except ValueError:
+            sans = [x509.DNSName(name)]
+            if name.startswith('*.'):
+                sans.append(x509.DNSName(name[2:]))
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cert = x509.CertificateBuilder() \
+            .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, name)])) \
+            .issuer_name(ca_cert.subject) \
+            .public_key(public_key) \
+            .serial_number(x509.random_serial_number()) \
+            .not_valid_before(now - datetime.timedelta(days=CERTIFICATE_BACKDATE_DAYS)) \
+            .not_valid_after(now + datetime.timedelta(days=CERTIFICATE_VALIDITY_DAYS)) \
+            .add_extension(x509.BasicConstraints(ca=False, path_length=None), critical=True) \
+            .add_extension(x509.SubjectAlternativeName(sans), critical=False) \
+            .sign(ca_key, hashes.SHA256())
+        with open(path, 'wb') as f:
+            f.write(cert.public_bytes(serialization.Encoding.PEM))
+
+    def sign_using_openssl(self, name: str, path: str) -> None:
+        gen_cert = subprocess.Popen(
+            ['openssl', 'req', '-new', '-key', self.signing_key_file, '-subj',
+             f'/C=/ST=/L=/O=/OU=/CN={ name }'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        fd, extfile = tempfile.mkstemp(suffix='.ext')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write('subjectAltName=%s\n' % subject_alt_names(name))
+            sign_cert = subprocess.Popen(
+                ['openssl', 'x509', '-req', '-days', str(CERTIFICATE_VALIDITY_DAYS), '-CA', self.ca_cert_file,
+                 '-CAkey', self.ca_key_file, '-set_serial', str(random_serial_number()),
+                 '-extfile', extfile, '-out', path],
+                stdin=gen_cert.stdout,
+                stderr=subprocess.PIPE)
+            _, err = sign_cert.communicate(timeout=10)
+            gen_cert.wait(timeout=10)
+        finally:
+            os.remove(extfile)
+        if gen_cert.returncode != 0 or sign_cert.returncode != 0:
+            raise OSError('openssl failed to generate certificate for %s: %r' % (name, err))
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡ Fast, Lightweight, Programmable Proxy Server in a single Python file.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import socket
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from .per_process import PerProcess
+from .stats import Stats
+from ..common.flags import Flags
+
+logger = logging.getLogger(__name__)
+
+# Resolved address, as returned by socket.getaddrinfo
+AddrInfo = Tuple[Any, ...]
+# Lookup key, upstream host and port
+LookupKey = Tuple[str, int]
+
+
+class Lookup:
+    """Resolution of an upstream host and port.
+
+    A lookup which isn't done yet becomes readable once resolved.
+    Event loops must wait for reader to be readable, then use result."""
+
+    def __init__(self, host: str, port: int) -> None:
+        self.key: LookupKey = (host, port)
+        self.addrinfos: Optional[List[AddrInfo]] = None
+        self.error: Optional[OSError] = None
+        self.reader: Optional[socket.socket] = None
+        self.writer: Optional[socket.socket] = None
+
+    def done(self) -> bool:
+        return self.addrinfos is not None or self.error is not None
+
+    def result(self) -> List[AddrInfo]:
+        """Returns resolved addresses.  Raises OSError if lookup has failed."""
+        if self.error is not None:
+            raise self.error
+        assert self.addrinfos is not None
+        return self.addrinfos
+
+    def wait(self) -> None:
+        """Prepares lookup for resolution off the event loop."""
+        self.reader, self.writer = socket.socketpair()
+        self.reader.setblocking(False)
+
+    def resolved(self, addrinfos: Optional[List[AddrInfo]], error: Optional[OSError]) -> None:
+        self.addrinfos, self.error = addrinfos, error
+        if self.writer is not None:
+            self.writer.send(b'\x00')
+
+    def close(self) -> None:
+        for sock in (self.reader, self.writer):
+            if sock is not None:
+                sock.close()
+
+
+class Resolver(PerProcess):
+    """Per-process asynchronous resolver with positive and negative cache.
+
+    Names are resolved by getaddrinfo on a small thread pool, so that
+    event loops never block on DNS.  Concurrent lookups for same host
+    and port are coalesced into a single getaddrinfo call.  Resolved
+    addresses are cached for ttl seconds and failures for negative_ttl
+    seconds.  IP addresses are resolved immediately."""
+
+    def __init__(
+            self,
+            threads: int,
+            ttl: float,
+            negative_ttl: float,
+            stats: Optional[Stats] = None) -> None:
+        self.threads = max(1, threads)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stats = stats if stats is not None else Stats.get('resolver')
+        # Accessed from resolver threads and client threads unless threadless
+        self.lock = threading.Lock()
+        self.cache: Dict[LookupKey, Tuple[float, Optional[List[AddrInfo]], Optional[OSError]]] = {}
+        # Lookups waiting for an in-flight getaddrinfo call
+        self.pending: Dict[LookupKey, List[Lookup]] = {}
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.last_sweep: float = 0
+
+    @classmethod
+    def from_flags(cls, flags: Optional[Flags]) -> 'Resolver':
+        assert flags is not None
+        return cls(
+            flags.dns_resolver_threads,
+            flags.dns_cache_ttl,
+            flags.dns_negative_cache_ttl)
+
+    def resolve(self, host: str, port: int) -> Lookup:
+        """Returns a lookup for host and port, done already
+        when host is an IP address or cached."""
+        lookup = Lookup(host, port)
+        try:
+            lookup.resolved(socket.getaddrinfo(
+                host, port, type=socket.SOCK_STREAM, flags=socket.AI_NUMERICHOST), None)
+            return lookup
+        except socket.gaierror:
+            pass
+        now = time.time()
+        with self.lock:
+            self.sweep(now)
+            cached = self.cache.get(lookup.key)
+            if cached is not None and cached[0] > now:
+                self.stats.incr('hit' if cached[2] is None else 'negative_hit')
+                lookup.resolved(cached[1], cached[2])
+                return lookup
+            lookup.wait()
+            if lookup.key in self.pending:
+                self.stats.incr('coalesced')
+                self.pending[lookup.key].append(lookup)
+                return lookup
+            self.stats.incr('miss')
+            self.pending[lookup.key] = [lookup]
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=self.threads, thread_name_prefix='resolver')
+            self.executor.submit(self.lookup, lookup.key)
+        return lookup
+
+    def release(self, lookup: Lookup) -> None:
+        """Closes descriptors of lookup, e.g. once resolved or abandoned by client.
+        In-flight getaddrinfo call is still cached on completion."""
+        with self.lock:
+            waiters = self.pending.get(lookup.key, [])
+            if lookup in waiters:
+                waiters.remove(lookup)
+            lookup.close()
+
+    def lookup(self, key: LookupKey) -> None:
+        """Invoked on resolver threads."""
+        addrinfos: Optional[List[AddrInfo]] = None
+        error: Optional[OSError] = None
+        start = time.time()
+        try:
+            addrinfos = socket.getaddrinfo(key[0], key[1], type=socket.SOCK_STREAM)
+        except OSError as e:
+            error = e
+            self.stats.incr('error')
+        now = time.time()
+        self.stats.observe('lookup_ms', (now - start) * 1000)
+        with self.lock:
+            ttl = self.ttl if error is None else self.negative_ttl
+            if ttl > 0:
+                self.cache[key] = (now + ttl, addrinfos, error)
+            self.stats.gauge('cached', len(self.cache))
+            for waiter in self.pending.pop(key, []):
+                waiter.resolved(addrinfos, error)
+
+    def sweep(self, now: float) -> None:
+        """Drops expired cache entries, at most once a second."""
+        if now - self.last_sweep < 1:
+            return
+        self.last_sweep = now
+        for key in [key for key, cached in self.cache.items() if cached[0] <= now]:
+            del self.cache[key]
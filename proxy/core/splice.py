@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡ Fast, Lightweight, Programmable Proxy Server in a single Python file.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import os
+import socket
+import logging
+
+try:
+    import fcntl
+except ImportError:     # pragma: no cover
+    pass
+
+logger = logging.getLogger(__name__)
+
+# Requested pipe capacity.  Linux default is 64 KB,
+# larger pipes need fewer splice calls per relayed MB.
+SPLICE_PIPE_SIZE = 1024 * 1024
+
+
+def splice_supported() -> bool:
+    """os.splice is only available on Linux with Python 3.10+."""
+    return hasattr(os, 'splice')
+
+
+class SplicePipe:
+    """Relays data from src to dst socket through a pipe using splice(2).
+
+    Data never enters user space.  Relayed data is first moved from src
+    into the pipe and then from the pipe into dst.  Pending holds bytes
+    sitting within the pipe, i.e. not yet accepted by dst.
+
+    Both sockets must be plain non-blocking sockets, not SSL sockets."""
+
+    def __init__(
+            self,
+            src: socket.socket,
+            dst: socket.socket,
+            size: int = SPLICE_PIPE_SIZE) -> None:
+        self.src = src
+        self.dst = dst
+        self.read_fd, self.write_fd = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
+        try:
+            fcntl.fcntl(self.write_fd, fcntl.F_SETPIPE_SZ, size)
+        except OSError:
+            # Above /proc/sys/fs/pipe-max-size or per-user pipe
+            # buffer limit, keep default capacity
+            pass
+        self.capacity: int = fcntl.fcntl(self.write_fd, fcntl.F_GETPIPE_SZ)
+        self.pending: int = 0
+        self.total: int = 0
+        self.eof: bool = False
+
+    def wants_read(self) -> bool:
+        return not self.eof and self.pending < self.capacity
+
+    def wants_write(self) -> bool:
+        return self.pending > 0
+
+    def done(self) -> bool:
+        """True once src has been closed and everything is relayed to dst."""
+        return self.eof and self.pending == 0
+
+    def fill(self) -> int:
+        """Moves data available on src into pipe.
+
+        Returns number of bytes moved.  Users must handle OSError exceptions."""
+        try:
+            moved: int = os.splice(
+                self.src.fileno(), self.write_fd, self.capacity - self.pending,
+                flags=os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK)
+        except BlockingIOError:
+            return 0
+        if moved == 0:
+            self.eof = True
+        self.pending += moved
+        self.total += moved
+        return moved
+
+    def drain(self) -> int:
+        """Moves pending data from pipe into dst.
+
+        Returns number of bytes moved.  Users must handle OSError exceptions."""
+        if self.pending == 0:
+            return 0
+        try:
+            moved: int = os.splice(
+                self.read_fd, self.dst.fileno(), self.pending,
+                flags=os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK)
+        except BlockingIOError:
+            return 0
+        self.pending -= moved
+        return moved
+
+    def close(self) -> None:
+        if self.pending > 0:
+            logger.debug('Closing splice pipe with %d pending bytes', self.pending)
+        os.close(self.read_fd)
+        os.close(self.write_fd)
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡ Fast, Lightweight, Programmable Proxy Server in a single Python file.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import json
+import time
+import logging
+from collections import deque
+from typing import Dict, Any, Deque
+
+from ..common.constants import DEFAULT_STATS_SAMPLES
+
+logger = logging.getLogger(__name__)
+
+
+class Stats:
+    """Per-process counters and latency samples.
+
+    Stats are neither shared across processes nor synchronized across threads.
+    Counters incremented from multiple threads are best effort.
+
+    Use Stats.get(name) to obtain a named instance.  When --stats-interval is used,
+    core loops periodically log a snapshot of all named instances within their process.
+    """
+
+    registry: Dict[str, 'Stats'] = {}
+    last_report: float = 0
+
+    def __init__(self, name: str, max_samples: int = DEFAULT_STATS_SAMPLES) -> None:
+        self.name = name
+        self.max_samples = max_samples
+        self.counters: Dict[str, int] = {}
+        self.samples: Dict[str, Deque[float]] = {}
+        self.gauges: Dict[str, float] = {}
+        self.last_snapshot_time: float = time.time()
+        self.last_snapshot_counters: Dict[str, int] = {}
+
+    @classmethod
+    def get(cls, name: str) -> 'Stats':
+        if name not in cls.registry:
+            cls.registry[name] = cls(name)
+        return cls.registry[name]
+
+    def incr(self, key: str, value: int = 1) -> None:
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, key: str, value: float) -> None:
+        """Record current value, e.g. a queue depth."""
+        self.gauges[key] = value
+
+    def observe(self, key: str, value: float) -> None:
+        """Record a sample.  Only last max_samples are retained."""
+        if key not in self.samples:
+            self.samples[key] = deque(maxlen=self.max_samples)
+        self.samples[key].append(value)
+
+    def percentile(self, key: str, p: float) -> float:
+        if key not in self.samples or len(self.samples[key]) == 0:
+            return 0.0
+        ordered = sorted(self.samples[key])
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Returns counters, per second rate of counters since last snapshot,
+        gauges and p50/p99 of recorded samples."""
+        now = time.time()
+        elapsed = max(now - self.last_snapshot_time, 1e-6)
+        snapshot: Dict[str, Any] = {}
+        for key, value in list(self.counters.items()):
+            snapshot[key] = value
+            snapshot[key + '_per_sec'] = round(
+                (value - self.last_snapshot_counters.get(key, 0)) / elapsed, 2)
+        for key, gauge in list(self.gauges.items()):
+            snapshot[key] = gauge
+        for key in list(self.samples.keys()):
+            snapshot[key + '_p50'] = self.percentile(key, 50)
+            snapshot[key + '_p99'] = self.percentile(key, 99)
+        self.last_snapshot_time = now
+        self.last_snapshot_counters = dict(self.counters)
+        return snapshot
+
+    @classmethod
+    def report(cls, interval: float) -> None:
+        """Logs snapshot of all named stats, at most once every interval seconds."""
+        if interval <= 0:
+            return
+        now = time.time()
+        if now - cls.last_report < interval:
+            return
+        cls.last_report = now
+        for name in list(cls.registry.keys()):
+            logger.info('%s %s', name, json.dumps(cls.registry[name].snapshot()))
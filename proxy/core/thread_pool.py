@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡ Fast, Lightweight, Programmable Proxy Server in a single Python file.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import asyncio
+import logging
+import multiprocessing
+import socket
+import threading
+import time
+from collections import deque
+from multiprocessing import connection
+from typing import Deque, List, Optional, Tuple, Type
+
+from .event import EventQueue
+from .dispatch import ThreadlessLoad, DispatchPolicy, dispatch_policies
+from .stats import Stats
+from .threadless import Threadless, ThreadlessWork
+from ..common.flags import Flags
+
+logger = logging.getLogger(__name__)
+
+
+class PooledThreadless(Threadless):
+    """Threadless event loop running within a ThreadPool thread.
+
+    Clients are handed over in-process, no file descriptor passing involved.
+    client_queue only carries wakeups.  Pool is notified when a work finishes."""
+
+    def __init__(
+            self,
+            pool: 'ThreadPool',
+            client_queue: connection.Connection,
+            flags: Flags,
+            work_klass: Type[ThreadlessWork],
+            event_queue: Optional[EventQueue] = None,
+            load: Optional[ThreadlessLoad] = None) -> None:
+        super().__init__(client_queue, flags, work_klass, event_queue, load=load)
+        self.pool = pool
+        self.clients: Deque[Tuple[int, Tuple[str, int]]] = deque()
+        # Whether a wakeup is pending on client_queue, guarded by pool lock.
+        # Pool wakes loop at most once until loop takes its clients.
+        self.woken = False
+
+    def accept_client(self) -> None:
+        assert self.client_queue is not None
+        with self.pool.lock:
+            self.woken = False
+        try:
+            while self.client_queue.poll():
+                self.client_queue.recv_bytes()
+        except EOFError:
+            # Pool has been shutdown
+            self.running = False
+            return
+        count = 0
+        while len(self.clients) > 0:
+            fileno, addr = self.clients.popleft()
+            self.create_work(fileno, addr)
+            count += 1
+        self.received(count)
+
+    def open_client_queue(self) -> None:
+        # Clients are taken from self.clients, no descriptors to receive
+        pass
+
+    def cleanup(self, work_id: int) -> None:
+        super().cleanup(work_id)
+        self.pool.done()
+
+    def run(self) -> None:
+        # Threads other than main thread have no event loop by default
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        super().run()
+
+
+class ThreadPool:
+    """Fixed number of threads, each running an event loop, used by Acceptor
+    instead of spawning a new thread for each client connection.
+
+    Accepted clients are dispatched among threads as per --dispatch-policy.
+    At most --thread-pool-max-inflight clients are handled at a time, further
+    clients wait in a queue of --thread-pool-queue-size.  Clients accepted
+    while queue is full are closed.
+
+    Thread count, in-flight clients and queue depth are recorded as gauges
+    of the given Stats."""
+
+    def __init__(
+            self,
+            flags: Flags,
+            work_klass: Type[ThreadlessWork],
+            event_queue: Optional[EventQueue] = None,
+            stats: Optional[Stats] = None) -> None:
+        self.flags = flags
+        self.work_klass = work_klass
+        self.event_queue = event_queue
+        self.stats = stats if stats is not None else Stats.get('thread-pool')
+
+        self.running = False
+        self.loops: List[PooledThreadless] = []
+        self.threads: List[threading.Thread] = []
+        self.client_queues: List[connection.Connection] = []
+        self.loads: List[ThreadlessLoad] = []
+        self.dispatcher: Optional[DispatchPolicy] = None
+        # Guards in-flight count, queue, client_queues and pending
+        # wakeups, which are also accessed from pool threads.
+        self.lock = threading.Lock()
+        self.inflight = 0
+        self.queue: Deque[Tuple[int, Tuple[str, int], float]] = deque()
+
+    def start(self) -> None:
+        for index in range(self.flags.thread_pool_size):
+            pipe = multiprocessing.Pipe()
+            load = ThreadlessLoad()
+            loop = PooledThreadless(
+                pool=self,
+                client_queue=pipe[1],
+                flags=self.flags,
+                work_klass=self.work_klass,
+                event_queue=self.event_queue,
+                load=load
+            )
+            thread = threading.Thread(
+                target=loop.run, name='thread-pool-%d' % index, daemon=True)
+            thread.start()
+            self.loops.append(loop)
+            self.threads.append(thread)
+            self.client_queues.append(pipe[0])
+            self.loads.append(load)
+        self.dispatcher = dispatch_policies[self.flags.dispatch_policy](self.loads)
+        self.running = True
+        self.stats.gauge('threads', len(self.threads))
+        self.update_gauges()
+        logger.debug('Started %d pool threads', len(self.threads))
+
+    def shutdown(self) -> None:
+        with self.lock:
+            self.running = False
+            # Pool threads exit upon EOF
+            for client_queue in self.client_queues:
+                client_queue.close()
+            while len(self.queue) > 0:
+                fileno, _, _ = self.queue.popleft()
+                socket.socket(fileno=fileno).close()
+        for thread in self.threads:
+            thread.join()
+        logger.debug('Stopped %d pool threads', len(self.threads))
+
+    def submit(self, clients: List[Tuple[socket.socket, Tuple[str, int]]]) -> None:
+        """Dispatches accepted clients to pool threads, or queues them when
+        --thread-pool-max-inflight clients are already being handled.
+
+        Pool owns accepted connections from now on."""
+        now = time.time()
+        woken: List[int] = []
+        with self.lock:
+            for conn, addr in clients:
+                if self.has_capacity():
+                    woken.extend(self.dispatch(conn.detach(), addr))
+                elif len(self.queue) < self.flags.thread_pool_queue_size:
+                    self.queue.append((conn.detach(), addr, now))
+                    self.stats.incr('queued')
+                else:
+                    conn.close()
+                    self.stats.incr('rejected')
+            self.update_gauges()
+        self.wake(woken)
+
+    def done(self) -> None:
+        """Invoked from pool threads when a work has finished."""
+        woken: List[int] = []
+        with self.lock:
+            self.inflight -= 1
+            if self.running and len(self.queue) > 0 and self.has_capacity():
+                fileno, addr, queued_at = self.queue.popleft()
+                self.stats.observe('queue_wait_ms', (time.time() - queued_at) * 1000)
+                woken = self.dispatch(fileno, addr)
+            self.update_gauges()
+        self.wake(woken)
+
+    def wake(self, woken: List[int]) -> None:
+        """Wakes up pool threads.  Invoked without holding lock, as pool
+        threads must be able to take lock while a wakeup is being sent."""
+        for index in woken:
+            try:
+                self.client_queues[index].send_bytes(b'\x00')
+            except OSError:
+                # Pool has been shutdown meanwhile
+                pass
+
+    def has_capacity(self) -> bool:
+        return self.flags.thread_pool_max_inflight <= 0 or \
+            self.inflight < self.flags.thread_pool_max_inflight
+
+    def dispatch(self, fileno: int, addr: Tuple[str, int]) -> List[int]:
+        """Hands client over to a pool thread.  Returns index of pool thread
+        which must then be woken up, unless a wakeup is already pending."""
+        assert self.dispatcher is not None
+        index = self.dispatcher.dispatch()
+        loop = self.loops[index]
+        loop.clients.append((fileno, addr))
+        self.inflight += 1
+        self.stats.incr('dispatched')
+        if loop.woken:
+            return []
+        loop.woken = True
+        return [index]
+
+    def update_gauges(self) -> None:
+        self.stats.gauge('inflight', self.inflight)
+        self.stats.gauge('queue_depth', len(self.queue))
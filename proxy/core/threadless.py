@@ -8,7 +8,11 @@
     :license: BSD, see LICENSE for more details.
 """
 import os
+import time
 import uuid
+import heapq
+import array
+import struct
 import socket
 import logging
 import asyncio
@@ -23,6 +27,9 @@ from abc import ABC, abstractmethod
 from typing import Dict, Optional, Tuple, List, Union, Generator, Any, Type
 
 from .event import EventQueue, eventNames
+from .dispatch import ThreadlessLoad
+from .connection import BufferPool
+from .stats import Stats
 
 from ..common.flags import Flags
 from ..common.types import HasFileno
@@ -30,6 +37,87 @@ from ..common.constants import DEFAULT_TIMEOUT
 
 logger = logging.getLogger(__name__)
 
+# Batched handoff of accepted clients requires SCM_RIGHTS support,
+# otherwise clients are sent one at a time using send_handle.
+BATCHED_HANDOFF = hasattr(socket, 'SCM_RIGHTS')
+# Linux refuses to pass more than SCM_MAX_FD (253) descriptors per message.
+MAX_CLIENTS_PER_HANDOFF = 253
+# Number of clients and payload size
+HANDOFF_HEADER = struct.Struct('!HI')
+# Client host length and port, followed by host
+HANDOFF_ADDR = struct.Struct('!BH')
+# Upper bound for time spent within select, also interval at which
+# works without a deadline are checked for inactivity.
+MAX_SELECT_TIMEOUT = 1.0
+
+
+def send_clients(
+        sock: socket.socket,
+        clients: List[Tuple[int, Tuple[str, int]]]) -> None:
+    """Sends accepted client file descriptors along with their addresses.
+
+    Each message carries up to MAX_CLIENTS_PER_HANDOFF descriptors as
+    SCM_RIGHTS ancillary data, in a single sendmsg call."""
+    for i in range(0, len(clients), MAX_CLIENTS_PER_HANDOFF):
+        chunk = clients[i:i + MAX_CLIENTS_PER_HANDOFF]
+        payload = b''
+        for _, addr in chunk:
+            host = addr[0].encode('utf-8')
+            payload += HANDOFF_ADDR.pack(len(host), addr[1]) + host
+        data = HANDOFF_HEADER.pack(len(chunk), len(payload)) + payload
+        fds = array.array('i', [fileno for fileno, _ in chunk])
+        sent = sock.sendmsg(
+            [data], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, fds)])
+        if sent < len(data):
+            sock.sendall(data[sent:])
+
+
+def recv_exactly(sock: socket.socket, size: int) -> bytes:
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise EOFError()
+        data += chunk
+    return data
+
+
+def recv_clients(sock: socket.socket) -> List[Tuple[int, Tuple[str, int]]]:
+    """Receives a batch of clients sent using send_clients.
+
+    Batch is dropped when not all descriptors were received, e.g. ancillary
+    data got truncated because receiver ran out of file descriptors.
+    Descriptors which were received are closed."""
+    fds = array.array('i')
+    header, ancdata, msg_flags, _ = sock.recvmsg(
+        HANDOFF_HEADER.size,
+        socket.CMSG_SPACE(MAX_CLIENTS_PER_HANDOFF * fds.itemsize))
+    if not header:
+        raise EOFError()
+    for level, kind, data in ancdata:
+        if level == socket.SOL_SOCKET and kind == socket.SCM_RIGHTS:
+            fds.frombytes(data[:len(data) - (len(data) % fds.itemsize)])
+    header += recv_exactly(sock, HANDOFF_HEADER.size - len(header))
+    count, size = HANDOFF_HEADER.unpack(header)
+    # Payload is consumed even when batch is dropped, next batch follows it
+    payload = recv_exactly(sock, size)
+    if msg_flags & socket.MSG_CTRUNC or count != len(fds):
+        for fileno in fds:
+            os.close(fileno)
+        logger.error(
+            'Dropped batch of %d clients, received %d descriptors%s',
+            count, len(fds), ' (truncated)' if msg_flags & socket.MSG_CTRUNC else '')
+        return []
+    clients: List[Tuple[int, Tuple[str, int]]] = []
+    offset = 0
+    for fileno in fds:
+        length, port = HANDOFF_ADDR.unpack_from(payload, offset)
+        offset += HANDOFF_ADDR.size
+        host = payload[offset:offset + length].decode('utf-8')
+        offset += length
+        clients.append((fileno, (host, port)))
+    return clients
+
 
 class ThreadlessWork(ABC):
     """Implement ThreadlessWork to hook into the event loop provided by Threadless process."""
@@ -80,8 +168,22 @@ class ThreadlessWork(ABC):
     def is_inactive(self) -> bool:
         return False    # pragma: no cover
 
+    def deadline(self) -> Optional[float]:
+        """Return time at which work may become inactive.
+
+        Threadless checks is_inactive only once deadline has passed.  Works
+        with multiple timeouts (e.g. idle, header read or connect timeout)
+        must return the earliest one.  Deadline is queried after initialize
+        and after every handle_events invocation.  When None, is_inactive is
+        checked every MAX_SELECT_TIMEOUT seconds."""
+        return None
+
     @abstractmethod
     def get_events(self) -> Dict[socket.socket, int]:
+        """Return descriptors and events of interest.
+
+        Threadless queries events after initialize and after every
+        handle_events invocation and keeps them registered until then."""
         return {}   # pragma: no cover
 
     @abstractmethod
@@ -89,7 +191,10 @@ class ThreadlessWork(ABC):
             self,
             readables: List[Union[int, HasFileno]],
             writables: List[Union[int, HasFileno]]) -> bool:
-        """Return True to shutdown work."""
+        """Return True to shutdown work.
+
+        Threadless only invokes handle_events when at least one of the
+        descriptors returned by get_events is ready, passing only those."""
         return False    # pragma: no cover
 
     @abstractmethod
@@ -105,46 +210,101 @@ class Threadless(multiprocessing.Process):
     for each accepted client connection, Acceptor process sends
     accepted client connection to Threadless process over a pipe.
 
+    Where supported, accepted clients are sent in batches (see send_clients)
+    and Threadless receives all pending clients in one wakeup.
+
+    With --threadless-loops, each Acceptor process spawns multiple Threadless
+    processes and dispatches accepted clients among them as per --dispatch-policy.
+    Threadless reports its load back to Acceptor via ThreadlessLoad.
+
+    When --local-executor option is enabled, Acceptor process runs the
+    Threadless event loop itself (without starting a new process) by passing
+    its listening socket.  Client connections are then accepted directly
+    into the event loop.
+
     HttpProtocolHandler implements ThreadlessWork class and hooks into the
     event loop provided by Threadless.
     """
 
     def __init__(
             self,
-            client_queue: connection.Connection,
+            client_queue: Optional[connection.Connection],
             flags: Flags,
             work_klass: Type[ThreadlessWork],
-            event_queue: Optional[EventQueue] = None) -> None:
+            event_queue: Optional[EventQueue] = None,
+            listener: Optional[socket.socket] = None,
+            load: Optional[ThreadlessLoad] = None) -> None:
         super().__init__()
         self.client_queue = client_queue
+        self.listener = listener
+        self.load = load
         self.flags = flags
         self.work_klass = work_klass
         self.event_queue = event_queue
 
         self.works: Dict[int, ThreadlessWork] = {}
+        # Selector registrations of each work, file descriptor => (fileobj, events)
+        self.registrations: Dict[int, Dict[int, Tuple[Union[int, HasFileno], int]]] = {}
+        # Heap of (deadline, work_id, work uid) and currently scheduled deadline of each work
+        self.timers: List[Tuple[float, int, str]] = []
+        self.deadlines: Dict[int, float] = {}
         self.selector: Optional[selectors.DefaultSelector] = None
         self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.client_sock: Optional[socket.socket] = None
+        self.running = False
 
     @contextlib.contextmanager
-    def selected_events(self) -> Generator[Tuple[List[Union[int, HasFileno]],
-                                                 List[Union[int, HasFileno]]],
+    def selected_events(self) -> Generator[Dict[Optional[int],
+                                                Tuple[List[Union[int, HasFileno]],
+                                                      List[Union[int, HasFileno]]]],
                                            None, None]:
-        events: Dict[socket.socket, int] = {}
-        for work in self.works.values():
-            events.update(work.get_events())
+        """Yields ready readables and writables grouped by the work owning them.
+
+        Descriptors registered by Threadless itself are grouped under None."""
         assert self.selector is not None
-        for fd in events:
-            self.selector.register(fd, events[fd])
-        ev = self.selector.select(timeout=1)
-        readables = []
-        writables = []
+        ev = self.selector.select(timeout=self.select_timeout())
+        ready: Dict[Optional[int], Tuple[List[Union[int, HasFileno]],
+                                         List[Union[int, HasFileno]]]] = {}
         for key, mask in ev:
+            if key.data not in ready:
+                ready[key.data] = ([], [])
             if mask & selectors.EVENT_READ:
-                readables.append(key.fileobj)
+                ready[key.data][0].append(key.fileobj)
             if mask & selectors.EVENT_WRITE:
-                writables.append(key.fileobj)
-        yield (readables, writables)
-        for fd in events.keys():
+                ready[key.data][1].append(key.fileobj)
+        yield ready
+
+    def update_registrations(self, work_id: int) -> None:
+        """Brings selector registrations of a work in line with its get_events.
+
+        Registrations persist across iterations.  Selector is only updated
+        for descriptors whose interest has changed since the last update."""
+        assert self.selector is not None
+        previous = self.registrations.get(work_id, {})
+        current: Dict[int, Tuple[Union[int, HasFileno], int]] = {}
+        for fileobj, events in self.works[work_id].get_events().items():
+            fd = fileobj if isinstance(fileobj, int) else fileobj.fileno()
+            current[fd] = (fileobj, events)
+            if fd in previous and previous[fd][0] is fileobj:
+                if previous[fd][1] != events:
+                    self.selector.modify(fileobj, events, work_id)
+                continue
+            key = self.selector.get_map().get(fd)
+            if key is not None:
+                # Stale registration, e.g. descriptor was closed and reused
+                # or connection object was replaced (wrapped) by the work.
+                self.selector.unregister(fd)
+            self.selector.register(fileobj, events, work_id)
+        for fd in previous:
+            if fd not in current:
+                self.unregister(work_id, fd, previous[fd][0])
+        self.registrations[work_id] = current
+
+    def unregister(self, work_id: int, fd: int, fileobj: Union[int, HasFileno]) -> None:
+        """Unregisters fd, unless it has been re-registered for another fileobj since."""
+        assert self.selector is not None
+        key = self.selector.get_map().get(fd)
+        if key is not None and key.data == work_id and key.fileobj is fileobj:
             self.selector.unregister(fd)
 
     async def handle_events(
@@ -167,8 +327,58 @@ class Threadless(multiprocessing.Process):
                 self.cleanup(work_id)
 
     def accept_client(self) -> None:
-        addr = self.client_queue.recv()
-        fileno = recv_handle(self.client_queue)
+        assert self.client_queue is not None
+        if self.client_sock is None:
+            addr = self.client_queue.recv()
+            fileno = recv_handle(self.client_queue)
+            self.received(1)
+            self.create_work(fileno, addr)
+            return
+        # Drain all pending batches of clients
+        while True:
+            clients = recv_clients(self.client_sock)
+            self.received(len(clients))
+            for fileno, addr in clients:
+                self.create_work(fileno, addr)
+            if not self.client_queue.poll():
+                break
+
+    def open_client_queue(self) -> None:
+        """Where supported, clients are received in batches from a socket
+        duplicated from client_queue, see recv_clients."""
+        assert self.client_queue is not None
+        if BATCHED_HANDOFF:
+            self.client_sock = socket.fromfd(
+                self.client_queue.fileno(), socket.AF_UNIX, socket.SOCK_STREAM)
+
+    def close_client_queue(self) -> None:
+        assert self.client_queue is not None
+        if self.client_sock is not None:
+            self.client_sock.close()
+            self.client_sock = None
+        self.client_queue.close()
+
+    def received(self, count: int) -> None:
+        if self.load is not None:
+            self.load.incr_received(count)
+
+    def report_load(self, lag_ms: float) -> None:
+        if self.load is not None:
+            self.load.update(len(self.works), lag_ms)
+
+    def accept_connections(self) -> None:
+        """Accepts pending connections directly from the listening socket."""
+        assert self.listener is not None
+        for _ in range(self.flags.accept_batch_size):
+            try:
+                conn, addr = self.listener.accept()
+            except BlockingIOError:
+                # Backlog drained or another acceptor won the race
+                break
+            # Work owns the file descriptor from now on, see cleanup.
+            self.create_work(conn.detach(), addr)
+
+    def create_work(self, fileno: int, addr: Tuple[str, int]) -> None:
         self.works[fileno] = self.work_klass(
             fileno=fileno,
             addr=addr,
@@ -185,16 +395,55 @@ class Threadless(multiprocessing.Process):
         except ssl.SSLError as e:
             logger.exception('ssl.SSLError', exc_info=e)
             self.cleanup(fileno)
+            return
+        self.update_registrations(fileno)
+        self.schedule(fileno)
+
+    def schedule(self, work_id: int) -> None:
+        """Schedules inactivity check of work at its deadline.
+
+        Deadlines that moved further away are not rescheduled here,
+        instead work is rescheduled once its earlier deadline expires."""
+        now = time.time()
+        deadline = self.works[work_id].deadline()
+        if deadline is None or deadline <= now:
+            deadline = now + MAX_SELECT_TIMEOUT
+        scheduled = self.deadlines.get(work_id)
+        if scheduled is not None and scheduled <= deadline:
+            return
+        self.deadlines[work_id] = deadline
+        heapq.heappush(self.timers, (deadline, work_id, self.works[work_id].uid))
+
+    def select_timeout(self) -> float:
+        if len(self.timers) == 0:
+            return MAX_SELECT_TIMEOUT
+        return max(0.0, min(self.timers[0][0] - time.time(), MAX_SELECT_TIMEOUT))
 
     def cleanup_inactive(self) -> None:
-        inactive_works: List[int] = []
-        for work_id in self.works:
+        """Checks works with expired deadline and shuts down inactive ones."""
+        now = time.time()
+        while len(self.timers) > 0 and self.timers[0][0] <= now:
+            deadline, work_id, uid = heapq.heappop(self.timers)
+            if work_id not in self.works or \
+                    self.works[work_id].uid != uid or \
+                    self.deadlines.get(work_id) != deadline:
+                # Work has finished or was rescheduled earlier
+                continue
+            del self.deadlines[work_id]
             if self.works[work_id].is_inactive():
-                inactive_works.append(work_id)
-        for work_id in inactive_works:
-            self.cleanup(work_id)
+                self.cleanup(work_id)
+            else:
+                # Work may have changed its interest, e.g. started
+                # a new upstream connection attempt
+                self.update_registrations(work_id)
+                self.schedule(work_id)
 
     def cleanup(self, work_id: int) -> None:
+        # Unregister before work closes its descriptors.  Duplicated
+        # descriptors otherwise remain registered with epoll.
+        for fd, (fileobj, _) in self.registrations.pop(work_id, {}).items():
+            self.unregister(work_id, fd, fileobj)
+        self.deadlines.pop(work_id, None)
         # TODO: HttpProtocolHandler.shutdown can call flush which may block
         self.works[work_id].shutdown()
         del self.works[work_id]
@@ -202,41 +451,67 @@ class Threadless(multiprocessing.Process):
 
     def run_once(self) -> None:
         assert self.loop is not None
-        with self.selected_events() as (readables, writables):
-            if len(readables) == 0 and len(writables) == 0:
+        with self.selected_events() as ready:
+            if len(ready) == 0:
                 # Remove and shutdown inactive connections
                 self.cleanup_inactive()
+                self.report_load(0)
+                Stats.report(self.flags.stats_interval)
                 return
+        wakeup = time.time()
         # Note that selector from now on is idle,
         # until all the logic below completes.
         #
-        # Invoke Threadless.handle_events
-        # TODO: Only send readable / writables that client originally
-        # registered.
+        # Invoke Threadless.handle_events only for works owning
+        # a ready descriptor, with just their ready descriptors.
         tasks = {}
-        for fileno in self.works:
-            tasks[fileno] = self.loop.create_task(
-                self.handle_events(fileno, readables, writables))
+        for work_id, (work_readables, work_writables) in ready.items():
+            if work_id is None or work_id not in self.works:
+                continue
+            tasks[work_id] = self.loop.create_task(
+                self.handle_events(work_id, work_readables, work_writables))
+        readables = ready[None][0] if None in ready else []
         # Accepted client connection from Acceptor
-        if self.client_queue in readables:
+        if self.client_queue is not None and self.client_queue in readables:
             self.accept_client()
+        # Pending client connections on our own listening socket
+        if self.listener is not None and self.listener in readables:
+            self.accept_connections()
         # Wait for Threadless.handle_events to complete
         self.loop.run_until_complete(self.wait_for_tasks(tasks))
+        # Update interest and deadline of works which survived handle_events
+        for work_id in tasks:
+            if work_id in self.works:
+                self.update_registrations(work_id)
+                self.schedule(work_id)
         # Remove and shutdown inactive connections
         self.cleanup_inactive()
+        self.report_load((time.time() - wakeup) * 1000)
+        Stats.report(self.flags.stats_interval)
 
     def run(self) -> None:
+        # Works of this loop read one at a time, sharing receive buffers
+        BufferPool.install(BufferPool())
         try:
             self.selector = selectors.DefaultSelector()
-            self.selector.register(self.client_queue, selectors.EVENT_READ)
+            if self.client_queue is not None:
+                self.selector.register(self.client_queue, selectors.EVENT_READ)
+                self.open_client_queue()
+            if self.listener is not None:
+                self.selector.register(self.listener, selectors.EVENT_READ)
             self.loop = asyncio.get_event_loop()
-            while True:
+            self.running = True
+            while self.running:
                 self.run_once()
         except KeyboardInterrupt:
             pass
         finally:
             assert self.selector is not None
-            self.selector.unregister(self.client_queue)
-            self.client_queue.close()
+            if self.client_queue is not None:
+                self.selector.unregister(self.client_queue)
+                self.close_client_queue()
+            if self.listener is not None:
+                # Listening socket is owned and closed by Acceptor
+                self.selector.unregister(self.listener)
             assert self.loop is not None
             self.loop.close()
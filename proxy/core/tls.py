@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡ Fast, Lightweight, Programmable Proxy Server in a single Python file.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import os
+import ssl
+import time
+import socket
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from .per_process import PerProcess
+from .stats import Stats
+from ..common.flags import Flags
+
+logger = logging.getLogger(__name__)
+
+
+def build_server_context(certfile: str, keyfile: str) -> ssl.SSLContext:
+    ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    ctx.options |= ssl.OP_NO_SSLv2 | ssl.OP_NO_SSLv3 | ssl.OP_NO_TLSv1 | ssl.OP_NO_TLSv1_1
+    # Issue session tickets, see ServerContextCache
+    ctx.options &= ~ssl.OP_NO_TICKET
+    ctx.verify_mode = ssl.CERT_NONE
+    ctx.load_cert_chain(certfile=certfile, keyfile=keyfile)
+    return ctx
+
+
+def build_client_context() -> ssl.SSLContext:
+    ctx = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+    ctx.options |= ssl.OP_NO_SSLv2 | ssl.OP_NO_SSLv3 | ssl.OP_NO_TLSv1 | ssl.OP_NO_TLSv1_1
+    return ctx
+
+
+class ServerContextCache(PerProcess):
+    """Per-process server side SSLContexts, keyed by certificate and key file.
+
+    Building a context reads and parses the certificate chain and private
+    key from disk.  Contexts are built once and reused for every handshake,
+    until modification time of either file changes.  Reused contexts also
+    let returning clients resume sessions, either using session tickets
+    encrypted with keys of the context or from session cache of the context.
+    Contexts built before worker processes are forked share ticket keys
+    across workers."""
+
+    def __init__(self, stats: Optional[Stats] = None) -> None:
+        self.stats = stats if stats is not None else Stats.get('tls')
+        # Accessed from client threads unless threadless
+        self.lock = threading.Lock()
+        # (certfile, keyfile) => ((certfile mtime, keyfile mtime), context)
+        self.contexts: Dict[Tuple[str, str], Tuple[Tuple[int, int], ssl.SSLContext]] = {}
+
+    def context(self, certfile: str, keyfile: str) -> ssl.SSLContext:
+        """Users must handle OSError and ssl.SSLError exceptions."""
+        mtimes = (os.stat(certfile).st_mtime_ns, os.stat(keyfile).st_mtime_ns)
+        with self.lock:
+            cached = self.contexts.get((certfile, keyfile))
+            if cached is not None and cached[0] == mtimes:
+                return cached[1]
+            ctx = build_server_context(certfile, keyfile)
+            self.contexts[(certfile, keyfile)] = (mtimes, ctx)
+        self.stats.incr('context_loaded')
+        logger.debug('Loaded certificate %s and key %s' % (certfile, keyfile))
+        return ctx
+
+    def handshake_completed(self, conn: ssl.SSLSocket) -> None:
+        self.stats.incr('resumed' if conn.session_reused else 'full_handshake')
+
+
+# (upstream host, upstream port)
+SessionKey = Tuple[str, int]
+
+
+class ClientSessionCache(PerProcess):
+    """Per-process client side SSLContext and TLS sessions for upstream servers.
+
+    Building a context loads trusted CA certificates from disk, hence one
+    context is built and used for every upstream handshake.  Sessions
+    negotiated with an upstream are kept, keyed by host and port, for at
+    most ttl seconds or their lifetime announced by upstream, whichever is
+    shorter.  At most max_sessions least recently used are kept.  Sessions
+    are offered on next connection to same upstream, which then resumes
+    them using an abbreviated handshake if it still can."""
+
+    def __init__(self, max_sessions: int, ttl: float, stats: Optional[Stats] = None) -> None:
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.stats = stats if stats is not None else Stats.get('upstream-tls')
+        # Accessed from client threads unless threadless
+        self.lock = threading.Lock()
+        self.context: Optional[ssl.SSLContext] = None
+        # SessionKey => (expires at, session)
+        self.sessions: 'OrderedDict[SessionKey, Tuple[float, ssl.SSLSession]]' = OrderedDict()
+
+    @classmethod
+    def from_flags(cls, flags: Optional[Flags]) -> 'ClientSessionCache':
+        assert flags is not None
+        return cls(
+            flags.upstream_tls_session_cache_size,
+            flags.upstream_tls_session_ttl)
+
+    def wrap(self, conn: socket.socket, key: SessionKey) -> ssl.SSLSocket:
+        """Wraps upstream connection, handshake is left to the caller.
+
+        Users must handle OSError and ssl.SSLError exceptions."""
+        with self.lock:
+            if self.context is None:
+                self.context = build_client_context()
+            ctx = self.context
+        return ctx.wrap_socket(
+            conn,
+            server_hostname=key[0],
+            do_handshake_on_connect=False,
+            session=self.session(key))
+
+    def session(self, key: SessionKey) -> Optional[ssl.SSLSession]:
+        with self.lock:
+            cached = self.sessions.get(key)
+            if cached is not None and cached[0] <= time.time():
+                del self.sessions[key]
+                self.stats.incr('session_expired')
+                cached = None
+            if cached is None:
+                self.stats.incr('session_miss')
+                return None
+            self.sessions.move_to_end(key)
+        self.stats.incr('session_hit')
+        return cached[1]
+
+    def handshake_completed(self, conn: ssl.SSLSocket, key: SessionKey) -> None:
+        resumed = conn.session_reused is True
+        self.stats.incr('resumed' if resumed else 'full_handshake')
+        total = self.stats.counters.get('resumed', 0) + self.stats.counters.get('full_handshake', 0)
+        self.stats.gauge('resumed_ratio', round(self.stats.counters.get('resumed', 0) / total, 3))
+        self.store(conn, key)
+
+    def store(self, conn: ssl.SSLSocket, key: SessionKey) -> None:
+        """Keeps resumable session of upstream connection.
+
+        TLS 1.3 upstreams send session tickets after handshake, users must
+        also call store before closing the connection."""
+        if self.max_sessions <= 0 or self.ttl <= 0:
+            return
+        try:
+            session = conn.session
+            tls13 = conn.version() == 'TLSv1.3'
+        except (OSError, ValueError):
+            return
+        if session is None or not (session.has_ticket or (not tls13 and session.id)):
+            return
+        expires = min(time.time() + self.ttl, session.time + session.timeout)
+        with self.lock:
+            self.sessions[key] = (expires, session)
+            self.sessions.move_to_end(key)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+                self.stats.incr('evicted')
+            self.stats.gauge('cached', len(self.sessions))
@@ -25,6 +25,7 @@ from ..common.types import HasFileno
 from ..core.threadless import ThreadlessWork
 from ..core.event import EventQueue
 from ..core.connection import TcpClientConnection
+from ..core.tls import ServerContextCache
 
 logger = logging.getLogger(__name__)
 
@@ -51,6 +52,11 @@ class HttpProtocolHandlerPlugin(ABC):
        Add your logic within `on_client_connection_close` for any per connection teardown.
     """
 
+    # Set to True when on_client_data and on_response_chunk leave
+    # CONNECT tunnel data untouched.  Tunnels are relayed within kernel
+    # only if all loaded plugins are passthrough.
+    TUNNEL_PASSTHROUGH = False
+
     def __init__(
             self,
             config: Flags,
@@ -75,6 +81,22 @@ class HttpProtocolHandlerPlugin(ABC):
             self) -> Tuple[List[socket.socket], List[socket.socket]]:
         return [], []  # pragma: no cover
 
+    def deadline(self) -> Optional[float]:
+        """Return time at which is_inactive must be checked, e.g. an upstream
+        connect timeout.  Queried after every event handled."""
+        return None
+
+    def is_inactive(self) -> bool:
+        """Return True to teardown client connection.  Plugin may queue
+        a final response for client before returning True."""
+        return False
+
+    def pause_client_reads(self) -> bool:
+        """Return True to stop reading from client for now, e.g. while data
+        received from client is still buffered above high watermark, or
+        while plugin itself relays data from client."""
+        return False
+
     @abstractmethod
     def write_to_descriptors(self, w: List[Union[int, HasFileno]]) -> bool:
         pass  # pragma: no cover
@@ -125,6 +147,8 @@ class HttpProtocolHandler(ThreadlessWork):
             self.fromfd(self.fileno), self.addr
         )
         self.plugins: Dict[str, HttpProtocolHandlerPlugin] = {}
+        # Client queued_bytes already passed to on_response_chunk
+        self.response_chunk_offset: int = 0
 
     def initialize(self) -> None:
         """Optionally upgrades connection to HTTPS, set conn in non-blocking mode and initializes plugins."""
@@ -132,6 +156,7 @@ class HttpProtocolHandler(ThreadlessWork):
         conn.setblocking(False)
         if self.flags.encryption_enabled():
             self.client = TcpClientConnection(conn=conn, addr=self.addr)
+        self.client.set_watermarks(self.flags.high_watermark, self.flags.low_watermark)
         if b'HttpProtocolHandlerPlugin' in self.flags.plugins:
             for klass in self.flags.plugins[b'HttpProtocolHandlerPlugin']:
                 instance = klass(
@@ -143,17 +168,28 @@ class HttpProtocolHandler(ThreadlessWork):
         logger.debug('Handling connection %r' % self.client.connection)
 
     def is_inactive(self) -> bool:
+        if any(plugin.is_inactive() for plugin in self.plugins.values()):
+            return True
         if not self.client.has_buffer() and \
                 self.connection_inactive_for() > self.flags.timeout:
             return True
         return False
 
+    def deadline(self) -> Optional[float]:
+        deadline = self.last_activity + self.flags.timeout
+        for plugin in self.plugins.values():
+            plugin_deadline = plugin.deadline()
+            if plugin_deadline is not None:
+                deadline = min(deadline, plugin_deadline)
+        return deadline
+
     def get_events(self) -> Dict[socket.socket, int]:
-        events: Dict[socket.socket, int] = {
-            self.client.connection: selectors.EVENT_READ
-        }
+        events: Dict[socket.socket, int] = {}
+        if not self.client_reads_paused():
+            events[self.client.connection] = selectors.EVENT_READ
         if self.client.has_buffer():
-            events[self.client.connection] |= selectors.EVENT_WRITE
+            events[self.client.connection] = events.get(
+                self.client.connection, 0) | selectors.EVENT_WRITE
 
         # HttpProtocolHandlerPlugin.get_descriptors
         for plugin in self.plugins.values():
@@ -171,11 +207,17 @@ class HttpProtocolHandler(ThreadlessWork):
 
         return events
 
+    def client_reads_paused(self) -> bool:
+        return any(plugin.pause_client_reads() for plugin in self.plugins.values())
+
     def handle_events(
             self,
             readables: List[Union[int, HasFileno]],
             writables: List[Union[int, HasFileno]]) -> bool:
         """Returns True if proxy must teardown."""
+        if self.client.connection in readables or self.client.connection in writables:
+            self.last_activity = time.time()
+
         # Flush buffer for ready to write sockets
         teardown = self.handle_writables(writables)
         if teardown:
@@ -241,15 +283,11 @@ class HttpProtocolHandler(ThreadlessWork):
         Shutdown and closes client connection upon error.
         """
         if self.flags.encryption_enabled():
-            ctx = ssl.create_default_context(
-                ssl.Purpose.CLIENT_AUTH)
-            ctx.options |= ssl.OP_NO_SSLv2 | ssl.OP_NO_SSLv3 | ssl.OP_NO_TLSv1 | ssl.OP_NO_TLSv1_1
-            ctx.verify_mode = ssl.CERT_NONE
             assert self.flags.keyfile and self.flags.certfile
-            ctx.load_cert_chain(
-                certfile=self.flags.certfile,
-                keyfile=self.flags.keyfile)
+            contexts = ServerContextCache.get()
+            ctx = contexts.context(self.flags.certfile, self.flags.keyfile)
             conn = ctx.wrap_socket(conn, server_side=True)
+            contexts.handshake_completed(conn)
         return conn
 
     def connection_inactive_for(self) -> float:
@@ -276,14 +314,18 @@ class HttpProtocolHandler(ThreadlessWork):
     def handle_writables(self, writables: List[Union[int, HasFileno]]) -> bool:
         if self.client.buffer_size() > 0 and self.client.connection in writables:
             logger.debug('Client is ready for writes, flushing buffer')
-            self.last_activity = time.time()
 
-            # Invoke plugin.on_response_chunk
-            chunk = self.client.buffer
-            for plugin in self.plugins.values():
-                chunk = plugin.on_response_chunk(chunk)
-                if chunk is None:
-                    break
+            # Invoke plugin.on_response_chunk, only with data queued since
+            # last invocation.  Data left after a partial write has already
+            # been seen by plugins.
+            size = self.client.queued_bytes - self.response_chunk_offset
+            if size > 0:
+                self.response_chunk_offset = self.client.queued_bytes
+                chunk = self.client.tail(size)
+                for plugin in self.plugins.values():
+                    chunk = plugin.on_response_chunk(chunk)
+                    if chunk is None:
+                        break
 
             try:
                 self.client.flush()
@@ -297,9 +339,8 @@ class HttpProtocolHandler(ThreadlessWork):
         return False
 
     def handle_readables(self, readables: List[Union[int, HasFileno]]) -> bool:
-        if self.client.connection in readables:
+        if self.client.connection in readables and not self.client_reads_paused():
             logger.debug('Client is ready for reads, reading')
-            self.last_activity = time.time()
             try:
                 client_data = self.client.recv(self.flags.client_recvbuf_size)
             except ssl.SSLWantReadError:    # Try again later
@@ -370,7 +411,13 @@ class HttpProtocolHandler(ThreadlessWork):
         events = self.get_events()
         for fd in events:
             self.selector.register(fd, events[fd])
-        ev = self.selector.select(timeout=1)
+        # Wake up by deadline of plugins, e.g. upstream connection attempt delay.
+        # Deadlines already passed, e.g. idle timeout of a client not reading
+        # its buffered response, are rechecked after default timeout instead.
+        deadline = self.deadline()
+        now = time.time()
+        timeout = 1.0 if deadline is None or deadline <= now else min(1.0, deadline - now)
+        ev = self.selector.select(timeout=timeout)
         readables = []
         writables = []
         for key, mask in ev:
@@ -7,16 +7,14 @@
     :copyright: (c) 2013-present by Abhinav Singh and contributors.
     :license: BSD, see LICENSE for more details.
 """
-import threading
-import subprocess
-import os
 import ssl
 import socket
+import selectors
 import time
 import errno
 import logging
 from abc import ABC, abstractmethod
-from typing import Optional, List, Union, Dict, cast, Any, Tuple
+from typing import NamedTuple, Optional, List, Union, Dict, Any, Tuple
 
 from .handler import HttpProtocolHandlerPlugin
 from .exception import HttpProtocolException, ProxyConnectionFailed, ProxyAuthenticationFailed
@@ -29,11 +27,27 @@ from ..common.flags import Flags
 from ..common.constants import PROXY_AGENT_HEADER_VALUE
 from ..common.utils import build_http_response, text_
 
+from ..core.bypass import InterceptionBypass
 from ..core.connection import TcpClientConnection, TcpServerConnection, TcpConnectionUninitializedException
+from ..core.connection_pool import ConnectionPool, PoolKey
+from ..core.pki import CertificateAuthority
+from ..core.resolver import Resolver
+from ..core.splice import SplicePipe, splice_supported
+from ..core.stats import Stats
+from ..core.tls import ClientSessionCache, SessionKey
 
 logger = logging.getLogger(__name__)
 
 
+TlsInterceptionStates = NamedTuple('TlsInterceptionStates', [
+    ('SERVER_HANDSHAKE', int),
+    ('CLIENT_FLUSH', int),
+    ('CLIENT_HANDSHAKE', int),
+    ('COMPLETE', int),
+])
+tlsInterceptionStates = TlsInterceptionStates(1, 2, 3, 4)
+
+
 class HttpProxyBasePlugin(ABC):
     """Base HttpProxyPlugin Plugin class.
 
@@ -96,17 +110,22 @@ class HttpProxyBasePlugin(ABC):
 
 
 class HttpProxyPlugin(HttpProtocolHandlerPlugin):
-    """HttpProtocolHandler plugin which implements HttpProxy specifications."""
+    """HttpProtocolHandler plugin which implements HttpProxy specifications.
+
+    CONNECT tunnels are relayed within kernel using splice(2) once tunnel
+    is established, unless a plugin needs to see tunnel data.
+
+    With TLS interception, handshakes with upstream and then with client
+    are performed on non-blocking connections as they become ready,
+    see intercept."""
+
+    TUNNEL_PASSTHROUGH = True
 
     PROXY_TUNNEL_ESTABLISHED_RESPONSE_PKT = build_http_response(
         httpStatusCodes.OK,
         reason=b'Connection established'
     )
 
-    # Used to synchronize with other HttpProxyPlugin instances while
-    # generating certificates
-    lock = threading.Lock()
-
     def __init__(
             self,
             *args: Any, **kwargs: Any) -> None:
@@ -116,6 +135,25 @@ class HttpProxyPlugin(HttpProtocolHandlerPlugin):
         self.response: HttpParser = HttpParser(httpParserTypes.RESPONSE_PARSER)
         self.pipeline_request: Optional[HttpParser] = None
         self.pipeline_response: Optional[HttpParser] = None
+        # Server connection is released into pool for reuse only if all
+        # requests dispatched to it have completed and were keep-alive.
+        self.pool = ConnectionPool.get(self.config)
+        self.resolver = Resolver.get(self.config)
+        self.requests_dispatched: int = 0
+        self.responses_completed: int = 0
+        self.keep_alive: bool = True
+        # Time by which non-blocking upstream connection must complete
+        self.connect_deadline: Optional[float] = None
+        # Client to server and server to client relays when tunnel is spliced
+        self.upstream: Optional[SplicePipe] = None
+        self.downstream: Optional[SplicePipe] = None
+        # TLS interception state and selector event its handshake waits for
+        self.interception: Optional[int] = None
+        # Whether CONNECT tunnel is intercepted, decided once request completes
+        self.intercept_tls: bool = False
+        self.handshake_events: int = 0
+
+        self.stats = Stats.get('http-proxy')
 
         self.plugins: Dict[str, HttpProxyBasePlugin] = {}
         if b'HttpProxyBasePlugin' in self.config.plugins:
@@ -128,16 +166,125 @@ class HttpProxyPlugin(HttpProtocolHandlerPlugin):
         if not self.request.has_upstream_server():
             return [], []
 
+        if self.server and not self.server.closed and not self.server.connected:
+            if self.server.lookup is not None:
+                # Upstream connection is initiated once resolved
+                assert self.server.lookup.reader is not None
+                return [self.server.lookup.reader], []
+            # Upstream connection completes once an attempt is writable
+            return [], list(self.server.attempts)
+
+        if self.intercepting():
+            if self.interception == tlsInterceptionStates.CLIENT_FLUSH:
+                # Client connection is written by handler until flushed
+                return [], []
+            if self.handshake_events == selectors.EVENT_READ:
+                return [self.handshake_connection()], []
+            return [], [self.handshake_connection()]
+
+        if self.upstream is None and self.can_splice():
+            self.start_splice()
+        if self.upstream and self.downstream:
+            return [relay.src for relay in (self.upstream, self.downstream) if relay.wants_read()], \
+                [relay.dst for relay in (self.upstream, self.downstream) if relay.wants_write()]
+
         r: List[socket.socket] = []
         w: List[socket.socket] = []
-        if self.server and not self.server.closed and self.server.connection:
+        # Stop reading from server while client is slow to consume
+        if self.server and not self.server.closed and \
+                not self.client.paused and self.server.connection:
             r.append(self.server.connection)
         if self.server and not self.server.closed and \
                 self.server.has_buffer() and self.server.connection:
             w.append(self.server.connection)
         return r, w
 
+    def pause_client_reads(self) -> bool:
+        if self.upstream is not None or self.intercepting():
+            return True
+        return self.server is not None and not self.server.closed and self.server.paused
+
+    def can_splice(self) -> bool:
+        """Tunnel can be spliced once established, when it carries data
+        as-is between plain sockets and nothing is buffered in user space."""
+        if self.config.disable_splice or not splice_supported() or \
+                self.request.method != httpMethods.CONNECT or \
+                self.request.state != httpParserStates.COMPLETE or \
+                self.intercept_tls or len(self.plugins) > 0:
+            return False
+        if self.server is None or self.server.closed or not self.server.connected or \
+                self.server.has_buffer() or self.client.has_buffer():
+            return False
+        for klass in self.config.plugins.get(b'HttpProtocolHandlerPlugin', []):
+            if not getattr(klass, 'TUNNEL_PASSTHROUGH', False):
+                return False
+        return all(
+            isinstance(conn, socket.socket) and not isinstance(conn, ssl.SSLSocket)
+            for conn in (self.client.connection, self.server.connection))
+
+    def start_splice(self) -> None:
+        assert self.server is not None
+        self.upstream = SplicePipe(self.client.connection, self.server.connection)
+        self.downstream = SplicePipe(self.server.connection, self.client.connection)
+        self.stats.incr('spliced')
+        logger.debug('Splicing tunnel to %s:%s' % self.server.addr)
+
+    def splice(self, r: List[Union[int, HasFileno]], w: List[Union[int, HasFileno]]) -> bool:
+        """Relays ready tunnel data within kernel.  Returns True once
+        either side has closed and its remaining data has been relayed."""
+        assert self.upstream and self.downstream
+        for relay in (self.upstream, self.downstream):
+            try:
+                if relay.src in r:
+                    moved = relay.fill()
+                    if relay is self.downstream:
+                        self.response.total_size += moved
+                # Optimistically drain freshly filled pipe
+                if relay.dst in w or relay.src in r:
+                    relay.drain()
+            except OSError as e:
+                if e.errno in (errno.ECONNRESET, errno.EPIPE):
+                    logger.warning('Connection reset while splicing: %r' % e)
+                else:
+                    logger.exception('Exception while splicing tunnel', exc_info=e)
+                return True
+        return self.upstream.done() or self.downstream.done()
+
+    def deadline(self) -> Optional[float]:
+        if self.connect_deadline is not None and self.server and \
+                not self.server.connected and self.server.next_attempt_at is not None:
+            return min(self.connect_deadline, self.server.next_attempt_at)
+        return self.connect_deadline
+
+    def is_inactive(self) -> bool:
+        if self.connect_deadline is None:
+            return False
+        if time.time() >= self.connect_deadline:
+            self.connect_deadline = None
+            return self.upstream_connection_failed('Connect timeout')
+        assert self.server is not None
+        if self.server.closed or self.server.connected:
+            return False
+        try:
+            # Race next resolved address once previous attempts are slow
+            self.server.start_due_attempt()
+        except OSError as e:
+            return self.upstream_connection_failed(repr(e))
+        if self.server.connected:
+            return self.upstream_connected()
+        return False
+
     def write_to_descriptors(self, w: List[Union[int, HasFileno]]) -> bool:
+        if self.upstream is not None:
+            return self.splice([], w)
+        if self.server and not self.server.closed and not self.server.connected:
+            if self.server.lookup is None and any(conn in w for conn in self.server.attempts):
+                return self.finish_connect_upstream(w)
+            return False
+        if self.intercepting():
+            if self.handshake_connection() in w:
+                return self.intercept()
+            return False
         if self.request.has_upstream_server() and \
                 self.server and not self.server.closed and \
                 self.server.has_buffer() and \
@@ -155,6 +302,16 @@ class HttpProxyPlugin(HttpProtocolHandlerPlugin):
         return False
 
     def read_from_descriptors(self, r: List[Union[int, HasFileno]]) -> bool:
+        if self.upstream is not None:
+            return self.splice(r, [])
+        if self.server and not self.server.closed and not self.server.connected:
+            if self.server.lookup is not None and self.server.lookup.reader in r:
+                return self.finish_resolve_upstream()
+            return False
+        if self.intercepting():
+            if self.handshake_connection() in r:
+                return self.intercept()
+            return False
         if self.request.has_upstream_server(
         ) and self.server and not self.server.closed and self.server.connection in r:
             logger.debug('Server is ready for reads, reading...')
@@ -193,9 +350,12 @@ class HttpProxyPlugin(HttpProtocolHandlerPlugin):
                             httpParserTypes.RESPONSE_PARSER)
                     self.pipeline_response.parse(raw)
                     if self.pipeline_response.state == httpParserStates.COMPLETE:
+                        self.response_completed(self.pipeline_response)
                         self.pipeline_response = None
                 else:
                     self.response.parse(raw)
+                    if self.response.state == httpParserStates.COMPLETE:
+                        self.response_completed(self.response)
             else:
                 self.response.total_size += len(raw)
             # queue raw data for client
@@ -238,12 +398,37 @@ class HttpProxyPlugin(HttpProtocolHandlerPlugin):
         if self.server is None:
             return
 
+        for relay in (self.upstream, self.downstream):
+            if relay is not None:
+                relay.close()
+        if not self.server.connected:
+            if self.server.lookup is not None:
+                self.resolver.release(self.server.lookup)
+            self.server.close_attempts()
+
+        # Peak data buffered for this connection, bounded by watermarks
+        self.stats.observe(
+            'peak_buffer_bytes',
+            self.client.peak_buffer_size + self.server.peak_buffer_size)
+        pauses = self.client.pauses + self.server.pauses
+        if pauses > 0:
+            self.stats.incr('watermark_paused', pauses)
+
         # Note that, server instance was initialized
         # but not necessarily the connection object exists.
         # Invoke plugin.on_upstream_connection_close
         for plugin in self.plugins.values():
             plugin.on_upstream_connection_close()
 
+        if self.interception == tlsInterceptionStates.COMPLETE:
+            # TLS 1.3 upstreams send session tickets after handshake
+            assert isinstance(self.server.connection, ssl.SSLSocket)
+            ClientSessionCache.get(self.config).store(self.server.connection, self.session_key())
+
+        if self.is_reusable() and self.pool.release(self.pool_key(), self.server.connection):
+            logger.debug('Released server connection into pool')
+            return
+
         try:
             try:
                 self.server.connection.shutdown(socket.SHUT_WR)
@@ -277,7 +462,7 @@ class HttpProxyPlugin(HttpProtocolHandlerPlugin):
         if self.server and not self.server.closed:
             if self.request.state == httpParserStates.COMPLETE and (
                     self.request.method != httpMethods.CONNECT or
-                    self.config.tls_interception_enabled()):
+                    self.intercept_tls):
                 if self.pipeline_request is None:
                     self.pipeline_request = HttpParser(
                         httpParserTypes.REQUEST_PARSER)
@@ -290,7 +475,8 @@ class HttpProxyPlugin(HttpProtocolHandlerPlugin):
                             return None
                         self.pipeline_request = r
                     assert self.pipeline_request is not None
-                    self.server.queue(self.pipeline_request.build())
+                    self.dispatch_request(
+                        self.pipeline_request, self.pipeline_request.build())
                     self.pipeline_request = None
             else:
                 self.server.queue(raw)
@@ -298,67 +484,69 @@ class HttpProxyPlugin(HttpProtocolHandlerPlugin):
         else:
             return raw
 
-    @staticmethod
-    def generated_cert_file_path(ca_cert_dir: str, host: str) -> str:
-        return os.path.join(ca_cert_dir, '%s.pem' % host)
-
-    def generate_upstream_certificate(
-            self, _certificate: Optional[Dict[str, Any]]) -> str:
-        if not (self.config.ca_cert_dir and self.config.ca_signing_key_file and
-                self.config.ca_cert_file and self.config.ca_key_file):
-            raise HttpProtocolException(
-                f'For certificate generation all the following flags are mandatory: '
-                f'--ca-cert-file:{ self.config.ca_cert_file }, '
-                f'--ca-key-file:{ self.config.ca_key_file }, '
-                f'--ca-signing-key-file:{ self.config.ca_signing_key_file }')
-        cert_file_path = HttpProxyPlugin.generated_cert_file_path(
-            self.config.ca_cert_dir, text_(self.request.host))
-        with self.lock:
-            if not os.path.isfile(cert_file_path):
-                logger.debug('Generating certificates %s', cert_file_path)
-                # TODO: Parse subject from certificate
-                # Currently we only set CN= field for generated certificates.
-                gen_cert = subprocess.Popen(
-                    ['openssl', 'req', '-new', '-key', self.config.ca_signing_key_file, '-subj',
-                     f'/C=/ST=/L=/O=/OU=/CN={ text_(self.request.host) }'],
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE)
-                sign_cert = subprocess.Popen(
-                    ['openssl', 'x509', '-req', '-days', '365', '-CA', self.config.ca_cert_file, '-CAkey',
-                     self.config.ca_key_file, '-set_serial', str(int(time.time())), '-out', cert_file_path],
-                    stdin=gen_cert.stdout,
-                    stderr=subprocess.PIPE)
-                # TODO: Ensure sign_cert success.
-                sign_cert.communicate(timeout=10)
-        return cert_file_path
-
     def wrap_server(self) -> None:
         assert self.server is not None
         assert isinstance(self.server.connection, socket.socket)
-        ctx = ssl.create_default_context(
-            ssl.Purpose.SERVER_AUTH)
-        ctx.options |= ssl.OP_NO_SSLv2 | ssl.OP_NO_SSLv3 | ssl.OP_NO_TLSv1 | ssl.OP_NO_TLSv1_1
-        self.server.connection.setblocking(True)
-        self.server._conn = ctx.wrap_socket(
-            self.server.connection,
-            server_hostname=text_(self.request.host))
-        self.server.connection.setblocking(False)
+        self.server._conn = ClientSessionCache.get(self.config).wrap(
+            self.server.connection, self.session_key())
+        self.interception = tlsInterceptionStates.SERVER_HANDSHAKE
 
     def wrap_client(self) -> None:
-        assert self.server is not None
-        assert isinstance(self.server.connection, ssl.SSLSocket)
-        generated_cert = self.generate_upstream_certificate(
-            cast(Dict[str, Any], self.server.connection.getpeercert()))
-        self.client.connection.setblocking(True)
-        self.client.flush()
-        self.client._conn = ssl.wrap_socket(
+        ctx = CertificateAuthority.get(self.config).context(text_(self.request.host))
+        self.client._conn = ctx.wrap_socket(
             self.client.connection,
             server_side=True,
-            keyfile=self.config.ca_signing_key_file,
-            certfile=generated_cert)
-        self.client.connection.setblocking(False)
+            do_handshake_on_connect=False)
+        self.interception = tlsInterceptionStates.CLIENT_HANDSHAKE
         logger.debug(
-            'TLS interception using %s', generated_cert)
+            'TLS interception of %s', text_(self.request.host))
+
+    def intercepting(self) -> bool:
+        return self.interception is not None and \
+            self.interception != tlsInterceptionStates.COMPLETE
+
+    def handshake_connection(self) -> Union[ssl.SSLSocket, socket.socket]:
+        """Connection whose readiness advances TLS interception."""
+        assert self.server is not None
+        if self.interception == tlsInterceptionStates.SERVER_HANDSHAKE:
+            return self.server.connection
+        return self.client.connection
+
+    def intercept(self) -> bool:
+        """Advances TLS interception without blocking.  Handshake with upstream
+        completes first.  Handshake with client starts once tunnel established
+        response has been flushed to client, using a certificate generated
+        for upstream.  Client reads are paused until both have completed.
+
+        Returns True if client connection must be teardown."""
+        assert self.server is not None
+        try:
+            if self.interception == tlsInterceptionStates.SERVER_HANDSHAKE:
+                self.handshake_events = self.server.handshake()
+                if self.handshake_events:
+                    return False
+                assert isinstance(self.server.connection, ssl.SSLSocket)
+                ClientSessionCache.get(self.config).handshake_completed(
+                    self.server.connection, self.session_key())
+                self.interception = tlsInterceptionStates.CLIENT_FLUSH
+            if self.interception == tlsInterceptionStates.CLIENT_FLUSH:
+                if self.client.has_buffer():
+                    return False
+                self.wrap_client()
+            self.handshake_events = self.client.handshake()
+            if self.handshake_events:
+                return False
+        except OSError as e:    # ssl.SSLError, BrokenPipeError
+            logger.error(
+                '%r during TLS interception handshakes for %s:%s' %
+                (e, text_(self.request.host), self.request.port))
+            return True
+        self.interception = tlsInterceptionStates.COMPLETE
+        # Update all plugin connection reference
+        for plugin in self.plugins.values():
+            plugin.client._conn = self.client.connection
+        logger.debug('Updated client conn to %s', self.client.connection)
+        return False
 
     def on_request_complete(self) -> Union[socket.socket, bool]:
         if not self.request.has_upstream_server():
@@ -388,28 +576,12 @@ class HttpProxyPlugin(HttpProtocolHandlerPlugin):
                 return False
 
         if self.request.method == httpMethods.CONNECT:
-            self.client.queue(
-                HttpProxyPlugin.PROXY_TUNNEL_ESTABLISHED_RESPONSE_PKT)
-            # If interception is enabled
-            if self.config.tls_interception_enabled():
-                # Perform SSL/TLS handshake with upstream
-                self.wrap_server()
-                # Generate certificate and perform handshake with client
-                try:
-                    # wrap_client also flushes client data before wrapping
-                    # sending to client can raise, handle expected exceptions
-                    self.wrap_client()
-                except OSError:
-                    logger.error('OSError when wrapping client')
-                    return True
-                except BrokenPipeError:
-                    logger.error(
-                        'BrokenPipeError when wrapping client')
-                    return True
-                # Update all plugin connection reference
-                for plugin in self.plugins.values():
-                    plugin.client._conn = self.client.connection
-                return self.client.connection
+            self.intercept_tls = self.config.tls_interception_enabled() and \
+                not self.interception_bypassed()
+            if self.server and not self.server.connected:
+                # Tunnel is established once upstream connection completes
+                return False
+            return self.establish_tunnel()
         elif self.server:
             # - proxy-connection header is a mistake, it doesn't seem to be
             #   officially documented in any specification, drop it.
@@ -425,12 +597,66 @@ class HttpProxyPlugin(HttpProtocolHandlerPlugin):
             # first intercepting proxy.
             self.request.add_headers(
                 [(b'Via', b'1.1 %s' % PROXY_AGENT_HEADER_VALUE)])
-            # Disable args.disable_headers before dispatching to upstream
-            self.server.queue(
-                self.request.build(
-                    disable_headers=self.config.disable_headers))
+            # Disable args.disable_headers before dispatching to upstream.
+            # Queued request is flushed once upstream connection completes.
+            self.dispatch_request(
+                self.request,
+                self.request.build(disable_headers=self.config.disable_headers))
+        return False
+
+    def establish_tunnel(self) -> bool:
+        """Returns True if client connection must be teardown."""
+        self.client.queue(
+            HttpProxyPlugin.PROXY_TUNNEL_ESTABLISHED_RESPONSE_PKT)
+        # If interception is enabled
+        if self.intercept_tls and self.interception_bypassed():
+            self.intercept_tls = False
+        if self.intercept_tls:
+            # Perform SSL/TLS handshakes with upstream and then client
+            self.wrap_server()
+            return self.intercept()
         return False
 
+    def interception_bypassed(self) -> bool:
+        """Whether TLS interception is bypassed for upstream, by its host
+        or, once connected, by its address."""
+        bypass = InterceptionBypass.get(self.config)
+        bypassed = bypass.matches(text_(self.request.host)) or (
+            self.server is not None and self.server.connected and
+            bypass.matches_peer(self.server.connection))
+        if bypassed:
+            self.stats.incr('interception_bypassed')
+            logger.debug('Bypassed TLS interception of %s', text_(self.request.host))
+        return bypassed
+
+    def dispatch_request(self, request: HttpParser, raw: bytes) -> None:
+        assert self.server is not None
+        self.server.queue(raw)
+        self.requests_dispatched += 1
+        self.keep_alive = self.keep_alive and request.is_http_1_1_keep_alive()
+
+    def response_completed(self, response: HttpParser) -> None:
+        self.responses_completed += 1
+        self.keep_alive = self.keep_alive and response.is_http_1_1_keep_alive()
+
+    def pool_key(self) -> PoolKey:
+        assert self.server is not None
+        return self.server.addr[0], self.server.addr[1], False
+
+    def session_key(self) -> SessionKey:
+        assert self.server is not None
+        return self.server.addr[0], self.server.addr[1]
+
+    def is_reusable(self) -> bool:
+        """Server connection can be reused once it is idle, i.e. nothing
+        is buffered or in-flight and upstream expects further requests."""
+        return self.server is not None and not self.server.closed and \
+            self.request.method != httpMethods.CONNECT and self.keep_alive and \
+            self.requests_dispatched > 0 and \
+            self.requests_dispatched == self.responses_completed and \
+            self.pipeline_request is None and self.pipeline_response is None and \
+            not self.server.has_buffer() and not self.response.buffer
+
     def authenticate(self) -> None:
         if self.config.auth_code:
             if b'proxy-authorization' not in self.request.headers or \
@@ -440,19 +666,73 @@ class HttpProxyPlugin(HttpProtocolHandlerPlugin):
     def connect_upstream(self) -> None:
         host, port = self.request.host, self.request.port
         if host and port:
+            if self.request.method != httpMethods.CONNECT:
+                self.server = self.pool.acquire((text_(host), port, False))
+                if self.server is not None:
+                    logger.debug(
+                        'Reusing pooled connection to upstream %s:%s' %
+                        (text_(host), port))
+                    self.server.set_watermarks(
+                        self.config.high_watermark, self.config.low_watermark)
+                    return
             self.server = TcpServerConnection(text_(host), port)
+            self.server.set_watermarks(
+                self.config.high_watermark, self.config.low_watermark)
             try:
                 logger.debug(
                     'Connecting to upstream %s:%s' %
                     (text_(host), port))
-                self.server.connect()
-                self.server.connection.setblocking(False)
-                logger.debug(
-                    'Connected to upstream %s:%s' %
-                    (text_(host), port))
-            except Exception as e:  # TimeoutError, socket.gaierror
+                self.server.connect(nonblocking=True, resolver=self.resolver)
+            except Exception as e:  # OSError, socket.gaierror
                 self.server.closed = True
                 raise ProxyConnectionFailed(text_(host), port, repr(e)) from e
+            if not self.server.connected:
+                self.connect_deadline = time.time() + self.config.connect_timeout
         else:
             logger.exception('Both host and port must exist')
             raise HttpProtocolException()
+
+    def finish_resolve_upstream(self) -> bool:
+        """Invoked once upstream host has been resolved.
+
+        Returns True if client connection must be teardown."""
+        assert self.server is not None
+        try:
+            self.server.finish_resolve(self.resolver)
+        except OSError as e:
+            return self.upstream_connection_failed(repr(e))
+        if self.server.connected:
+            return self.upstream_connected()
+        return False
+
+    def finish_connect_upstream(self, w: List[Union[int, HasFileno]]) -> bool:
+        """Invoked once any upstream connection attempt is writable.
+
+        Returns True if client connection must be teardown."""
+        assert self.server is not None
+        try:
+            if not self.server.finish_connect(w):
+                return False
+        except OSError as e:
+            return self.upstream_connection_failed(repr(e))
+        return self.upstream_connected()
+
+    def upstream_connected(self) -> bool:
+        assert self.server is not None
+        self.connect_deadline = None
+        logger.debug('Connected to upstream %s:%s' % self.server.addr)
+        if self.request.method == httpMethods.CONNECT:
+            return self.establish_tunnel()
+        return False
+
+    def upstream_connection_failed(self, reason: str) -> bool:
+        """Queues bad gateway response for client.  Always returns True, i.e.
+        client connection must be teardown."""
+        assert self.server is not None
+        logger.debug(
+            'Connection to upstream %s:%s failed with reason %s' %
+            (self.server.addr[0], self.server.addr[1], reason))
+        self.server.closed = True
+        e = ProxyConnectionFailed(self.server.addr[0], self.server.addr[1], reason)
+        self.client.queue(e.response(self.request))
+        return True
@@ -122,6 +122,8 @@ class HttpWebServerPacFilePlugin(HttpWebServerBasePlugin):
 class HttpWebServerPlugin(HttpProtocolHandlerPlugin):
     """HttpProtocolHandler plugin which handles incoming requests to local web server."""
 
+    TUNNEL_PASSTHROUGH = True
+
     DEFAULT_404_RESPONSE = build_http_response(
         httpStatusCodes.NOT_FOUND,
         reason=b'NOT FOUND',
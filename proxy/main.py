@@ -14,6 +14,7 @@ import ipaddress
 import logging
 import multiprocessing
 import os
+import socket
 import sys
 import time
 from typing import Dict, List, Optional
@@ -25,6 +26,9 @@ from .common.constants import DOT, COMMA
 from .common.constants import DEFAULT_LOG_FORMAT, DEFAULT_LOG_FILE, DEFAULT_LOG_LEVEL
 from .common.version import __version__
 from .core.acceptor import AcceptorPool
+from .core.bypass import InterceptionBypass
+from .core.pki import CertificateAuthority, HAS_CRYPTOGRAPHY
+from .core.tls import ServerContextCache
 from .http.handler import HttpProtocolHandler
 
 if os.name != 'nt':
@@ -125,6 +129,15 @@ def main(input_args: List[str]) -> None:
               'not both together.')
         sys.exit(1)
 
+    if args.ca_cert_warm_up_file and \
+            not (args.ca_key_file and args.ca_cert_file and args.ca_signing_key_file):
+        print('--ca-cert-warm-up-file requires TLS interception to be enabled.')
+        sys.exit(1)
+
+    if args.reuse_port and not hasattr(socket, 'SO_REUSEPORT'):
+        print('--reuse-port is not supported on this platform.')
+        sys.exit(1)
+
     try:
         setup_logger(args.log_file, args.log_level, args.log_format)
         set_open_file_limit(args.open_file_limit)
@@ -176,13 +189,61 @@ def main(input_args: List[str]) -> None:
             devtools_ws_path=args.devtools_ws_path,
             timeout=args.timeout,
             threadless=args.threadless,
-            enable_events=args.enable_events)
+            enable_events=args.enable_events,
+            reuse_port=args.reuse_port,
+            accept_batch_size=args.accept_batch_size,
+            stats_interval=args.stats_interval,
+            local_executor=args.local_executor,
+            threadless_loops=args.threadless_loops,
+            dispatch_policy=args.dispatch_policy,
+            asyncio=args.asyncio,
+            event_loop_policy=args.event_loop_policy,
+            thread_pool_size=args.thread_pool_size,
+            thread_pool_max_inflight=args.thread_pool_max_inflight,
+            thread_pool_queue_size=args.thread_pool_queue_size,
+            thread_stack_size=args.thread_stack_size,
+            high_watermark=args.high_watermark,
+            low_watermark=args.low_watermark,
+            disable_splice=args.disable_splice,
+            pool_max_idle_per_host=args.pool_max_idle_per_host,
+            pool_idle_ttl=args.pool_idle_ttl,
+            connect_timeout=args.connect_timeout,
+            dns_cache_ttl=args.dns_cache_ttl,
+            dns_negative_cache_ttl=args.dns_negative_cache_ttl,
+            dns_resolver_threads=args.dns_resolver_threads,
+            ca_cert_cache_size=args.ca_cert_cache_size,
+            ca_cert_wildcard=args.ca_cert_wildcard,
+            upstream_tls_session_cache_size=args.upstream_tls_session_cache_size,
+            upstream_tls_session_ttl=args.upstream_tls_session_ttl,
+            tls_interception_bypass_file=args.tls_interception_bypass_file)
 
         flags.plugins = load_plugins(
             bytes_(
                 '%s%s' %
                 (default_plugins, args.plugins)))
 
+        if args.cert_file and args.key_file:
+            # Workers forked hereafter share context and its session ticket keys
+            ServerContextCache.get().context(args.cert_file, args.key_file)
+
+        if args.ca_key_file and args.ca_cert_file and args.ca_signing_key_file and \
+                not HAS_CRYPTOGRAPHY:
+            logger.warning(
+                'cryptography package is not installed, interception certificates '
+                'will be generated using openssl command, one process per host.  '
+                'Install proxy.py[tls-interception] to sign them in-process.')
+
+        if args.ca_cert_warm_up_file:
+            with open(args.ca_cert_warm_up_file) as warm_up_file:
+                hosts = [line.strip() for line in warm_up_file
+                         if line.strip() and not line.startswith('#')]
+            # Workers forked hereafter inherit contexts of warmed up hosts
+            CertificateAuthority.get(flags).warm_up(hosts)
+
+        if args.tls_interception_bypass_file:
+            # Compiled once, workers forked hereafter inherit it
+            InterceptionBypass.get(flags)
+
         acceptor_pool = AcceptorPool(
             flags=flags,
             work_klass=HttpProtocolHandler
@@ -25,6 +25,10 @@ setup(
     license=__license__,
     packages=find_packages(exclude=['benchmark', 'tests', 'plugin_examples']),
     install_requires=open('requirements.txt', 'r').read().strip().split(),
+    extras_require={
+        # Signs TLS interception certificates in-process instead of using openssl command
+        'tls-interception': ['cryptography>=3.1'],
+    },
     entry_points={
         'console_scripts': [
             'proxy = proxy.main:entry_point'
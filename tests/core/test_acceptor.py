@@ -12,14 +12,18 @@ import socket
 import selectors
 import multiprocessing
 from unittest import mock
+from typing import List, Tuple
 
 from proxy.common.flags import Flags
 from proxy.core.acceptor import Acceptor
 
+from ..utils import isolate_stats
+
 
 class TestAcceptor(unittest.TestCase):
 
     def setUp(self) -> None:
+        isolate_stats(self)
         self.acceptor_id = 1
         self.mock_protocol_handler = mock.MagicMock()
         self.pipe = multiprocessing.Pipe()
@@ -95,3 +99,212 @@ class TestAcceptor(unittest.TestCase):
             target=self.mock_protocol_handler.return_value.run)
         mock_thread.return_value.start.assert_called()
         sock.close.assert_called()
+
+    @mock.patch('threading.Thread')
+    @mock.patch('selectors.DefaultSelector')
+    @mock.patch('socket.fromfd')
+    @mock.patch('proxy.core.acceptor.recv_handle')
+    def test_accepts_batch_until_backlog_is_drained(
+            self,
+            mock_recv_handle: mock.Mock,
+            mock_fromfd: mock.Mock,
+            mock_selector: mock.Mock,
+            mock_thread: mock.Mock) -> None:
+        conn1, addr1 = mock.MagicMock(), mock.MagicMock()
+        conn2, addr2 = mock.MagicMock(), mock.MagicMock()
+        sock = mock_fromfd.return_value
+        sock.accept.side_effect = [
+            (conn1, addr1), (conn2, addr2), BlockingIOError()]
+        mock_recv_handle.return_value = 10
+
+        selector = mock_selector.return_value
+        selector.select.side_effect = [[(None, None)], KeyboardInterrupt()]
+
+        self.acceptor.run()
+
+        self.assertEqual(sock.accept.call_count, 3)
+        self.assertEqual(self.mock_protocol_handler.call_count, 2)
+        self.mock_protocol_handler.assert_any_call(
+            fileno=conn1.fileno(), addr=addr1, flags=self.flags, event_queue=None)
+        self.mock_protocol_handler.assert_any_call(
+            fileno=conn2.fileno(), addr=addr2, flags=self.flags, event_queue=None)
+        self.assertEqual(mock_thread.return_value.start.call_count, 2)
+        assert self.acceptor.stats is not None
+        self.assertEqual(self.acceptor.stats.counters['accepted'], 2)
+
+    @mock.patch('threading.Thread')
+    @mock.patch('selectors.DefaultSelector')
+    @mock.patch('socket.fromfd')
+    @mock.patch('proxy.core.acceptor.recv_handle')
+    def test_accept_batch_size_is_respected(
+            self,
+            mock_recv_handle: mock.Mock,
+            mock_fromfd: mock.Mock,
+            mock_selector: mock.Mock,
+            mock_thread: mock.Mock) -> None:
+        self.flags.accept_batch_size = 4
+        sock = mock_fromfd.return_value
+        sock.accept.return_value = (mock.MagicMock(), mock.MagicMock())
+        mock_recv_handle.return_value = 10
+
+        selector = mock_selector.return_value
+        selector.select.side_effect = [[(None, None)], KeyboardInterrupt()]
+
+        self.acceptor.run()
+
+        self.assertEqual(sock.accept.call_count, 4)
+        self.assertEqual(mock_thread.return_value.start.call_count, 4)
+
+    @mock.patch('threading.Thread')
+    @mock.patch('selectors.DefaultSelector')
+    @mock.patch('socket.socket')
+    @mock.patch('proxy.core.acceptor.recv_handle')
+    def test_reuse_port_binds_own_socket(
+            self,
+            mock_recv_handle: mock.Mock,
+            mock_socket: mock.Mock,
+            mock_selector: mock.Mock,
+            mock_thread: mock.Mock) -> None:
+        self.flags.reuse_port = True
+        conn = mock.MagicMock()
+        addr = mock.MagicMock()
+        sock = mock_socket.return_value
+        sock.accept.return_value = (conn, addr)
+
+        mock_thread.return_value.start.side_effect = KeyboardInterrupt()
+
+        selector = mock_selector.return_value
+        selector.select.return_value = [(None, None)]
+
+        with mock.patch.object(Acceptor, 'lock') as mock_lock:
+            self.acceptor.run()
+            mock_lock.__enter__.assert_not_called()
+
+        mock_recv_handle.assert_not_called()
+        mock_socket.assert_called_with(socket.AF_INET6, socket.SOCK_STREAM)
+        sock.setsockopt.assert_any_call(
+            socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind.assert_called_with(
+            (str(self.flags.hostname), self.flags.port))
+        sock.listen.assert_called_with(self.flags.backlog)
+        sock.setblocking.assert_called_with(False)
+        selector.register.assert_called_with(sock, selectors.EVENT_READ)
+        self.mock_protocol_handler.assert_called_with(
+            fileno=conn.fileno(),
+            addr=addr,
+            flags=self.flags,
+            event_queue=None,
+        )
+        sock.close.assert_called()
+
+    @mock.patch('proxy.core.acceptor.Threadless')
+    @mock.patch('selectors.DefaultSelector')
+    @mock.patch('socket.fromfd')
+    @mock.patch('proxy.core.acceptor.recv_handle')
+    def test_local_executor_serves_within_acceptor(
+            self,
+            mock_recv_handle: mock.Mock,
+            mock_fromfd: mock.Mock,
+            mock_selector: mock.Mock,
+            mock_threadless: mock.Mock) -> None:
+        self.flags.local_executor = True
+        self.flags.threadless = True
+        mock_recv_handle.return_value = 10
+        sock = mock_fromfd.return_value
+
+        self.acceptor.run()
+
+        mock_threadless.assert_called_with(
+            client_queue=None,
+            flags=self.flags,
+            work_klass=self.mock_protocol_handler,
+            event_queue=None,
+            listener=sock)
+        mock_threadless.return_value.run.assert_called_once()
+        mock_threadless.return_value.start.assert_not_called()
+        mock_selector.return_value.register.assert_not_called()
+        sock.accept.assert_not_called()
+        sock.close.assert_called()
+
+    @mock.patch('proxy.core.acceptor.BATCHED_HANDOFF', True)
+    @mock.patch('proxy.core.acceptor.send_clients')
+    @mock.patch('socket.fromfd')
+    @mock.patch('proxy.core.acceptor.Threadless')
+    def test_dispatches_batch_across_threadless_loops(
+            self,
+            mock_threadless: mock.Mock,
+            mock_fromfd: mock.Mock,
+            mock_send_clients: mock.Mock) -> None:
+        self.flags.threadless = True
+        self.flags.threadless_loops = 3
+        client_socks = [mock.MagicMock() for _ in range(3)]
+        mock_fromfd.side_effect = client_socks
+
+        self.acceptor.start_threadless_processes()
+        self.assertEqual(mock_threadless.call_count, 3)
+        self.assertEqual(mock_threadless.return_value.start.call_count, 3)
+        loads = [c[1]['load'] for c in mock_threadless.call_args_list]
+        self.assertEqual(len(set(id(load) for load in loads)), 3)
+
+        conns = [mock.MagicMock() for _ in range(6)]
+        accepted: List[Tuple[socket.socket, Tuple[str, int]]] = [
+            (conn, ('127.0.0.1', port)) for port, conn in enumerate(conns)]
+        self.acceptor.start_works(accepted)
+
+        # Round robin by default, one handoff per loop
+        self.assertEqual(mock_send_clients.call_count, 3)
+        for index, client_sock in enumerate(client_socks):
+            mock_send_clients.assert_any_call(
+                client_sock, [
+                    (conns[index].fileno(), ('127.0.0.1', index)),
+                    (conns[index + 3].fileno(), ('127.0.0.1', index + 3))])
+        for conn in conns:
+            conn.close.assert_called_once()
+
+        self.acceptor.shutdown_threadless_processes()
+        self.assertEqual(mock_threadless.return_value.join.call_count, 3)
+        for client_sock in client_socks:
+            client_sock.close.assert_called_once()
+
+    @mock.patch('socket.fromfd')
+    @mock.patch('proxy.core.acceptor.AsyncioExecutor')
+    @mock.patch('proxy.core.acceptor.Threadless')
+    def test_asyncio_starts_asyncio_executors(
+            self,
+            mock_threadless: mock.Mock,
+            mock_asyncio_executor: mock.Mock,
+            mock_fromfd: mock.Mock) -> None:
+        self.flags.threadless = True
+        self.flags.asyncio = True
+        self.flags.threadless_loops = 2
+
+        self.acceptor.start_threadless_processes()
+        mock_threadless.assert_not_called()
+        self.assertEqual(mock_asyncio_executor.call_count, 2)
+        self.assertEqual(mock_asyncio_executor.return_value.start.call_count, 2)
+        self.acceptor.shutdown_threadless_processes()
+
+    @mock.patch('selectors.DefaultSelector')
+    @mock.patch('socket.fromfd')
+    @mock.patch('proxy.core.acceptor.recv_handle')
+    @mock.patch('proxy.core.acceptor.ThreadPool')
+    def test_thread_pool_handles_accepted_clients(
+            self,
+            mock_thread_pool: mock.Mock,
+            mock_recv_handle: mock.Mock,
+            mock_fromfd: mock.Mock,
+            mock_selector: mock.Mock) -> None:
+        self.flags.thread_pool_size = 4
+        sock = mock_fromfd.return_value
+        conn, addr = mock.MagicMock(), ('127.0.0.1', 54382)
+        sock.accept.side_effect = [(conn, addr), BlockingIOError()]
+        mock_selector.return_value.select.return_value = [(None, None)]
+        pool = mock_thread_pool.return_value
+        pool.submit.side_effect = KeyboardInterrupt()
+
+        self.acceptor.run()
+
+        pool.start.assert_called_once()
+        pool.submit.assert_called_once_with([(conn, addr)])
+        self.mock_protocol_handler.assert_not_called()
+        pool.shutdown.assert_called_once()
@@ -54,3 +54,31 @@ class TestAcceptorPool(unittest.TestCase):
         acceptor.shutdown()
         mock_worker1.join.assert_called()
         mock_worker2.join.assert_called()
+
+    @mock.patch('proxy.core.acceptor.send_handle')
+    @mock.patch('multiprocessing.Pipe')
+    @mock.patch('socket.socket')
+    @mock.patch('proxy.core.acceptor.Acceptor')
+    def test_setup_with_reuse_port(
+            self,
+            mock_worker: mock.Mock,
+            mock_socket: mock.Mock,
+            mock_pipe: mock.Mock,
+            mock_send_handle: mock.Mock) -> None:
+        mock_worker1 = mock.MagicMock()
+        mock_worker2 = mock.MagicMock()
+        mock_worker.side_effect = [mock_worker1, mock_worker2]
+
+        flags = Flags(num_workers=2, reuse_port=True)
+        acceptor = AcceptorPool(flags=flags, work_klass=mock.MagicMock())
+        acceptor.setup()
+
+        mock_socket.assert_not_called()
+        mock_send_handle.assert_not_called()
+        self.assertEqual(mock_pipe.return_value[0].close.call_count, 2)
+        mock_worker1.start.assert_called()
+        mock_worker2.start.assert_called()
+
+        acceptor.shutdown()
+        mock_worker1.join.assert_called()
+        mock_worker2.join.assert_called()
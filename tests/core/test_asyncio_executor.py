@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡ Fast, Lightweight, Programmable Proxy Server in a single Python file.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import time
+import asyncio
+import socket
+import selectors
+import unittest
+from unittest import mock
+
+from proxy.common.flags import Flags
+from proxy.core.asyncio_executor import AsyncioExecutor, new_event_loop_policy
+from proxy.core.stats import Stats
+from proxy.core.threadless import MAX_SELECT_TIMEOUT
+
+from ..utils import isolate_stats, logged_stats
+
+
+class TestEventLoopPolicy(unittest.TestCase):
+
+    @mock.patch('importlib.import_module')
+    def test_auto_falls_back_to_asyncio(self, mock_import_module: mock.Mock) -> None:
+        mock_import_module.side_effect = ImportError()
+        policy = new_event_loop_policy('auto')
+        mock_import_module.assert_called_once_with('uvloop')
+        self.assertIsInstance(policy, asyncio.DefaultEventLoopPolicy)
+
+    @mock.patch('importlib.import_module')
+    def test_auto_prefers_uvloop(self, mock_import_module: mock.Mock) -> None:
+        policy = new_event_loop_policy('auto')
+        mock_import_module.assert_called_once_with('uvloop')
+        self.assertEqual(policy, mock_import_module.return_value.EventLoopPolicy.return_value)
+
+    def test_asyncio(self) -> None:
+        self.assertIsInstance(
+            new_event_loop_policy('asyncio'), asyncio.DefaultEventLoopPolicy)
+
+    def test_fully_qualified_class_name(self) -> None:
+        self.assertIsInstance(
+            new_event_loop_policy('asyncio.DefaultEventLoopPolicy'),
+            asyncio.DefaultEventLoopPolicy)
+
+
+class TestAsyncioExecutor(unittest.TestCase):
+
+    def setUp(self) -> None:
+        isolate_stats(self)
+        self.executor = AsyncioExecutor(
+            client_queue=None, flags=Flags(), work_klass=mock.MagicMock())
+        self.executor.loop = asyncio.new_event_loop()
+        self.pairs = [socket.socketpair() for _ in range(2)]
+        self.works = []
+        for conn, _ in self.pairs:
+            work = mock.MagicMock()
+            work.uid = str(conn.fileno())
+            work.get_events.return_value = {conn: selectors.EVENT_READ}
+            work.handle_events.return_value = False
+            work.deadline.return_value = None
+            self.executor.works[conn.fileno()] = work
+            self.executor.update_registrations(conn.fileno())
+            self.works.append(work)
+
+    def tearDown(self) -> None:
+        assert self.executor.loop is not None
+        self.executor.loop.close()
+        for a, b in self.pairs:
+            a.close()
+            b.close()
+
+    def run_loop_once(self) -> None:
+        assert self.executor.loop is not None
+        self.executor.loop.call_soon(self.executor.loop.stop)
+        self.executor.loop.run_forever()
+
+    def test_only_ready_works_are_dispatched(self) -> None:
+        self.pairs[1][1].send(b'ready')
+        self.run_loop_once()
+        self.works[0].handle_events.assert_not_called()
+        self.works[1].handle_events.assert_called_once_with([self.pairs[1][0]], [])
+
+    def test_interest_changes_update_loop_handlers(self) -> None:
+        conn = self.pairs[0][0]
+        self.works[0].get_events.return_value = {conn: selectors.EVENT_WRITE}
+        self.executor.update_registrations(conn.fileno())
+        self.run_loop_once()
+        self.works[0].handle_events.assert_called_once_with([], [conn])
+
+    @mock.patch('os.close')
+    def test_teardown_cleans_up_work(self, mock_os_close: mock.Mock) -> None:
+        conn = self.pairs[1][0]
+        self.works[1].handle_events.return_value = True
+        self.pairs[1][1].send(b'ready')
+        self.run_loop_once()
+        self.works[1].shutdown.assert_called_once()
+        self.assertNotIn(conn.fileno(), self.executor.works)
+        self.assertNotIn(conn.fileno(), self.executor.owners)
+        mock_os_close.assert_called_once_with(conn.fileno())
+        # Descriptor no longer watched by the loop
+        self.pairs[1][1].send(b'again')
+        self.run_loop_once()
+        self.works[1].handle_events.assert_called_once()
+
+    def test_expire_logs_stats(self) -> None:
+        self.executor.flags = Flags(stats_interval=1)
+        Stats.get('test-asyncio').incr('handled')
+        with logged_stats() as logged:
+            self.executor.expire()
+        self.assertEqual(logged['test-asyncio']['handled'], 1)
+
+    def test_earlier_deadline_brings_expire_timer_forward(self) -> None:
+        assert self.executor.loop is not None
+        self.executor.arm(time.time() + MAX_SELECT_TIMEOUT)
+        armed = self.executor.expire_handle
+        assert armed is not None
+        self.works[0].deadline.return_value = time.time() + 0.1
+        self.executor.schedule(self.pairs[0][0].fileno())
+        self.assertTrue(armed.cancelled())
+        handle = self.executor.expire_handle
+        assert handle is not None
+        self.assertLess(handle.when(), self.executor.loop.time() + 0.2)
+
+        # Later deadlines leave timer as is
+        self.works[1].deadline.return_value = time.time() + 0.5
+        self.executor.schedule(self.pairs[1][0].fileno())
+        self.assertIs(self.executor.expire_handle, handle)
+        handle.cancel()
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡ Fast, Lightweight, Programmable Proxy Server in a single Python file.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import socket
+import unittest
+
+from proxy.core.bypass import InterceptionBypass
+
+
+class TestInterceptionBypass(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.bypass = InterceptionBypass([
+            'updates.example.com', '.video.example.net', '*.cdn.example.org',
+            '10.0.0.0/8', '192.168.1.1', '2001:db8::/32'])
+
+    def test_exact_hosts(self) -> None:
+        self.assertTrue(self.bypass.matches('updates.example.com'))
+        self.assertTrue(self.bypass.matches('Updates.Example.com.'))
+        self.assertFalse(self.bypass.matches('example.com'))
+        self.assertFalse(self.bypass.matches('www.updates.example.com'))
+
+    def test_suffixes_match_host_and_subdomains(self) -> None:
+        for host in ('video.example.net', 'a.video.example.net', 'a.b.video.example.net',
+                     'cdn.example.org', 'img.cdn.example.org'):
+            self.assertTrue(self.bypass.matches(host), host)
+        for host in ('example.net', 'xvideo.example.net', 'video.example.com', ''):
+            self.assertFalse(self.bypass.matches(host), host)
+
+    def test_networks(self) -> None:
+        for host in ('10.1.2.3', '192.168.1.1', '2001:db8::1', '[2001:db8::1]', '::ffff:10.0.0.1'):
+            self.assertTrue(self.bypass.matches(host), host)
+        for host in ('11.0.0.1', '192.168.1.2', '2001:db9::1'):
+            self.assertFalse(self.bypass.matches(host), host)
+
+    def test_connected_peer_address(self) -> None:
+        with socket.socket() as listener:
+            listener.bind(('127.0.0.1', 0))
+            listener.listen(1)
+            with socket.create_connection(listener.getsockname()) as conn:
+                self.assertFalse(self.bypass.matches_peer(conn))
+                self.bypass.add('127.0.0.0/8')
+                self.assertTrue(self.bypass.matches_peer(conn))
+            self.assertFalse(self.bypass.matches_peer(conn))
+
+    def test_invalid_patterns_raise(self) -> None:
+        for pattern in ('', '.', 'a..example.com', 'a*.example.com', '*'):
+            with self.assertRaises(ValueError):
+                self.bypass.add(pattern)
+
+    def test_empty_bypass_matches_nothing(self) -> None:
+        bypass = InterceptionBypass()
+        self.assertFalse(bypass.matches('example.com'))
+        self.assertFalse(bypass.matches('10.0.0.1'))
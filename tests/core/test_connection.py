@@ -7,14 +7,21 @@
     :copyright: (c) 2013-present by Abhinav Singh and contributors.
     :license: BSD, see LICENSE for more details.
 """
+import os
+import errno
 import unittest
+import select
+import selectors
 import socket
 import ssl
 from unittest import mock
-from typing import Optional, Union
+from typing import Any, List, Optional, Tuple, Union
 
 from proxy.core.connection import tcpConnectionTypes, TcpConnectionUninitializedException
 from proxy.core.connection import TcpServerConnection, TcpConnection, TcpClientConnection
+from proxy.core.connection import MAX_SEGMENTS_PER_FLUSH, BufferPool
+from proxy.core.resolver import Lookup
+from proxy.core.happy_eyeballs import CONNECTION_ATTEMPT_DELAY
 from proxy.common.constants import DEFAULT_IPV6_HOSTNAME, DEFAULT_PORT, DEFAULT_IPV4_HOSTNAME
 
 
@@ -62,6 +69,123 @@ class TestTcpConnection(unittest.TestCase):
         self.conn.flush()
         self.assertTrue(not _conn.send.called)
 
+    def testQueueTracksBufferSize(self) -> None:
+        self.conn = TestTcpConnection.TcpConnectionToTest(mock.MagicMock())
+        self.assertFalse(self.conn.has_buffer())
+        self.assertEqual(self.conn.queue(b'hello '), 6)
+        self.assertEqual(self.conn.queue(b''), 0)
+        self.conn.queue(b'world')
+        self.assertTrue(self.conn.has_buffer())
+        self.assertEqual(self.conn.buffer_size(), 11)
+        self.assertEqual(self.conn.buffer, b'hello world')
+
+    def testFlushSingleSegmentUsesSend(self) -> None:
+        _conn = mock.MagicMock()
+        _conn.send.return_value = 2
+        self.conn = TestTcpConnection.TcpConnectionToTest(_conn)
+        data = b'hello'
+        self.conn.queue(data)
+        self.assertIs(self.conn.buffer, data)
+        self.assertEqual(self.conn.flush(), 2)
+        self.assertEqual(_conn.send.call_args[0][0], b'hello')
+        _conn.sendmsg.assert_not_called()
+        self.assertEqual(self.conn.buffer_size(), 3)
+        self.assertEqual(self.conn.buffer, b'llo')
+
+    def testFlushMultipleSegmentsUsesSendmsg(self) -> None:
+        _conn = mock.MagicMock()
+        self.conn = TestTcpConnection.TcpConnectionToTest(_conn)
+        for data in (b'abc', b'defg', b'hi'):
+            self.conn.queue(data)
+
+        # Partial write within second segment
+        _conn.sendmsg.return_value = 5
+        self.assertEqual(self.conn.flush(), 5)
+        self.assertEqual(
+            [bytes(segment) for segment in _conn.sendmsg.call_args[0][0]],
+            [b'abc', b'defg', b'hi'])
+        self.assertEqual(self.conn.buffer_size(), 4)
+        self.assertEqual(self.conn.buffer, b'fghi')
+
+        # Write ending exactly at segment boundary
+        _conn.sendmsg.return_value = 2
+        self.conn.flush()
+        self.assertEqual(
+            [bytes(segment) for segment in _conn.sendmsg.call_args[0][0]],
+            [b'fg', b'hi'])
+        self.assertEqual(self.conn.buffer, b'hi')
+
+        _conn.send.return_value = 2
+        self.conn.flush()
+        self.assertFalse(self.conn.has_buffer())
+        self.assertEqual(self.conn.flush(), 0)
+
+    def testFlushWritesBoundedNumberOfSegments(self) -> None:
+        _conn = mock.MagicMock()
+        _conn.sendmsg.side_effect = lambda buffers: sum(len(b) for b in buffers)
+        self.conn = TestTcpConnection.TcpConnectionToTest(_conn)
+        for _ in range(MAX_SEGMENTS_PER_FLUSH + 1):
+            self.conn.queue(b'x')
+        self.assertEqual(self.conn.flush(), MAX_SEGMENTS_PER_FLUSH)
+        self.assertEqual(self.conn.buffer, b'x')
+
+    def testWatermarksPauseAndResume(self) -> None:
+        _conn = mock.MagicMock()
+        _conn.send.side_effect = lambda data: min(len(data), 4)
+        self.conn = TestTcpConnection.TcpConnectionToTest(_conn)
+        self.conn.set_watermarks(10, 4)
+        self.conn.queue(b'x' * 6)
+        self.assertFalse(self.conn.paused)
+        self.conn.queue(b'x' * 6)
+        self.assertTrue(self.conn.paused)
+        self.assertEqual(self.conn.peak_buffer_size, 12)
+
+        # Stays paused until drained to low watermark
+        self.conn.consume(4)
+        self.conn.queue(b'x' * 2)
+        self.assertTrue(self.conn.paused)
+        self.conn.consume(6)
+        self.assertFalse(self.conn.paused)
+        self.assertEqual(self.conn.peak_buffer_size, 12)
+        self.assertEqual(self.conn.pauses, 1)
+
+    def testTailOnlyJoinsTrailingSegments(self) -> None:
+        self.conn = TestTcpConnection.TcpConnectionToTest(mock.MagicMock())
+        last = b'world'
+        self.conn.queue(b'hello ')
+        self.conn.queue(last)
+        self.assertEqual(self.conn.queued_bytes, 11)
+        self.assertIs(self.conn.tail(5), last)
+        self.assertEqual(self.conn.tail(7), b'o world')
+        self.conn.consume(8)
+        self.assertEqual(self.conn.tail(5), b'rld')
+        self.assertEqual(self.conn.queued_bytes, 11)
+
+    def testWatermarksDisabledByDefault(self) -> None:
+        self.conn = TestTcpConnection.TcpConnectionToTest(mock.MagicMock())
+        self.conn.queue(b'x' * 1024)
+        self.assertFalse(self.conn.paused)
+        self.assertEqual(self.conn.peak_buffer_size, 1024)
+
+    def testFlushSslConnectionUsesSend(self) -> None:
+        _conn = mock.MagicMock(spec=ssl.SSLSocket)
+        _conn.send.return_value = 3
+        self.conn = TestTcpConnection.TcpConnectionToTest(_conn)
+        self.conn.queue(b'abc')
+        self.conn.queue(b'def')
+        self.assertEqual(self.conn.flush(), 3)
+        _conn.send.assert_called_once()
+        self.assertEqual(self.conn.buffer, b'def')
+
+    def testHandshakeReturnsEventToWaitFor(self) -> None:
+        _conn = mock.MagicMock(spec=ssl.SSLSocket)
+        _conn.do_handshake.side_effect = [
+            ssl.SSLWantReadError(), ssl.SSLWantWriteError(), None]
+        self.conn = TestTcpConnection.TcpConnectionToTest(_conn)
+        self.assertEqual(self.conn.handshake(), selectors.EVENT_READ)
+        self.assertEqual(self.conn.handshake(), selectors.EVENT_WRITE)
+        self.assertEqual(self.conn.handshake(), 0)
+
     @mock.patch('socket.socket')
     def testTcpServerEstablishesIPv6Connection(
             self, mock_socket: mock.Mock) -> None:
@@ -103,6 +227,126 @@ class TestTcpConnection(unittest.TestCase):
             conn.connection,
             mock_new_socket_connection.return_value)
 
+    def testTcpServerNonBlockingConnect(self) -> None:
+        with socket.socket() as listener:
+            listener.bind(('127.0.0.1', 0))
+            listener.listen(1)
+            conn = TcpServerConnection('127.0.0.1', listener.getsockname()[1])
+            conn.connect(nonblocking=True)
+            attempts = list(conn.attempts)
+            self.assertEqual(len(attempts), 1)
+            self.assertFalse(attempts[0].getblocking())
+            select.select([], attempts, [], 1)
+            self.assertTrue(conn.finish_connect(attempts))
+            self.assertTrue(conn.connected)
+            self.assertIs(conn.connection, attempts[0])
+            conn.close()
+
+    def testTcpServerNonBlockingConnectTriesNextAddress(self) -> None:
+        with socket.socket() as listener, socket.socket() as refusing:
+            listener.bind(('127.0.0.1', 0))
+            listener.listen(1)
+            # Bound but not listening, connections are refused
+            refusing.bind(('127.0.0.1', 0))
+            conn = TcpServerConnection('upstream.host', 80)
+            with mock.patch('socket.getaddrinfo', return_value=[
+                    addrinfo(refusing.getsockname()), addrinfo(listener.getsockname())]):
+                conn.connect(nonblocking=True)
+            while not conn.connected:
+                _, ready, _ = select.select([], list(conn.attempts), [], 1)
+                conn.finish_connect(ready)
+            self.assertEqual(conn.connection.getpeername(), listener.getsockname())
+            conn.close()
+
+    def testTcpServerNonBlockingConnectSkipsUnsupportedFamily(self) -> None:
+        new_socket = socket.socket
+
+        def ipv6_disabled(family: int, *args: Any) -> socket.socket:
+            if family == socket.AF_INET6:
+                raise OSError(errno.EAFNOSUPPORT, os.strerror(errno.EAFNOSUPPORT))
+            return new_socket(family, *args)
+
+        with socket.socket() as listener:
+            listener.bind(('127.0.0.1', 0))
+            listener.listen(1)
+            conn = TcpServerConnection('upstream.host', 80)
+            with mock.patch('socket.getaddrinfo', return_value=[
+                    (socket.AF_INET6, socket.SOCK_STREAM, 6, '', ('::1', 80, 0, 0)),
+                    addrinfo(listener.getsockname())]), \
+                    mock.patch('socket.socket', side_effect=ipv6_disabled):
+                conn.connect(nonblocking=True)
+            self.assertEqual(len(conn.attempts), 1)
+            while not conn.connected:
+                _, ready, _ = select.select([], list(conn.attempts), [], 1)
+                conn.finish_connect(ready)
+            self.assertEqual(conn.connection.getpeername(), listener.getsockname())
+            conn.close()
+
+    @mock.patch('time.time')
+    def testTcpServerRacesNextAddressAfterAttemptDelay(self, mock_time: mock.Mock) -> None:
+        mock_time.return_value = 100
+        with socket.socket() as blackhole, socket.socket() as listener:
+            blackhole.bind(('127.0.0.1', 0))
+            blackhole.listen(0)
+            fillers = fill_backlog(blackhole)
+            listener.bind(('127.0.0.1', 0))
+            listener.listen(1)
+            conn = TcpServerConnection('upstream.host', 80)
+            with mock.patch('socket.getaddrinfo', return_value=[
+                    addrinfo(blackhole.getsockname()), addrinfo(listener.getsockname())]):
+                conn.connect(nonblocking=True)
+            self.assertEqual(len(conn.attempts), 1)
+            self.assertEqual(conn.next_attempt_at, 100 + CONNECTION_ATTEMPT_DELAY)
+            conn.start_due_attempt()
+            self.assertEqual(len(conn.attempts), 1)
+
+            mock_time.return_value = 100 + CONNECTION_ATTEMPT_DELAY
+            conn.start_due_attempt()
+            self.assertEqual(len(conn.attempts), 2)
+            self.assertIsNone(conn.next_attempt_at)
+            while not conn.connected:
+                _, ready, _ = select.select([], list(conn.attempts), [], 1)
+                conn.finish_connect(ready)
+            self.assertEqual(conn.connection.getpeername(), listener.getsockname())
+            # Attempt which lost the race is cancelled
+            self.assertEqual(conn.attempts, {})
+            conn.close()
+            for filler in fillers:
+                filler.close()
+
+    def testTcpServerNonBlockingConnectRaisesOnceAllAddressesFail(self) -> None:
+        with socket.socket() as refusing:
+            refusing.bind(('127.0.0.1', 0))
+            conn = TcpServerConnection('127.0.0.1', refusing.getsockname()[1])
+            with self.assertRaises(OSError):
+                conn.connect(nonblocking=True)
+                _, ready, _ = select.select([], list(conn.attempts), [], 1)
+                conn.finish_connect(ready)
+            self.assertFalse(conn.connected)
+
+    def testTcpServerNonBlockingConnectWaitsForResolver(self) -> None:
+        with socket.socket() as listener:
+            listener.bind(('127.0.0.1', 0))
+            listener.listen(1)
+            lookup = Lookup('upstream.host', 80)
+            lookup.wait()
+            resolver = mock.MagicMock()
+            resolver.resolve.return_value = lookup
+            conn = TcpServerConnection('upstream.host', 80)
+            conn.connect(nonblocking=True, resolver=resolver)
+            self.assertIs(conn.lookup, lookup)
+            self.assertFalse(conn.connected)
+
+            lookup.resolved([addrinfo(listener.getsockname())], None)
+            conn.finish_resolve(resolver)
+            resolver.release.assert_called_once_with(lookup)
+            self.assertIsNone(conn.lookup)
+            attempts = list(conn.attempts)
+            select.select([], attempts, [], 1)
+            self.assertTrue(conn.finish_connect(attempts))
+            lookup.close()
+            conn.close()
+
     def testTcpServerRaisesTcpConnectionUninitializedException(self) -> None:
         conn = TcpServerConnection(
             str(DEFAULT_IPV6_HOSTNAME), DEFAULT_PORT)
@@ -116,3 +360,70 @@ class TestTcpConnection(unittest.TestCase):
         conn._conn = None
         with self.assertRaises(TcpConnectionUninitializedException):
             _ = conn.connection
+
+
+class TestBufferPool(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.pool = BufferPool()
+        self.client, self.server = socket.socketpair()
+
+    def tearDown(self) -> None:
+        BufferPool.install(None)
+        self.client.close()
+        self.server.close()
+
+    def test_recv_reuses_buffer(self) -> None:
+        for data in (b'hello', b'world!'):
+            self.client.sendall(data)
+            received = self.pool.recv(self.server, 1024)
+            self.assertIsInstance(received, bytes)
+            self.assertEqual(received, data)
+        self.assertEqual(self.pool.allocated, 1)
+        self.assertEqual(len(self.pool.buffers), 1)
+
+    def test_larger_buffer_replaces_smaller(self) -> None:
+        self.pool.release(bytearray(16))
+        buffer = self.pool.acquire(1024)
+        self.assertEqual(len(buffer), 1024)
+        self.assertEqual(self.pool.allocated, 1)
+        self.assertEqual(len(self.pool.buffers), 0)
+
+    def test_buffer_is_released_on_error(self) -> None:
+        conn = mock.MagicMock()
+        conn.recv_into.side_effect = BlockingIOError()
+        with self.assertRaises(BlockingIOError):
+            self.pool.recv(conn, 1024)
+        self.assertEqual(len(self.pool.buffers), 1)
+
+    def test_tcp_connection_reads_via_installed_pool(self) -> None:
+        conn = TcpClientConnection(self.server, ('127.0.0.1', 54382))
+        self.client.sendall(b'hello')
+        self.assertEqual(conn.recv(), b'hello')
+        self.assertEqual(self.pool.allocated, 0)
+
+        BufferPool.install(self.pool)
+        self.assertIs(BufferPool.current(), self.pool)
+        self.client.sendall(b'world')
+        self.assertEqual(conn.recv(), b'world')
+        self.assertEqual(self.pool.allocated, 1)
+        self.client.close()
+        self.assertIsNone(conn.recv())
+
+
+def addrinfo(sockaddr: Tuple[str, int]) -> Tuple[Any, ...]:
+    return (socket.AF_INET, socket.SOCK_STREAM, 0, '', sockaddr)
+
+
+def fill_backlog(listener: socket.socket) -> List[socket.socket]:
+    """Connects to listener until its accept queue is full,
+    further connections then remain in progress."""
+    fillers: List[socket.socket] = []
+    while True:
+        filler = socket.socket()
+        filler.settimeout(0.1)
+        fillers.append(filler)
+        try:
+            filler.connect(listener.getsockname())
+        except socket.timeout:
+            return fillers
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡ Fast, Lightweight, Programmable Proxy Server in a single Python file.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import socket
+import unittest
+from unittest import mock
+from typing import List, Tuple
+
+from proxy.core.connection_pool import ConnectionPool
+from proxy.core.stats import Stats
+
+from ..utils import isolate_stats, logged_stats
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self) -> None:
+        isolate_stats(self)
+        self.stats = Stats('test-connection-pool')
+        self.pool = ConnectionPool(max_idle_per_host=2, idle_ttl=30, stats=self.stats)
+        self.key = ('upstream.host', 80, False)
+        self.pairs: List[Tuple[socket.socket, socket.socket]] = [
+            socket.socketpair() for _ in range(3)]
+
+    def tearDown(self) -> None:
+        for a, b in self.pairs:
+            a.close()
+            b.close()
+
+    def test_reuses_released_connection(self) -> None:
+        self.assertIsNone(self.pool.acquire(self.key))
+        self.assertTrue(self.pool.release(self.key, self.pairs[0][0]))
+        self.assertIsNone(self.pool.acquire(('upstream.host', 443, True)))
+
+        server = self.pool.acquire(self.key)
+        assert server is not None
+        self.assertIs(server.connection, self.pairs[0][0])
+        self.assertEqual(server.addr, ('upstream.host', 80))
+        self.assertIsNone(self.pool.acquire(self.key))
+        snapshot = self.stats.snapshot()
+        self.assertEqual(snapshot['hit'], 1)
+        self.assertEqual(snapshot['miss'], 3)
+        self.assertEqual(snapshot['idle'], 0)
+
+    def test_closed_or_unsolicited_data_connections_are_not_reused(self) -> None:
+        self.pairs[0][1].close()
+        self.pairs[1][1].sendall(b'HTTP/1.1 408 Request Timeout\r\n\r\n')
+        self.pool.release(self.key, self.pairs[0][0])
+        self.pool.release(self.key, self.pairs[1][0])
+        self.assertIsNone(self.pool.acquire(self.key))
+        self.assertEqual(self.pairs[0][0].fileno(), -1)
+        self.assertEqual(self.pairs[1][0].fileno(), -1)
+        self.assertEqual(self.stats.snapshot()['evicted'], 2)
+
+    def test_max_idle_per_host(self) -> None:
+        for conn, _ in self.pairs:
+            self.pool.release(self.key, conn)
+        # Oldest connection has been closed
+        self.assertEqual(self.pairs[0][0].fileno(), -1)
+        server = self.pool.acquire(self.key)
+        assert server is not None
+        self.assertIs(server.connection, self.pairs[2][0])
+
+    @mock.patch('time.time')
+    def test_idle_connections_expire(self, mock_time: mock.Mock) -> None:
+        mock_time.return_value = 1000
+        self.pool.release(self.key, self.pairs[0][0])
+        mock_time.return_value = 1030
+        self.assertIsNone(self.pool.acquire(self.key))
+        self.assertEqual(self.pairs[0][0].fileno(), -1)
+
+        # Sweep closes expired connections of other hosts too
+        self.pool.release(('other.host', 80, False), self.pairs[1][0])
+        mock_time.return_value = 1070
+        self.pool.release(self.key, self.pairs[2][0])
+        self.assertEqual(self.pairs[1][0].fileno(), -1)
+        self.assertNotIn(('other.host', 80, False), self.pool.idle)
+
+    def test_disabled_pool_does_not_take_connections(self) -> None:
+        self.pool.max_idle_per_host = 0
+        self.assertFalse(self.pool.release(self.key, self.pairs[0][0]))
+        self.assertNotEqual(self.pairs[0][0].fileno(), -1)
+
+    def test_stats_are_logged(self) -> None:
+        pool = ConnectionPool(max_idle_per_host=1, idle_ttl=30)
+        self.assertIsNone(pool.acquire(self.key))
+        pool.release(self.key, self.pairs[0][0])
+        pool.release(self.key, self.pairs[1][0])
+        self.assertIsNotNone(pool.acquire(self.key))
+        with logged_stats() as logged:
+            Stats.report(1)
+        self.assertEqual(logged['connection-pool']['hit'], 1)
+        self.assertEqual(logged['connection-pool']['miss'], 1)
+        self.assertEqual(logged['connection-pool']['evicted'], 1)
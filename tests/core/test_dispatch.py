@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡ Fast, Lightweight, Programmable Proxy Server in a single Python file.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import unittest
+from collections import Counter
+
+from proxy.core.dispatch import ThreadlessLoad, RoundRobinPolicy, LeastWorksPolicy, LowestLagPolicy
+from proxy.core.dispatch import dispatch_policies
+
+
+class TestThreadlessLoad(unittest.TestCase):
+
+    def test_update_and_read(self) -> None:
+        load = ThreadlessLoad()
+        self.assertEqual(load.works, 0)
+        self.assertEqual(load.lag_ms, 0)
+        self.assertEqual(load.received, 0)
+        load.update(works=5, lag_ms=1.5)
+        load.incr_received(3)
+        load.incr_received()
+        self.assertEqual(load.works, 5)
+        self.assertEqual(load.lag_ms, 1.5)
+        self.assertEqual(load.received, 4)
+
+
+class TestDispatchPolicies(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.loads = [ThreadlessLoad() for _ in range(4)]
+
+    def test_policies_are_registered(self) -> None:
+        self.assertEqual(dispatch_policies['round-robin'], RoundRobinPolicy)
+        self.assertEqual(dispatch_policies['least-works'], LeastWorksPolicy)
+        self.assertEqual(dispatch_policies['lowest-lag'], LowestLagPolicy)
+
+    def test_round_robin_is_fair(self) -> None:
+        policy = RoundRobinPolicy(self.loads)
+        self.loads[0].update(works=100, lag_ms=100)
+        picks = [policy.dispatch() for _ in range(8)]
+        self.assertEqual(picks, [0, 1, 2, 3, 0, 1, 2, 3])
+
+    def test_least_works_spreads_a_batch(self) -> None:
+        policy = LeastWorksPolicy(self.loads)
+        # Reported load is stale during a batch, yet clients
+        # in transit are accounted for.
+        counts = Counter(policy.dispatch() for _ in range(40))
+        self.assertEqual(counts, {0: 10, 1: 10, 2: 10, 3: 10})
+
+    def test_least_works_prefers_idle_loops(self) -> None:
+        policy = LeastWorksPolicy(self.loads)
+        for index, works in enumerate([10, 4, 8, 10]):
+            self.loads[index].update(works=works, lag_ms=0)
+        picks = [policy.dispatch() for _ in range(6)]
+        # Loop 1 catches up with loop 2 and then both are filled evenly
+        self.assertEqual(picks, [1, 1, 1, 1, 1, 2])
+
+    def test_received_clients_are_not_double_counted(self) -> None:
+        policy = LeastWorksPolicy(self.loads[:2])
+        self.assertEqual(policy.dispatch(), 0)
+        self.assertEqual(policy.works(0), 1)
+        # Loop received the client and reported it as one of its works
+        self.loads[0].incr_received()
+        self.loads[0].update(works=1, lag_ms=0)
+        self.assertEqual(policy.works(0), 1)
+        self.assertEqual(policy.dispatch(), 1)
+
+    def test_lowest_lag_avoids_busy_loops(self) -> None:
+        policy = LowestLagPolicy(self.loads)
+        # Loop 0 has fewest works but they are busy streaming data
+        self.loads[0].update(works=1, lag_ms=50)
+        for index in range(1, 4):
+            self.loads[index].update(works=10, lag_ms=1)
+        counts = Counter(policy.dispatch() for _ in range(30))
+        self.assertNotIn(0, counts)
+        self.assertEqual(counts, {1: 10, 2: 10, 3: 10})
+
+    def test_lowest_lag_spreads_across_idle_loops(self) -> None:
+        policy = LowestLagPolicy(self.loads)
+        counts = Counter(policy.dispatch() for _ in range(8))
+        self.assertEqual(counts, {0: 2, 1: 2, 2: 2, 3: 2})
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡ Fast, Lightweight, Programmable Proxy Server in a single Python file.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import select
+import socket
+import unittest
+from typing import Any, Tuple
+from unittest import mock
+
+from proxy.core.connection import TcpServerConnection
+from proxy.core.happy_eyeballs import AddressFamilyStats, interleave
+from proxy.core.per_process import PerProcess
+from proxy.core.stats import Stats
+
+from ..utils import isolate_stats, logged_stats
+
+
+def v4(ip: str, port: int = 443) -> Tuple[Any, ...]:
+    return (socket.AF_INET, socket.SOCK_STREAM, 6, '', (ip, port))
+
+
+def v6(ip: str) -> Tuple[Any, ...]:
+    return (socket.AF_INET6, socket.SOCK_STREAM, 6, '', (ip, 443, 0, 0))
+
+
+class TestInterleave(unittest.TestCase):
+
+    def test_families_alternate_starting_with_first(self) -> None:
+        addrinfos = [v6('::1'), v6('::2'), v6('::3'), v4('10.0.0.1'), v4('10.0.0.2')]
+        self.assertEqual(
+            interleave(addrinfos, None),
+            [v6('::1'), v4('10.0.0.1'), v6('::2'), v4('10.0.0.2'), v6('::3')])
+
+    def test_preferred_family_goes_first(self) -> None:
+        addrinfos = [v6('::1'), v6('::2'), v4('10.0.0.1')]
+        self.assertEqual(
+            interleave(addrinfos, socket.AF_INET),
+            [v4('10.0.0.1'), v6('::1'), v6('::2')])
+
+    def test_single_family_order_is_preserved(self) -> None:
+        addrinfos = [v4('10.0.0.2'), v4('10.0.0.1')]
+        self.assertEqual(interleave(addrinfos, socket.AF_INET6), addrinfos)
+
+
+class TestAddressFamilyStats(unittest.TestCase):
+
+    def setUp(self) -> None:
+        isolate_stats(self)
+        self.stats = Stats('test')
+        self.family_stats = AddressFamilyStats(stats=self.stats)
+
+    def test_last_connected_family_is_preferred(self) -> None:
+        self.assertIsNone(self.family_stats.preferred_family('upstream.host'))
+        self.family_stats.record('upstream.host', socket.AF_INET6, False)
+        self.family_stats.record('upstream.host', socket.AF_INET, True)
+        self.assertEqual(self.family_stats.preferred_family('upstream.host'), socket.AF_INET)
+        self.assertEqual(self.family_stats.hosts['upstream.host'], {
+            socket.AF_INET6: [0, 1],
+            socket.AF_INET: [1, 0],
+        })
+        self.assertEqual(self.stats.counters, {'ipv6_failed': 1, 'ipv4_connected': 1})
+
+    @mock.patch('proxy.core.happy_eyeballs.MAX_TRACKED_HOSTS', 2)
+    def test_least_recently_used_hosts_are_evicted(self) -> None:
+        for host in ('a.host', 'b.host', 'a.host', 'c.host'):
+            self.family_stats.record(host, socket.AF_INET, True)
+        self.assertEqual(list(self.family_stats.hosts.keys()), ['a.host', 'c.host'])
+        self.assertIsNone(self.family_stats.preferred_family('b.host'))
+
+    @mock.patch.dict(PerProcess.registry, clear=True)
+    def test_connection_attempts_are_logged(self) -> None:
+        with socket.socket() as listener, socket.socket() as refusing:
+            listener.bind(('127.0.0.1', 0))
+            listener.listen(1)
+            # Bound but not listening, connections are refused
+            refusing.bind(('127.0.0.1', 0))
+            conn = TcpServerConnection('upstream.host', 443)
+            with mock.patch('socket.getaddrinfo', return_value=[
+                    v4(refusing.getsockname()[0], refusing.getsockname()[1]),
+                    v4(listener.getsockname()[0], listener.getsockname()[1])]):
+                conn.connect(nonblocking=True)
+            while not conn.connected:
+                _, ready, _ = select.select([], list(conn.attempts), [], 1)
+                conn.finish_connect(ready)
+            conn.close()
+        with logged_stats() as logged:
+            Stats.report(1)
+        self.assertEqual(logged['happy-eyeballs']['ipv4_failed'], 1)
+        self.assertEqual(logged['happy-eyeballs']['ipv4_connected'], 1)
+        self.assertIn('connect_ms_p99', logged['happy-eyeballs'])
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡ Fast, Lightweight, Programmable Proxy Server in a single Python file.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import unittest
+from unittest import mock
+
+from proxy.common.flags import Flags
+from proxy.core.connection_pool import ConnectionPool
+from proxy.core.happy_eyeballs import AddressFamilyStats
+from proxy.core.per_process import PerProcess
+from proxy.core.resolver import Resolver
+
+
+class TestPerProcess(unittest.TestCase):
+
+    def setUp(self) -> None:
+        patcher = mock.patch.dict(PerProcess.registry, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_instance_is_kept_for_same_flags(self) -> None:
+        flags = Flags(pool_max_idle_per_host=3)
+        pool = ConnectionPool.get(flags)
+        self.assertIs(ConnectionPool.get(flags), pool)
+        self.assertEqual(pool.max_idle_per_host, 3)
+        # Instances are kept per class
+        self.assertIsNot(Resolver.get(flags), pool)
+        self.assertIs(AddressFamilyStats.get(), AddressFamilyStats.get())
+
+    def test_instance_is_replaced_for_other_flags(self) -> None:
+        pool = ConnectionPool.get(Flags(pool_max_idle_per_host=3))
+        replaced = ConnectionPool.get(Flags(pool_max_idle_per_host=5))
+        self.assertIsNot(replaced, pool)
+        self.assertEqual(replaced.max_idle_per_host, 5)
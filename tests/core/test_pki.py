@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡ Fast, Lightweight, Programmable Proxy Server in a single Python file.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import os
+import shutil
+import datetime
+import tempfile
+import unittest
+import multiprocessing
+from typing import Any, Tuple
+from unittest import mock
+
+from proxy.core.pki import CertificateAuthority, HAS_CRYPTOGRAPHY, HAS_FCNTL, cert_file_path, certificate_name, \
+    subject_alt_names
+from proxy.core.stats import Stats
+
+if HAS_CRYPTOGRAPHY:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+
+def write_key(path: str) -> Any:
+    key = ec.generate_private_key(ec.SECP256R1())
+    with open(path, 'wb') as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.TraditionalOpenSSL,
+            serialization.NoEncryption()))
+    return key
+
+
+def sign_in_new_process(args: Tuple[str, str, str, str]) -> int:
+    """Returns number of certificates signed by a fresh authority."""
+    stats = Stats('test')
+    CertificateAuthority(*args, max_contexts=1, stats=stats).context('example.com')
+    return len(stats.samples.get('sign_ms', []))
+
+
+class TestCertificateName(unittest.TestCase):
+
+    def test_sibling_hosts_share_parent_domain(self) -> None:
+        for host in ('example.com', 'www.example.com', 'api.example.com'):
+            self.assertEqual(certificate_name(host), '*.example.com')
+        self.assertEqual(certificate_name('cdn1.static.example.com'), '*.static.example.com')
+
+    def test_public_suffixes_are_not_wildcarded(self) -> None:
+        self.assertEqual(certificate_name('example.co.uk'), '*.example.co.uk')
+        self.assertEqual(certificate_name('www.example.co.uk'), '*.example.co.uk')
+        self.assertEqual(certificate_name('co.uk'), 'co.uk')
+        self.assertEqual(certificate_name('localhost'), 'localhost')
+
+    def test_ip_addresses_are_not_wildcarded(self) -> None:
+        self.assertEqual(certificate_name('10.0.0.1'), '10.0.0.1')
+        self.assertEqual(certificate_name('::1'), '::1')
+
+    def test_subject_alt_names_for_openssl(self) -> None:
+        self.assertEqual(subject_alt_names('*.example.com'), 'DNS:*.example.com,DNS:example.com')
+        self.assertEqual(subject_alt_names('localhost'), 'DNS:localhost')
+        self.assertEqual(subject_alt_names('10.0.0.1'), 'IP:10.0.0.1')
+
+
+@unittest.skipUnless(HAS_CRYPTOGRAPHY, 'cryptography is not installed')
+class TestCertificateAuthority(unittest.TestCase):
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.ca_cert_dir = os.path.join(directory.name, 'certificates')
+        os.mkdir(self.ca_cert_dir)
+        paths = {name: os.path.join(directory.name, '%s.pem' % name)
+                 for name in ('ca-cert', 'ca-key', 'signing-key')}
+        ca_key = write_key(paths['ca-key'])
+        write_key(paths['signing-key'])
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'proxy.py test CA')])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        self.ca_cert = x509.CertificateBuilder() \
+            .subject_name(name).issuer_name(name) \
+            .public_key(ca_key.public_key()) \
+            .serial_number(1) \
+            .not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1)) \
+            .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True) \
+            .sign(ca_key, hashes.SHA256())
+        with open(paths['ca-cert'], 'wb') as f:
+            f.write(self.ca_cert.public_bytes(serialization.Encoding.PEM))
+        self.args = (paths['ca-cert'], paths['ca-key'], paths['signing-key'], self.ca_cert_dir)
+        self.stats = Stats('test')
+        self.ca = CertificateAuthority(*self.args, max_contexts=2, stats=self.stats)
+
+    def load(self, host: str) -> Any:
+        with open(cert_file_path(self.ca_cert_dir, host), 'rb') as f:
+            return x509.load_pem_x509_certificate(f.read())
+
+    def test_certificate_is_signed_once_and_context_cached(self) -> None:
+        ctx = self.ca.context('example.com')
+        self.assertIs(self.ca.context('example.com'), ctx)
+        self.assertEqual(self.stats.counters, {'miss': 1, 'hit': 1})
+        self.assertEqual(len(self.stats.samples['sign_ms']), 1)
+
+        cert = self.load('example.com')
+        self.assertEqual(cert.issuer, self.ca_cert.subject)
+        cert.verify_directly_issued_by(self.ca_cert)
+        san = cert.extensions.get_extension_for_class(x509.SubjectAlternativeName).value
+        self.assertEqual(san.get_values_for_type(x509.DNSName), ['example.com'])
+
+    def test_ip_address_is_signed_as_ip_san(self) -> None:
+        self.ca.context('10.0.0.1')
+        san = self.load('10.0.0.1').extensions.get_extension_for_class(x509.SubjectAlternativeName).value
+        self.assertEqual([str(ip) for ip in san.get_values_for_type(x509.IPAddress)], ['10.0.0.1'])
+
+    def test_evicted_host_is_reloaded_from_disk(self) -> None:
+        for host in ('a.com', 'b.com', 'a.com', 'c.com'):
+            self.ca.context(host)
+        self.assertEqual(list(self.ca.contexts.keys()), ['a.com', 'c.com'])
+        self.assertEqual(self.stats.counters['evicted'], 1)
+
+        self.ca.context('b.com')
+        self.assertEqual(self.stats.counters['disk_hit'], 1)
+        self.assertEqual(len(self.stats.samples['sign_ms']), 3)
+
+    def test_wildcard_certificate_is_shared_by_siblings(self) -> None:
+        self.ca.wildcard = True
+        ctx = self.ca.context('cdn1.example.com')
+        self.assertIs(self.ca.context('api.example.com'), ctx)
+        self.assertIs(self.ca.context('example.com'), ctx)
+        self.assertEqual(len(self.stats.samples['sign_ms']), 1)
+
+        san = self.load('*.example.com').extensions.get_extension_for_class(x509.SubjectAlternativeName).value
+        self.assertEqual(san.get_values_for_type(x509.DNSName), ['*.example.com', 'example.com'])
+        self.assertTrue(os.path.isfile(os.path.join(self.ca_cert_dir, '_.example.com.pem')))
+
+    @unittest.skipUnless(HAS_FCNTL, 'fcntl is not available')
+    def test_concurrent_processes_sign_once(self) -> None:
+        with multiprocessing.Pool(4) as pool:
+            signed = pool.map(sign_in_new_process, [self.args] * 8)
+        self.assertEqual(sum(signed), 1)
+        self.assertEqual(
+            [name for name in os.listdir(self.ca_cert_dir) if not name.endswith('.lock')],
+            ['example.com.pem'])
+
+    def test_warm_up_loads_contexts(self) -> None:
+        self.ca.warm_up(['a.com', 'b.com'])
+        self.assertEqual(list(self.ca.contexts.keys()), ['a.com', 'b.com'])
+        self.assertTrue(os.path.isfile(cert_file_path(self.ca_cert_dir, 'b.com')))
+
+    @unittest.skipUnless(shutil.which('openssl'), 'openssl is not installed')
+    @mock.patch('proxy.core.pki.HAS_CRYPTOGRAPHY', False)
+    def test_openssl_certificate_carries_subject_alt_names(self) -> None:
+        self.ca.wildcard = True
+        self.ca.context('api.example.com')
+        cert = self.load('*.example.com')
+        cert.verify_directly_issued_by(self.ca_cert)
+        san = cert.extensions.get_extension_for_class(x509.SubjectAlternativeName).value
+        self.assertEqual(san.get_values_for_type(x509.DNSName), ['*.example.com', 'example.com'])
+
+        self.ca.context('10.0.0.1')
+        san = self.load('10.0.0.1').extensions.get_extension_for_class(x509.SubjectAlternativeName).value
+        self.assertEqual([str(ip) for ip in san.get_values_for_type(x509.IPAddress)], ['10.0.0.1'])
+        # Certificates signed within the same second have distinct serials
+        self.assertNotEqual(cert.serial_number, self.load('10.0.0.1').serial_number)
+
+    @mock.patch('proxy.core.pki.HAS_CRYPTOGRAPHY', False)
+    @mock.patch('subprocess.Popen')
+    def test_openssl_failure_raises(self, mock_popen: mock.Mock) -> None:
+        mock_popen.return_value.returncode = 1
+        mock_popen.return_value.communicate.return_value = (None, b'unable to load CA')
+        with self.assertRaises(OSError):
+            self.ca.context('example.com')
+        self.assertEqual(mock_popen.call_count, 2)
+        self.assertEqual(os.listdir(self.ca_cert_dir), ['example.com.pem.lock'])
+        self.assertEqual(len(self.ca.contexts), 0)
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡ Fast, Lightweight, Programmable Proxy Server in a single Python file.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import select
+import socket
+import threading
+import unittest
+from typing import Any, List, Tuple
+from unittest import mock
+
+from proxy.core.resolver import Lookup, Resolver
+from proxy.core.stats import Stats
+
+from ..utils import isolate_stats, logged_stats
+
+ADDRINFOS = [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('10.0.0.1', 80))]
+
+
+class TestResolver(unittest.TestCase):
+
+    def setUp(self) -> None:
+        isolate_stats(self)
+        self.stats = Stats('test')
+        self.resolver = Resolver(threads=2, ttl=60, negative_ttl=5, stats=self.stats)
+        self.unblock = threading.Event()
+        self.unblock.set()
+        self.calls: List[Tuple[Any, ...]] = []
+        self.error: Any = None
+        patcher = mock.patch('socket.getaddrinfo', side_effect=self.getaddrinfo)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def getaddrinfo(self, host: str, port: int, **kwargs: Any) -> List[Tuple[Any, ...]]:
+        if kwargs.get('flags') == socket.AI_NUMERICHOST:
+            if host[0].isdigit():
+                return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (host, port))]
+            raise socket.gaierror(socket.EAI_NONAME, 'Not numeric')
+        self.calls.append((host, port))
+        self.unblock.wait()
+        if self.error is not None:
+            raise self.error
+        return ADDRINFOS
+
+    def wait(self, lookup: Lookup) -> None:
+        assert lookup.reader is not None
+        select.select([lookup.reader], [], [], 1)
+        self.assertTrue(lookup.done())
+
+    def test_ip_address_is_resolved_immediately(self) -> None:
+        lookup = self.resolver.resolve('127.0.0.1', 8899)
+        self.assertTrue(lookup.done())
+        self.assertIsNone(lookup.reader)
+        self.assertEqual(lookup.result()[0][4], ('127.0.0.1', 8899))
+        self.assertEqual(self.calls, [])
+
+    def test_resolved_off_loop_and_cached(self) -> None:
+        lookup = self.resolver.resolve('upstream.host', 80)
+        self.wait(lookup)
+        self.assertEqual(lookup.result(), ADDRINFOS)
+        self.resolver.release(lookup)
+
+        cached = self.resolver.resolve('upstream.host', 80)
+        self.assertTrue(cached.done())
+        self.assertEqual(cached.result(), ADDRINFOS)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.stats.counters['miss'], 1)
+        self.assertEqual(self.stats.counters['hit'], 1)
+        self.assertEqual(len(self.stats.samples['lookup_ms']), 1)
+
+    def test_concurrent_lookups_are_coalesced(self) -> None:
+        self.unblock.clear()
+        lookups = [self.resolver.resolve('upstream.host', 80) for _ in range(3)]
+        self.assertFalse(any(lookup.done() for lookup in lookups))
+        self.unblock.set()
+        for lookup in lookups:
+            self.wait(lookup)
+            self.assertEqual(lookup.result(), ADDRINFOS)
+            self.resolver.release(lookup)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.stats.counters['coalesced'], 2)
+
+    def test_failures_are_negatively_cached(self) -> None:
+        self.error = socket.gaierror(socket.EAI_NONAME, 'Name or service not known')
+        lookup = self.resolver.resolve('unknown.domain', 80)
+        self.wait(lookup)
+        self.resolver.release(lookup)
+        with self.assertRaises(socket.gaierror):
+            lookup.result()
+
+        cached = self.resolver.resolve('unknown.domain', 80)
+        self.assertTrue(cached.done())
+        with self.assertRaises(socket.gaierror):
+            cached.result()
+        self.assertEqual(self.stats.counters['negative_hit'], 1)
+
+        expires = max(entry[0] for entry in self.resolver.cache.values())
+        with mock.patch('time.time', return_value=expires + 1):
+            expired = self.resolver.resolve('unknown.domain', 80)
+        self.assertFalse(expired.done())
+        self.wait(expired)
+        self.resolver.release(expired)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_released_lookup_is_not_notified(self) -> None:
+        self.unblock.clear()
+        abandoned = self.resolver.resolve('upstream.host', 80)
+        self.resolver.release(abandoned)
+        waiting = self.resolver.resolve('upstream.host', 80)
+        self.unblock.set()
+        self.wait(waiting)
+        self.assertFalse(abandoned.done())
+        self.resolver.release(waiting)
+
+    def test_stats_are_logged(self) -> None:
+        resolver = Resolver(threads=1, ttl=60, negative_ttl=5)
+        lookup = resolver.resolve('upstream.host', 80)
+        self.wait(lookup)
+        resolver.release(lookup)
+        resolver.release(resolver.resolve('upstream.host', 80))
+        with logged_stats() as logged:
+            Stats.report(1)
+        self.assertEqual(logged['resolver']['miss'], 1)
+        self.assertEqual(logged['resolver']['hit'], 1)
+        self.assertIn('lookup_ms_p99', logged['resolver'])
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡ Fast, Lightweight, Programmable Proxy Server in a single Python file.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import socket
+import unittest
+
+from proxy.core.splice import SplicePipe, splice_supported
+
+
+@unittest.skipUnless(splice_supported(), 'splice(2) is not supported')
+class TestSplicePipe(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.src, self.src_peer = socket.socketpair()
+        self.dst, self.dst_peer = socket.socketpair()
+        self.src.setblocking(False)
+        self.dst.setblocking(False)
+        self.relay = SplicePipe(self.src, self.dst)
+
+    def tearDown(self) -> None:
+        self.relay.close()
+        for sock in (self.src, self.src_peer, self.dst, self.dst_peer):
+            sock.close()
+
+    def test_relays_data(self) -> None:
+        self.assertTrue(self.relay.wants_read())
+        self.assertFalse(self.relay.wants_write())
+        self.assertEqual(self.relay.fill(), 0)
+
+        self.src_peer.sendall(b'hello')
+        self.assertEqual(self.relay.fill(), 5)
+        self.assertTrue(self.relay.wants_write())
+        self.assertEqual(self.relay.drain(), 5)
+        self.assertEqual(self.dst_peer.recv(1024), b'hello')
+        self.assertEqual(self.relay.total, 5)
+        self.assertFalse(self.relay.done())
+
+    def test_pending_data_is_relayed_after_eof(self) -> None:
+        self.src_peer.sendall(b'bye')
+        self.src_peer.close()
+        self.relay.fill()
+        self.relay.fill()
+        self.assertTrue(self.relay.eof)
+        self.assertFalse(self.relay.wants_read())
+        self.assertFalse(self.relay.done())
+        self.relay.drain()
+        self.assertTrue(self.relay.done())
+        self.assertEqual(self.dst_peer.recv(1024), b'bye')
+
+    def test_drain_raises_once_dst_is_closed(self) -> None:
+        self.dst_peer.close()
+        self.src_peer.sendall(b'hello')
+        self.relay.fill()
+        with self.assertRaises(OSError):
+            self.relay.drain()
+        self.assertEqual(self.relay.pending, 5)
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡ Fast, Lightweight, Programmable Proxy Server in a single Python file.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import unittest
+from unittest import mock
+
+from proxy.core.stats import Stats
+
+from ..utils import isolate_stats, logged_stats
+
+
+class TestStats(unittest.TestCase):
+
+    def setUp(self) -> None:
+        isolate_stats(self)
+
+    def test_get_returns_named_instance(self) -> None:
+        self.assertIs(Stats.get('test-stats'), Stats.get('test-stats'))
+        self.assertIsNot(Stats.get('test-stats'), Stats.get('test-stats-2'))
+
+    @mock.patch('time.time')
+    def test_snapshot(self, mock_time: mock.Mock) -> None:
+        mock_time.return_value = 100.0
+        stats = Stats('test', max_samples=100)
+        stats.incr('accepted', 10)
+        for i in range(1, 101):
+            stats.observe('latency_ms', i)
+        mock_time.return_value = 102.0
+        snapshot = stats.snapshot()
+        self.assertEqual(snapshot['accepted'], 10)
+        self.assertEqual(snapshot['accepted_per_sec'], 5)
+        self.assertEqual(snapshot['latency_ms_p50'], 51)
+        self.assertEqual(snapshot['latency_ms_p99'], 100)
+
+        # Rate is computed since last snapshot
+        stats.incr('accepted', 4)
+        mock_time.return_value = 104.0
+        snapshot = stats.snapshot()
+        self.assertEqual(snapshot['accepted'], 14)
+        self.assertEqual(snapshot['accepted_per_sec'], 2)
+
+    def test_gauges_report_current_value(self) -> None:
+        stats = Stats('test')
+        stats.gauge('queue_depth', 5)
+        stats.gauge('queue_depth', 2)
+        snapshot = stats.snapshot()
+        self.assertEqual(snapshot['queue_depth'], 2)
+        self.assertNotIn('queue_depth_per_sec', snapshot)
+
+    def test_samples_are_bounded(self) -> None:
+        stats = Stats('test', max_samples=10)
+        for i in range(100):
+            stats.observe('latency_ms', i)
+        self.assertEqual(len(stats.samples['latency_ms']), 10)
+        self.assertEqual(stats.percentile('latency_ms', 0), 90)
+
+    def test_report_respects_interval(self) -> None:
+        Stats.get('test-stats').incr('accepted')
+        with logged_stats() as logged:
+            Stats.report(0)
+        self.assertEqual(logged, {})
+        with logged_stats() as logged:
+            Stats.report(10)
+        self.assertEqual(logged['test-stats']['accepted'], 1)
+        with logged_stats() as logged:
+            Stats.report(10)
+        self.assertEqual(logged, {})
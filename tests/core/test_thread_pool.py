@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡ Fast, Lightweight, Programmable Proxy Server in a single Python file.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import socket
+import threading
+import unittest
+from unittest import mock
+from typing import Callable, List, Tuple
+
+from proxy.common.flags import Flags
+from proxy.core.stats import Stats
+from proxy.core.thread_pool import ThreadPool
+
+
+class TestThreadPool(unittest.TestCase):
+
+    @mock.patch('threading.Thread')
+    def setUp(self, mock_thread: mock.Mock) -> None:
+        self.flags = Flags(
+            thread_pool_size=2,
+            thread_pool_max_inflight=2,
+            thread_pool_queue_size=1)
+        self.stats = Stats('test-thread-pool')
+        self.work_klass = mock.MagicMock()
+        self.pool = ThreadPool(
+            flags=self.flags, work_klass=self.work_klass, stats=self.stats)
+        self.pool.start()
+        self.assertEqual(mock_thread.return_value.start.call_count, 2)
+        self.pairs = [socket.socketpair() for _ in range(4)]
+
+    def tearDown(self) -> None:
+        for loop in self.pool.loops:
+            for fileno, _ in loop.clients:
+                socket.socket(fileno=fileno).close()
+            assert loop.client_queue is not None
+            loop.client_queue.close()
+        for queue in self.pool.client_queues:
+            queue.close()
+        for fileno, _, _ in self.pool.queue:
+            socket.socket(fileno=fileno).close()
+        for a, b in self.pairs:
+            a.close()
+            b.close()
+
+    def accepted(self) -> List[Tuple[socket.socket, Tuple[str, int]]]:
+        return [(conn, ('127.0.0.1', port)) for port, (conn, _) in enumerate(self.pairs)]
+
+    def test_submit_dispatches_queues_and_rejects(self) -> None:
+        filenos = [conn.fileno() for conn, _ in self.pairs]
+        self.pool.submit(self.accepted())
+
+        # Round robin across pool threads, each woken up once
+        for index, loop in enumerate(self.pool.loops):
+            self.assertEqual(list(loop.clients), [(filenos[index], ('127.0.0.1', index))])
+            assert loop.client_queue is not None
+            self.assertTrue(loop.client_queue.poll())
+            loop.client_queue.recv_bytes()
+            self.assertFalse(loop.client_queue.poll())
+        # Third client waits, fourth is rejected
+        self.assertEqual([(fileno, addr) for fileno, addr, _ in self.pool.queue],
+                         [(filenos[2], ('127.0.0.1', 2))])
+        self.assertEqual(self.pairs[3][0].fileno(), -1)
+        snapshot = self.stats.snapshot()
+        self.assertEqual(snapshot['threads'], 2)
+        self.assertEqual(snapshot['inflight'], 2)
+        self.assertEqual(snapshot['queue_depth'], 1)
+        self.assertEqual(snapshot['dispatched'], 2)
+        self.assertEqual(snapshot['queued'], 1)
+        self.assertEqual(snapshot['rejected'], 1)
+
+        # Finished work makes room for the waiting client
+        self.pool.done()
+        self.assertEqual(len(self.pool.queue), 0)
+        self.assertEqual(self.pool.inflight, 2)
+        self.assertEqual(self.pool.loops[0].clients[-1], (filenos[2], ('127.0.0.1', 2)))
+        snapshot = self.stats.snapshot()
+        self.assertEqual(snapshot['queue_depth'], 0)
+        self.assertIn('queue_wait_ms_p50', snapshot)
+
+    @mock.patch('os.close')
+    def test_pool_threads_are_woken_once_without_holding_lock(self, mock_os_close: mock.Mock) -> None:
+        self.flags.thread_pool_max_inflight = 0
+        woken: List[int] = []
+
+        def wakeup(index: int) -> Callable[[bytes], None]:
+            def send_bytes(_: bytes) -> None:
+                # Pool threads must be able to take lock meanwhile
+                self.assertFalse(self.pool.lock.locked())
+                woken.append(index)
+            return send_bytes
+
+        for index, queue in enumerate(self.pool.client_queues):
+            self.addCleanup(queue.close)
+            self.pool.client_queues[index] = mock.MagicMock(
+                send_bytes=mock.MagicMock(side_effect=wakeup(index)))
+        self.pool.submit(self.accepted()[:2])
+        self.pool.submit(self.accepted()[2:])
+        # Wakeups are still pending, pool threads are not woken again
+        self.assertEqual(woken, [0, 1])
+
+        work = self.work_klass.return_value
+        work.get_events.return_value = {}
+        work.deadline.return_value = None
+        loop = self.pool.loops[0]
+        loop.selector = mock.MagicMock()
+        loop.accept_client()
+        self.pool.queue.append((self.pairs[0][1].fileno(), ('127.0.0.1', 4), 0))
+        self.pool.done()
+        self.assertEqual(woken, [0, 1, 0])
+        loop.clients.clear()
+
+    @mock.patch('os.close')
+    def test_pool_thread_creates_works_and_reports_done(self, mock_os_close: mock.Mock) -> None:
+        self.flags.thread_pool_max_inflight = 0
+        loop = self.pool.loops[0]
+        work_id = self.pairs[0][0].fileno()
+        self.pool.submit(self.accepted()[:1])
+        self.pool.submit(self.accepted()[2:3])
+        self.assertEqual(self.pool.inflight, 2)
+        work = self.work_klass.return_value
+        work.get_events.return_value = {}
+        work.deadline.return_value = None
+        loop.selector = mock.MagicMock()
+
+        loop.accept_client()
+        self.work_klass.assert_called_once_with(
+            fileno=work_id, addr=('127.0.0.1', 0), flags=self.flags, event_queue=None)
+        self.assertEqual(len(loop.clients), 0)
+        assert loop.client_queue is not None
+        self.assertFalse(loop.client_queue.poll())
+        assert loop.load is not None
+        self.assertEqual(loop.load.received, 1)
+
+        loop.cleanup(work_id)
+        mock_os_close.assert_called_once_with(work_id)
+        self.assertEqual(self.pool.inflight, 1)
+        socket.socket(fileno=work_id).close()
+
+    def test_pool_thread_stops_on_shutdown(self) -> None:
+        loop = self.pool.loops[0]
+        loop.running = True
+        self.pool.client_queues[0].close()
+        loop.accept_client()
+        self.assertFalse(loop.running)
+
+    @mock.patch('socket.fromfd')
+    def test_pool_thread_uses_client_queue_directly(self, mock_fromfd: mock.Mock) -> None:
+        loop = self.pool.loops[0]
+        thread = threading.Thread(target=loop.run)
+        thread.start()
+        self.pool.client_queues[0].close()
+        thread.join(timeout=5)
+        self.assertFalse(thread.is_alive())
+        mock_fromfd.assert_not_called()
+        self.assertIsNone(loop.client_sock)
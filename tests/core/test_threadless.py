@@ -0,0 +1,392 @@
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡ Fast, Lightweight, Programmable Proxy Server in a single Python file.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import os
+import array
+import asyncio
+import socket
+import selectors
+import unittest
+import multiprocessing
+from unittest import mock
+from typing import Dict
+
+from proxy.common.flags import Flags
+from proxy.common.constants import DEFAULT_IPV4_HOSTNAME
+from proxy.core.threadless import Threadless, send_clients, recv_clients, BATCHED_HANDOFF, MAX_SELECT_TIMEOUT, \
+    HANDOFF_ADDR, HANDOFF_HEADER
+from proxy.core.dispatch import ThreadlessLoad
+from proxy.core.stats import Stats
+
+from ..utils import isolate_stats, logged_stats
+
+
+@unittest.skipIf(not BATCHED_HANDOFF, 'SCM_RIGHTS not supported')
+class TestClientHandoff(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.sender, self.receiver = socket.socketpair()
+        self.clients = [socket.socketpair() for _ in range(3)]
+
+    def tearDown(self) -> None:
+        self.sender.close()
+        self.receiver.close()
+        for a, b in self.clients:
+            a.close()
+            b.close()
+
+    def test_send_and_recv_batch(self) -> None:
+        addrs = [('127.0.0.1', 54382), ('::1', 8899), ('10.0.0.1', 443)]
+        send_clients(
+            self.sender,
+            [(self.clients[i][0].fileno(), addrs[i]) for i in range(3)])
+        received = recv_clients(self.receiver)
+        self.assertEqual([addr for _, addr in received], addrs)
+        # Received descriptors are usable duplicates of the sent ones
+        for i, (fileno, _) in enumerate(received):
+            self.assertNotEqual(fileno, self.clients[i][0].fileno())
+            os.write(fileno, b'hello')
+            self.assertEqual(self.clients[i][1].recv(5), b'hello')
+            os.close(fileno)
+
+    @mock.patch('proxy.core.threadless.MAX_CLIENTS_PER_HANDOFF', 2)
+    def test_large_batches_are_chunked(self) -> None:
+        send_clients(
+            self.sender,
+            [(a.fileno(), ('127.0.0.1', i)) for i, (a, _) in enumerate(self.clients)])
+        first = recv_clients(self.receiver)
+        second = recv_clients(self.receiver)
+        self.assertEqual(len(first), 2)
+        self.assertEqual(len(second), 1)
+        self.assertEqual(second[0][1], ('127.0.0.1', 2))
+        for fileno, _ in first + second:
+            os.close(fileno)
+
+    @mock.patch('os.close', wraps=os.close)
+    def test_batch_with_missing_descriptors_is_dropped(self, mock_os_close: mock.Mock) -> None:
+        payload = b''.join(
+            HANDOFF_ADDR.pack(9, i) + b'127.0.0.1' for i in range(2))
+        self.sender.sendmsg(
+            [HANDOFF_HEADER.pack(2, len(payload)) + payload],
+            [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', [self.clients[0][0].fileno()]))])
+        send_clients(self.sender, [(self.clients[1][0].fileno(), ('127.0.0.1', 2))])
+        self.assertEqual(recv_clients(self.receiver), [])
+        # Received descriptor has been closed
+        mock_os_close.assert_called_once()
+        # Next batch is still received intact
+        received = recv_clients(self.receiver)
+        self.assertEqual([addr for _, addr in received], [('127.0.0.1', 2)])
+        os.close(received[0][0])
+
+    def test_truncated_batch_is_dropped(self) -> None:
+        send_clients(self.sender, [(self.clients[0][0].fileno(), ('127.0.0.1', 1))])
+        # Room for the header but not for the descriptor
+        with mock.patch('socket.CMSG_SPACE', return_value=0):
+            self.assertEqual(recv_clients(self.receiver), [])
+
+    def test_threadless_drains_all_pending_batches(self) -> None:
+        pipe = multiprocessing.Pipe()
+        work_klass = mock.MagicMock()
+        work_klass.return_value.deadline.return_value = None
+        load = ThreadlessLoad()
+        threadless = Threadless(
+            client_queue=pipe[1], flags=Flags(), work_klass=work_klass, load=load)
+        threadless.selector = selectors.DefaultSelector()
+        threadless.client_sock = socket.fromfd(
+            pipe[1].fileno(), socket.AF_UNIX, socket.SOCK_STREAM)
+        sender = socket.fromfd(
+            pipe[0].fileno(), socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            send_clients(sender, [(self.clients[0][0].fileno(), ('127.0.0.1', 1))])
+            send_clients(sender, [(self.clients[1][0].fileno(), ('127.0.0.1', 2)),
+                                  (self.clients[2][0].fileno(), ('127.0.0.1', 3))])
+            threadless.accept_client()
+            self.assertEqual(len(threadless.works), 3)
+            self.assertEqual(work_klass.call_count, 3)
+            self.assertEqual(
+                [c[1]['addr'] for c in work_klass.call_args_list],
+                [('127.0.0.1', 1), ('127.0.0.1', 2), ('127.0.0.1', 3)])
+            self.assertFalse(pipe[1].poll())
+            # Received clients are reported back to the acceptor
+            self.assertEqual(load.received, 3)
+            threadless.report_load(2.5)
+            self.assertEqual(load.works, 3)
+            self.assertEqual(load.lag_ms, 2.5)
+        finally:
+            for fileno in threadless.works:
+                os.close(fileno)
+            sender.close()
+            threadless.client_sock.close()
+            pipe[0].close()
+            pipe[1].close()
+
+
+class TestThreadlessLocalExecutor(unittest.TestCase):
+
+    def test_accepts_connections_from_listener(self) -> None:
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind((str(DEFAULT_IPV4_HOSTNAME), 0))
+        listener.listen(10)
+        listener.setblocking(False)
+        clients = [socket.create_connection(listener.getsockname()) for _ in range(2)]
+        work_klass = mock.MagicMock()
+        work_klass.return_value.deadline.return_value = None
+        flags = Flags(hostname=DEFAULT_IPV4_HOSTNAME, accept_batch_size=16)
+        threadless = Threadless(
+            client_queue=None, flags=flags, work_klass=work_klass, listener=listener)
+        threadless.selector = selectors.DefaultSelector()
+        try:
+            threadless.accept_connections()
+            self.assertEqual(len(threadless.works), 2)
+            self.assertEqual(work_klass.call_count, 2)
+            for client in clients:
+                work_klass.assert_any_call(
+                    fileno=mock.ANY,
+                    addr=client.getsockname(),
+                    flags=flags,
+                    event_queue=None)
+            work_klass.return_value.initialize.assert_called()
+            # Backlog is drained
+            threadless.accept_connections()
+            self.assertEqual(work_klass.call_count, 2)
+        finally:
+            for fileno in threadless.works:
+                os.close(fileno)
+            for client in clients:
+                client.close()
+            listener.close()
+
+
+class TestThreadlessRegistrations(unittest.TestCase):
+
+    def setUp(self) -> None:
+        isolate_stats(self)
+        self.threadless = Threadless(
+            client_queue=None, flags=Flags(), work_klass=mock.MagicMock())
+        self.threadless.selector = mock.MagicMock(wraps=selectors.DefaultSelector())
+        self.selector = self.threadless.selector
+        self.pairs = [socket.socketpair() for _ in range(2)]
+        self.work = mock.MagicMock()
+        self.work_id = self.pairs[0][0].fileno()
+        self.threadless.works[self.work_id] = self.work
+
+    def tearDown(self) -> None:
+        for a, b in self.pairs:
+            a.close()
+            b.close()
+
+    def registered(self) -> Dict[int, int]:
+        return {key.fd: key.events for key in self.selector.get_map().values()}
+
+    def test_registrations_persist_until_interest_changes(self) -> None:
+        client, server = self.pairs[0][0], self.pairs[1][0]
+        self.work.get_events.return_value = {client: selectors.EVENT_READ}
+        self.threadless.update_registrations(self.work_id)
+        self.selector.register.assert_called_once_with(
+            client, selectors.EVENT_READ, self.work_id)
+
+        # Unchanged interest costs nothing
+        self.work.get_events.return_value = {client: selectors.EVENT_READ}
+        self.threadless.update_registrations(self.work_id)
+        self.selector.register.assert_called_once()
+        self.selector.modify.assert_not_called()
+        self.selector.unregister.assert_not_called()
+
+        # Changed interest is modified in place, new descriptors registered
+        self.work.get_events.return_value = {
+            client: selectors.EVENT_READ | selectors.EVENT_WRITE,
+            server: selectors.EVENT_READ,
+        }
+        self.threadless.update_registrations(self.work_id)
+        self.selector.modify.assert_called_once_with(
+            client, selectors.EVENT_READ | selectors.EVENT_WRITE, self.work_id)
+        self.assertEqual(self.registered(), {
+            client.fileno(): selectors.EVENT_READ | selectors.EVENT_WRITE,
+            server.fileno(): selectors.EVENT_READ,
+        })
+
+        # Descriptors no longer of interest are unregistered
+        self.work.get_events.return_value = {client: selectors.EVENT_READ}
+        self.threadless.update_registrations(self.work_id)
+        self.selector.unregister.assert_called_once_with(server.fileno())
+        self.assertEqual(self.registered(), {client.fileno(): selectors.EVENT_READ})
+
+    def test_replaced_connection_object_is_reregistered(self) -> None:
+        client = self.pairs[0][0]
+        self.work.get_events.return_value = {client: selectors.EVENT_READ}
+        self.threadless.update_registrations(self.work_id)
+        # e.g. connection wrapped by work, same descriptor different object
+        wrapped = mock.MagicMock()
+        wrapped.fileno.return_value = client.fileno()
+        self.work.get_events.return_value = {wrapped: selectors.EVENT_READ}
+        self.threadless.update_registrations(self.work_id)
+        key = self.selector.get_map()[client.fileno()]
+        self.assertIs(key.fileobj, wrapped)
+        self.assertEqual(key.data, self.work_id)
+
+    def test_reused_descriptor_is_not_unregistered_by_previous_owner(self) -> None:
+        client = self.pairs[0][0]
+        self.work.get_events.return_value = {client: selectors.EVENT_READ}
+        self.threadless.update_registrations(self.work_id)
+        # Descriptor now belongs to another work
+        other, other_id = mock.MagicMock(), self.pairs[1][0].fileno()
+        self.threadless.works[other_id] = other
+        reused = mock.MagicMock()
+        reused.fileno.return_value = client.fileno()
+        other.get_events.return_value = {reused: selectors.EVENT_READ}
+        self.threadless.update_registrations(other_id)
+        # Previous owner no longer declares interest
+        self.work.get_events.return_value = {}
+        self.threadless.update_registrations(self.work_id)
+        key = self.selector.get_map()[client.fileno()]
+        self.assertIs(key.fileobj, reused)
+        self.assertEqual(key.data, other_id)
+
+    @mock.patch('os.close')
+    def test_cleanup_unregisters_before_shutdown(self, mock_os_close: mock.Mock) -> None:
+        client = self.pairs[0][0]
+        self.work.get_events.return_value = {client: selectors.EVENT_READ}
+        self.threadless.update_registrations(self.work_id)
+
+        def shutdown() -> None:
+            self.assertEqual(self.registered(), {})
+        self.work.shutdown.side_effect = shutdown
+        self.threadless.cleanup(self.work_id)
+        self.work.shutdown.assert_called_once()
+        self.assertNotIn(self.work_id, self.threadless.registrations)
+        mock_os_close.assert_called_once_with(self.work_id)
+
+    def test_run_once_only_dispatches_ready_works(self) -> None:
+        self.threadless.loop = asyncio.new_event_loop()
+        other = mock.MagicMock()
+        other_id = self.pairs[1][0].fileno()
+        self.threadless.works[other_id] = other
+        for (work_id, work), (conn, _) in zip(
+                ((self.work_id, self.work), (other_id, other)), self.pairs):
+            work.get_events.return_value = {conn: selectors.EVENT_READ}
+            work.handle_events.return_value = False
+            work.is_inactive.return_value = False
+            work.deadline.return_value = None
+            self.threadless.update_registrations(work_id)
+        try:
+            self.pairs[1][1].send(b'ready')
+            self.threadless.run_once()
+            self.work.handle_events.assert_not_called()
+            other.handle_events.assert_called_once_with([self.pairs[1][0]], [])
+        finally:
+            self.threadless.loop.close()
+
+    def test_run_once_logs_stats(self) -> None:
+        self.threadless.flags = Flags(stats_interval=1)
+        self.threadless.loop = asyncio.new_event_loop()
+        self.work.get_events.return_value = {self.pairs[0][0]: selectors.EVENT_READ}
+        self.work.handle_events.return_value = False
+        self.work.deadline.return_value = None
+        self.threadless.update_registrations(self.work_id)
+        Stats.get('test-threadless').incr('handled')
+        try:
+            self.pairs[0][1].send(b'ready')
+            with logged_stats() as logged:
+                self.threadless.run_once()
+        finally:
+            self.threadless.loop.close()
+        self.assertEqual(logged['test-threadless']['handled'], 1)
+
+
+class TestThreadlessDeadlines(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.threadless = Threadless(
+            client_queue=None, flags=Flags(), work_klass=mock.MagicMock())
+        self.threadless.selector = mock.MagicMock()
+        self.works = [mock.MagicMock(uid='work-%d' % i) for i in range(3)]
+        for work_id, work in enumerate(self.works):
+            self.threadless.works[work_id] = work
+
+    @mock.patch('time.time')
+    def test_only_expired_works_are_checked(self, mock_time: mock.Mock) -> None:
+        mock_time.return_value = 100
+        for work, deadline in zip(self.works, (105, 110, 120)):
+            work.deadline.return_value = deadline
+        for work_id in range(3):
+            self.threadless.schedule(work_id)
+        self.assertEqual(self.threadless.select_timeout(), MAX_SELECT_TIMEOUT)
+
+        mock_time.return_value = 104.5
+        self.assertEqual(self.threadless.select_timeout(), 0.5)
+        self.threadless.cleanup_inactive()
+        for work in self.works:
+            work.is_inactive.assert_not_called()
+
+        mock_time.return_value = 111
+        self.works[0].is_inactive.return_value = True
+        self.works[1].is_inactive.return_value = True
+        with mock.patch.object(self.threadless, 'cleanup') as mock_cleanup:
+            self.threadless.cleanup_inactive()
+        self.assertEqual(mock_cleanup.call_args_list, [mock.call(0), mock.call(1)])
+        self.works[2].is_inactive.assert_not_called()
+        self.assertEqual(self.threadless.select_timeout(), MAX_SELECT_TIMEOUT)
+
+    @mock.patch('time.time')
+    def test_active_works_are_rescheduled(self, mock_time: mock.Mock) -> None:
+        mock_time.return_value = 100
+        work = self.works[0]
+        work.deadline.return_value = 110
+        self.threadless.schedule(0)
+        # Activity moves deadline further away, nothing is rescheduled yet
+        work.deadline.return_value = 115
+        self.threadless.schedule(0)
+        self.assertEqual(len(self.threadless.timers), 1)
+
+        mock_time.return_value = 110
+        work.is_inactive.return_value = False
+        self.threadless.cleanup_inactive()
+        work.is_inactive.assert_called_once()
+        # Interest is refreshed, timers can start new connection attempts
+        work.get_events.assert_called_once()
+        self.assertEqual(self.threadless.deadlines[0], 115)
+
+        # Expired deadline of a work which isn't inactive yet
+        # (e.g. pending buffer) is polled
+        mock_time.return_value = 115
+        self.threadless.cleanup_inactive()
+        self.assertEqual(self.threadless.deadlines[0], 115 + MAX_SELECT_TIMEOUT)
+
+    @mock.patch('time.time')
+    def test_earlier_deadline_is_rescheduled(self, mock_time: mock.Mock) -> None:
+        mock_time.return_value = 100
+        work = self.works[0]
+        work.deadline.return_value = 130
+        self.threadless.schedule(0)
+        work.deadline.return_value = 105
+        self.threadless.schedule(0)
+        self.assertEqual(self.threadless.deadlines[0], 105)
+
+        mock_time.return_value = 131
+        work.is_inactive.return_value = False
+        self.threadless.cleanup_inactive()
+        # Stale entry for 130 is skipped
+        work.is_inactive.assert_called_once()
+
+    @mock.patch('time.time')
+    def test_reused_work_id_ignores_stale_deadline(self, mock_time: mock.Mock) -> None:
+        mock_time.return_value = 100
+        self.works[0].deadline.return_value = 105
+        self.threadless.schedule(0)
+        # Work finished and its file descriptor was reused by a new work
+        self.threadless.deadlines.pop(0)
+        new_work = mock.MagicMock(uid='new-work')
+        new_work.deadline.return_value = 105
+        self.threadless.works[0] = new_work
+        self.threadless.schedule(0)
+        mock_time.return_value = 106
+        new_work.is_inactive.return_value = False
+        self.threadless.cleanup_inactive()
+        new_work.is_inactive.assert_called_once()
+        self.works[0].is_inactive.assert_not_called()
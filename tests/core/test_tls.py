@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡ Fast, Lightweight, Programmable Proxy Server in a single Python file.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import os
+import ssl
+import time
+import socket
+import tempfile
+import unittest
+from unittest import mock
+
+from proxy.common.flags import Flags
+from proxy.core.per_process import PerProcess
+from proxy.core.stats import Stats
+from proxy.core.tls import ClientSessionCache, ServerContextCache
+
+from ..utils import isolate_stats, logged_stats
+
+
+class TestServerContextCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.certfile = os.path.join(directory.name, 'cert.pem')
+        self.keyfile = os.path.join(directory.name, 'key.pem')
+        for path in (self.certfile, self.keyfile):
+            with open(path, 'w') as f:
+                f.write(path)
+        self.stats = Stats('test')
+        self.contexts = ServerContextCache(stats=self.stats)
+
+    @mock.patch('proxy.core.tls.build_server_context')
+    def test_context_is_built_once_until_files_change(self, mock_build: mock.Mock) -> None:
+        mock_build.side_effect = lambda *args: mock.MagicMock(spec=ssl.SSLContext)
+        ctx = self.contexts.context(self.certfile, self.keyfile)
+        self.assertIs(self.contexts.context(self.certfile, self.keyfile), ctx)
+        mock_build.assert_called_once_with(self.certfile, self.keyfile)
+
+        stat = os.stat(self.keyfile)
+        os.utime(self.keyfile, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        reloaded = self.contexts.context(self.certfile, self.keyfile)
+        self.assertIsNot(reloaded, ctx)
+        self.assertIs(self.contexts.context(self.certfile, self.keyfile), reloaded)
+        self.assertEqual(mock_build.call_count, 2)
+        self.assertEqual(self.stats.counters['context_loaded'], 2)
+
+    @mock.patch('ssl.create_default_context')
+    def test_built_context_issues_session_tickets(self, mock_create: mock.Mock) -> None:
+        mock_create.return_value.options = ssl.OP_NO_TICKET
+        ctx = self.contexts.context(self.certfile, self.keyfile)
+        mock_create.assert_called_once_with(ssl.Purpose.CLIENT_AUTH)
+        self.assertFalse(ctx.options & ssl.OP_NO_TICKET)
+        self.assertTrue(ctx.options & ssl.OP_NO_TLSv1_1)
+        self.assertEqual(ctx.verify_mode, ssl.CERT_NONE)
+        mock_create.return_value.load_cert_chain.assert_called_once_with(
+            certfile=self.certfile, keyfile=self.keyfile)
+
+    def test_missing_files_raise(self) -> None:
+        with self.assertRaises(FileNotFoundError):
+            self.contexts.context(self.certfile + '.missing', self.keyfile)
+
+
+def upstream_connection(reused: bool = False, has_ticket: bool = True, version: str = 'TLSv1.3') -> mock.Mock:
+    conn = mock.MagicMock(spec=ssl.SSLSocket)
+    conn.session_reused = reused
+    conn.session.has_ticket = has_ticket
+    conn.session.id = b'id'
+    conn.session.time = int(time.time())
+    conn.session.timeout = 7200
+    conn.version.return_value = version
+    return conn
+
+
+class TestClientSessionCache(unittest.TestCase):
+
+    def setUp(self) -> None:
+        isolate_stats(self)
+        self.stats = Stats('test')
+        self.sessions = ClientSessionCache(max_sessions=2, ttl=60, stats=self.stats)
+
+    @mock.patch('proxy.core.tls.build_client_context')
+    def test_stored_session_is_offered_on_next_connection(self, mock_build: mock.Mock) -> None:
+        sock = mock.MagicMock(spec=socket.socket)
+        self.sessions.wrap(sock, ('example.com', 443))
+        mock_build.return_value.wrap_socket.assert_called_with(
+            sock, server_hostname='example.com', do_handshake_on_connect=False, session=None)
+
+        conn = upstream_connection()
+        self.sessions.handshake_completed(conn, ('example.com', 443))
+        self.sessions.wrap(sock, ('example.com', 443))
+        mock_build.return_value.wrap_socket.assert_called_with(
+            sock, server_hostname='example.com', do_handshake_on_connect=False, session=conn.session)
+        mock_build.assert_called_once_with()
+
+        self.sessions.handshake_completed(upstream_connection(reused=True), ('example.com', 443))
+        self.assertEqual(self.stats.counters, {
+            'session_miss': 1, 'session_hit': 1, 'full_handshake': 1, 'resumed': 1})
+        self.assertEqual(self.stats.gauges['resumed_ratio'], 0.5)
+
+    def test_session_expires_after_ttl(self) -> None:
+        self.sessions.store(upstream_connection(), ('example.com', 443))
+        with mock.patch('time.time', return_value=time.time() + 61):
+            self.assertIsNone(self.sessions.session(('example.com', 443)))
+        self.assertEqual(self.stats.counters['session_expired'], 1)
+        self.assertEqual(len(self.sessions.sessions), 0)
+
+    def test_only_resumable_sessions_are_kept(self) -> None:
+        self.sessions.store(upstream_connection(has_ticket=False), ('a.com', 443))
+        self.assertEqual(len(self.sessions.sessions), 0)
+        self.sessions.store(upstream_connection(has_ticket=False, version='TLSv1.2'), ('b.com', 443))
+        self.assertEqual(list(self.sessions.sessions.keys()), [('b.com', 443)])
+
+    def test_least_recently_used_session_is_evicted(self) -> None:
+        for host in ('a.com', 'b.com'):
+            self.sessions.store(upstream_connection(), (host, 443))
+        self.assertIsNotNone(self.sessions.session(('a.com', 443)))
+        self.sessions.store(upstream_connection(), ('c.com', 443))
+        self.assertEqual(list(self.sessions.sessions.keys()), [('a.com', 443), ('c.com', 443)])
+        self.assertEqual(self.stats.counters['evicted'], 1)
+
+    @mock.patch.dict(PerProcess.registry, clear=True)
+    def test_resumption_stats_are_logged(self) -> None:
+        sessions = ClientSessionCache.get(Flags())
+        sessions.handshake_completed(upstream_connection(), ('example.com', 443))
+        sessions.handshake_completed(upstream_connection(reused=True), ('example.com', 443))
+        with logged_stats() as logged:
+            Stats.report(1)
+        self.assertEqual(logged['upstream-tls']['resumed'], 1)
+        self.assertEqual(logged['upstream-tls']['resumed_ratio'], 0.5)
@@ -7,15 +7,31 @@
     :copyright: (c) 2013-present by Abhinav Singh and contributors.
     :license: BSD, see LICENSE for more details.
 """
+import time
+import select
+import socket
 import unittest
 import selectors
+from typing import List, Union
 from unittest import mock
 
 from proxy.common.flags import Flags
+from proxy.common.types import HasFileno
+from proxy.core.bypass import InterceptionBypass
+from proxy.core.connection import TcpClientConnection, TcpServerConnection
+from proxy.core.connection_pool import ConnectionPool
+from proxy.core.stats import Stats
+from proxy.core.splice import splice_supported
+from proxy.http.devtools import DevtoolsProtocolPlugin
+from proxy.http.methods import httpMethods
+from proxy.http.parser import HttpParser, httpParserTypes
 from proxy.http.proxy import HttpProxyPlugin
 from proxy.http.handler import HttpProtocolHandler
 from proxy.http.exception import HttpProtocolException
-from proxy.common.utils import build_http_request
+from proxy.common.utils import build_http_request, build_http_response
+from proxy.http.codes import httpStatusCodes
+
+from ..utils import isolate_stats, logged_stats
 
 
 class TestHttpProxyPlugin(unittest.TestCase):
@@ -89,3 +105,248 @@ class TestHttpProxyPlugin(unittest.TestCase):
         self.protocol_handler.run_once()
         self.plugin.return_value.before_upstream_connection.assert_called()
         mock_server_conn.assert_not_called()
+
+    @mock.patch('proxy.http.proxy.TcpServerConnection')
+    def test_proxy_plugin_stops_reading_above_high_watermark(
+            self,
+            mock_server_conn: mock.Mock) -> None:
+        self.plugin.return_value.before_upstream_connection.side_effect = lambda r: r
+        self.plugin.return_value.handle_client_request.side_effect = lambda r: r
+        server = mock_server_conn.return_value
+        server.closed = False
+        server.paused = False
+
+        self._conn.recv.return_value = build_http_request(
+            b'GET', b'http://upstream.host/not-found.html',
+            headers={
+                b'Host': b'upstream.host'
+            })
+        self.mock_selector.return_value.select.side_effect = [
+            [(selectors.SelectorKey(
+                fileobj=self._conn,
+                fd=self._conn.fileno,
+                events=selectors.EVENT_READ,
+                data=None), selectors.EVENT_READ)], ]
+        self.protocol_handler.run_once()
+        server.set_watermarks.assert_called_with(
+            self.flags.high_watermark, self.flags.low_watermark)
+        events = self.protocol_handler.get_events()
+        self.assertEqual(events[self._conn], selectors.EVENT_READ)
+        self.assertTrue(events[server.connection] & selectors.EVENT_READ)
+
+        # Slow client, stop reading from server
+        self.protocol_handler.client.queue(b'x' * self.flags.high_watermark)
+        events = self.protocol_handler.get_events()
+        self.assertEqual(events[self._conn], selectors.EVENT_READ | selectors.EVENT_WRITE)
+        self.assertFalse(events[server.connection] & selectors.EVENT_READ)
+
+        # Slow server, stop reading from client
+        self.protocol_handler.client.consume(self.flags.high_watermark)
+        server.paused = True
+        events = self.protocol_handler.get_events()
+        self.assertNotIn(self._conn, events)
+        self.assertTrue(events[server.connection] & selectors.EVENT_READ)
+
+
+@unittest.skipUnless(splice_supported(), 'splice(2) is not supported')
+class TestHttpProxyPluginSplice(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.client, self.client_peer = socket.socketpair()
+        self.server, self.server_peer = socket.socketpair()
+        for sock in (self.client, self.server):
+            sock.setblocking(False)
+        self.flags = Flags(plugins={b'HttpProtocolHandlerPlugin': [HttpProxyPlugin]})
+        request = HttpParser(httpParserTypes.REQUEST_PARSER)
+        request.parse(build_http_request(
+            httpMethods.CONNECT, b'upstream.host:443',
+            headers={b'Host': b'upstream.host:443'}))
+        self.plugin = HttpProxyPlugin(
+            self.flags, TcpClientConnection(self.client, ('127.0.0.1', 54382)),
+            request, mock.MagicMock())
+        self.plugin.server = TcpServerConnection('upstream.host', 443, conn=self.server)
+
+    def tearDown(self) -> None:
+        self.plugin.on_client_connection_close()
+        for sock in (self.client, self.client_peer, self.server, self.server_peer):
+            sock.close()
+
+    def test_tunnel_is_spliced_once_buffers_are_flushed(self) -> None:
+        self.plugin.client.queue(HttpProxyPlugin.PROXY_TUNNEL_ESTABLISHED_RESPONSE_PKT)
+        self.assertEqual(self.plugin.get_descriptors(), ([self.server], []))
+        self.assertFalse(self.plugin.pause_client_reads())
+        self.plugin.client.flush()
+        self.client_peer.recv(1024)
+
+        self.assertEqual(self.plugin.get_descriptors(), ([self.client, self.server], []))
+        self.assertTrue(self.plugin.pause_client_reads())
+
+        self.client_peer.sendall(b'client hello')
+        self.server_peer.sendall(b'server hello')
+        self.assertFalse(self.plugin.read_from_descriptors([self.client, self.server]))
+        self.assertEqual(self.server_peer.recv(1024), b'client hello')
+        self.assertEqual(self.client_peer.recv(1024), b'server hello')
+        self.assertEqual(self.plugin.response.total_size, 12)
+
+        # Teardown once server closes
+        self.server_peer.close()
+        self.assertTrue(self.plugin.read_from_descriptors([self.server]))
+
+    def test_tunnel_is_not_spliced_when_plugins_inspect_data(self) -> None:
+        self.flags.plugins[b'HttpProxyBasePlugin'] = [mock.MagicMock()]
+        self.assertFalse(HttpProxyPlugin(
+            self.flags, self.plugin.client, self.plugin.request,
+            mock.MagicMock()).can_splice())
+        del self.flags.plugins[b'HttpProxyBasePlugin']
+        self.flags.plugins[b'HttpProtocolHandlerPlugin'].append(DevtoolsProtocolPlugin)
+        self.assertFalse(self.plugin.can_splice())
+        self.flags.plugins[b'HttpProtocolHandlerPlugin'].pop()
+        self.assertTrue(self.plugin.can_splice())
+        self.flags.disable_splice = True
+        self.assertFalse(self.plugin.can_splice())
+
+
+class TestHttpProxyPluginConnectionPool(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.client, self.client_peer = socket.socketpair()
+        self.server, self.server_peer = socket.socketpair()
+        self.server.setblocking(False)
+        self.flags = Flags(plugins={b'HttpProtocolHandlerPlugin': [HttpProxyPlugin]})
+        request = HttpParser(httpParserTypes.REQUEST_PARSER)
+        request.parse(build_http_request(
+            httpMethods.GET, b'http://upstream.host/',
+            headers={b'Host': b'upstream.host'}))
+        self.plugin = HttpProxyPlugin(
+            self.flags, TcpClientConnection(self.client, ('127.0.0.1', 54382)),
+            request, mock.MagicMock())
+        self.pool = ConnectionPool(max_idle_per_host=2, idle_ttl=30, stats=Stats('test'))
+        self.plugin.pool = self.pool
+        self.pool.release(('upstream.host', 80, False), self.server)
+
+    def tearDown(self) -> None:
+        for sock in (self.client, self.client_peer, self.server, self.server_peer):
+            sock.close()
+
+    def respond(self, response: bytes) -> None:
+        self.plugin.connect_upstream()
+        assert self.plugin.server is not None
+        self.assertIs(self.plugin.server.connection, self.server)
+        self.plugin.dispatch_request(self.plugin.request, self.plugin.request.build())
+        self.plugin.server.flush()
+        self.server_peer.sendall(response)
+        self.assertFalse(self.plugin.read_from_descriptors([self.server]))
+        self.plugin.on_client_connection_close()
+
+    def test_keep_alive_connection_is_released(self) -> None:
+        self.respond(build_http_response(
+            httpStatusCodes.OK, body=b'hello',
+            headers={b'Content-Length': b'5'}))
+        self.assertEqual(self.plugin.responses_completed, 1)
+        server = self.pool.acquire(('upstream.host', 80, False))
+        assert server is not None
+        self.assertIs(server.connection, self.server)
+
+    def test_connection_close_response_is_not_released(self) -> None:
+        self.respond(build_http_response(
+            httpStatusCodes.OK, body=b'hello',
+            headers={b'Content-Length': b'5', b'Connection': b'close'}))
+        self.assertIsNone(self.pool.acquire(('upstream.host', 80, False)))
+        self.assertEqual(self.server.fileno(), -1)
+
+
+class TestHttpProxyPluginNonBlockingConnect(unittest.TestCase):
+
+    def setUp(self) -> None:
+        isolate_stats(self)
+        self.client, self.client_peer = socket.socketpair()
+        self.client.setblocking(False)
+        self.listener = socket.socket()
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.listen(1)
+        netloc = b'127.0.0.1:%d' % self.listener.getsockname()[1]
+        self.flags = Flags(plugins={b'HttpProtocolHandlerPlugin': [HttpProxyPlugin]})
+        request = HttpParser(httpParserTypes.REQUEST_PARSER)
+        request.parse(build_http_request(
+            httpMethods.CONNECT, netloc, headers={b'Host': netloc}))
+        self.plugin = HttpProxyPlugin(
+            self.flags, TcpClientConnection(self.client, ('127.0.0.1', 54382)),
+            request, mock.MagicMock())
+
+    def tearDown(self) -> None:
+        self.plugin.on_client_connection_close()
+        for sock in (self.client, self.client_peer, self.listener):
+            sock.close()
+
+    def test_tunnel_is_established_once_connected(self) -> None:
+        self.assertFalse(self.plugin.on_request_complete())
+        server = self.plugin.server
+        assert server is not None
+        if server.connected:    # pragma: no cover
+            self.skipTest('Connected without waiting')
+        self.assertFalse(self.plugin.client.has_buffer())
+        self.assertIsNotNone(self.plugin.deadline())
+        attempts: List[Union[int, HasFileno]] = list(server.attempts)
+        self.assertEqual(self.plugin.get_descriptors(), ([], attempts))
+
+        select.select([], attempts, [], 1)
+        self.assertFalse(self.plugin.write_to_descriptors(attempts))
+        self.assertTrue(server.connected)
+        self.assertIsNone(self.plugin.deadline())
+        self.plugin.client.flush()
+        self.assertEqual(
+            self.client_peer.recv(1024),
+            HttpProxyPlugin.PROXY_TUNNEL_ESTABLISHED_RESPONSE_PKT)
+
+    @mock.patch('proxy.http.proxy.ClientSessionCache')
+    @mock.patch('proxy.http.proxy.InterceptionBypass.get')
+    def test_bypassed_tunnel_is_not_intercepted(
+            self,
+            mock_bypass: mock.Mock,
+            mock_sessions: mock.Mock) -> None:
+        mock_bypass.return_value = InterceptionBypass(['127.0.0.0/8'])
+        self.flags.ca_cert_file = 'ca-cert.pem'
+        self.flags.ca_key_file = 'ca-key.pem'
+        self.flags.ca_signing_key_file = 'ca-signing-key.pem'
+        self.plugin.stats = Stats.get('http-proxy')
+        self.assertFalse(self.plugin.on_request_complete())
+        self.assertFalse(self.plugin.intercept_tls)
+        with logged_stats() as logged:
+            Stats.report(1)
+        self.assertEqual(logged['http-proxy']['interception_bypassed'], 1)
+
+        server = self.plugin.server
+        assert server is not None
+        attempts: List[Union[int, HasFileno]] = list(server.attempts)
+        select.select([], attempts, [], 1)
+        self.plugin.write_to_descriptors(attempts)
+        self.assertTrue(server.connected)
+        mock_sessions.get.assert_not_called()
+        self.assertIsNone(self.plugin.interception)
+        self.plugin.client.flush()
+        self.assertEqual(
+            self.client_peer.recv(1024),
+            HttpProxyPlugin.PROXY_TUNNEL_ESTABLISHED_RESPONSE_PKT)
+
+    def test_buffer_stats_are_logged(self) -> None:
+        self.plugin.stats = Stats.get('http-proxy')
+        self.plugin.on_request_complete()
+        self.plugin.client.set_watermarks(16, 8)
+        self.plugin.client.queue(b'x' * 32)
+        self.plugin.client.consume(32)
+        self.plugin.on_client_connection_close()
+        with logged_stats() as logged:
+            Stats.report(1)
+        self.assertEqual(logged['http-proxy']['watermark_paused'], 1)
+        # Tunnel established response is queued too, if connected meanwhile
+        self.assertGreaterEqual(logged['http-proxy']['peak_buffer_bytes_p99'], 32)
+
+    def test_bad_gateway_on_connect_timeout(self) -> None:
+        self.plugin.on_request_complete()
+        self.assertFalse(self.plugin.is_inactive())
+        self.plugin.connect_deadline = time.time() - 1
+        self.assertTrue(self.plugin.is_inactive())
+        assert self.plugin.server is not None
+        self.assertTrue(self.plugin.server.closed)
+        self.plugin.client.flush()
+        self.assertTrue(self.client_peer.recv(1024).startswith(b'HTTP/1.1 502 Bad Gateway'))
@@ -28,25 +28,23 @@ from .utils import get_plugin_by_test_name
 
 class TestHttpProxyPluginExamplesWithTlsInterception(unittest.TestCase):
 
-    @mock.patch('ssl.wrap_socket')
-    @mock.patch('ssl.create_default_context')
+    @mock.patch('proxy.http.proxy.CertificateAuthority')
+    @mock.patch('proxy.http.proxy.ClientSessionCache')
     @mock.patch('proxy.http.proxy.TcpServerConnection')
-    @mock.patch('subprocess.Popen')
     @mock.patch('selectors.DefaultSelector')
     @mock.patch('socket.fromfd')
     def setUp(self,
               mock_fromfd: mock.Mock,
               mock_selector: mock.Mock,
-              mock_popen: mock.Mock,
               mock_server_conn: mock.Mock,
-              mock_ssl_context: mock.Mock,
-              mock_ssl_wrap: mock.Mock) -> None:
+              mock_sessions: mock.Mock,
+              mock_ca: mock.Mock) -> None:
         self.mock_fromfd = mock_fromfd
         self.mock_selector = mock_selector
-        self.mock_popen = mock_popen
         self.mock_server_conn = mock_server_conn
-        self.mock_ssl_context = mock_ssl_context
-        self.mock_ssl_wrap = mock_ssl_wrap
+        self.mock_sessions = mock_sessions
+        self.mock_ca = mock_ca
+        self.mock_ssl_wrap = mock_ca.get.return_value.context.return_value.wrap_socket
 
         self.fileno = 10
         self._addr = ('127.0.0.1', 54382)
@@ -71,7 +69,7 @@ class TestHttpProxyPluginExamplesWithTlsInterception(unittest.TestCase):
         self.server = self.mock_server_conn.return_value
 
         self.server_ssl_connection = mock.MagicMock(spec=ssl.SSLSocket)
-        self.mock_ssl_context.return_value.wrap_socket.return_value = self.server_ssl_connection
+        self.mock_sessions.get.return_value.wrap.return_value = self.server_ssl_connection
         self.client_ssl_connection = mock.MagicMock(spec=ssl.SSLSocket)
         self.mock_ssl_wrap.return_value = self.client_ssl_connection
 
@@ -82,11 +80,12 @@ class TestHttpProxyPluginExamplesWithTlsInterception(unittest.TestCase):
             return not self.server.connect.called
 
         def mock_connection() -> Any:
-            if self.mock_ssl_context.return_value.wrap_socket.called:
+            if self.mock_sessions.get.return_value.wrap.called:
                 return self.server_ssl_connection
             return self._conn
 
         self.server.has_buffer.side_effect = has_buffer
+        self.server.handshake.return_value = 0
         type(self.server).closed = mock.PropertyMock(side_effect=closed)
         type(
             self.server).connection = mock.PropertyMock(
@@ -98,6 +97,11 @@ class TestHttpProxyPluginExamplesWithTlsInterception(unittest.TestCase):
                 fd=self._conn.fileno,
                 events=selectors.EVENT_READ,
                 data=None), selectors.EVENT_READ)],
+            [(selectors.SelectorKey(
+                fileobj=self._conn,
+                fd=self._conn.fileno,
+                events=selectors.EVENT_WRITE,
+                data=None), selectors.EVENT_WRITE)],
             [(selectors.SelectorKey(
                 fileobj=self.client_ssl_connection,
                 fd=self.client_ssl_connection.fileno,
@@ -123,8 +127,10 @@ class TestHttpProxyPluginExamplesWithTlsInterception(unittest.TestCase):
             httpMethods.CONNECT, b'uni.corn:443'
         )
         self.protocol_handler.run_once()
+        # Client handshake starts once tunnel established response is flushed
+        self.protocol_handler.run_once()
 
-        self.mock_popen.assert_called()
+        self.mock_ca.get.return_value.context.assert_called_once_with('uni.corn')
         self.mock_server_conn.assert_called_once_with('uni.corn', 443)
         self.server.connect.assert_called()
         self.assertEqual(
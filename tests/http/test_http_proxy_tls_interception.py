@@ -25,37 +25,35 @@ from proxy.common.flags import Flags
 
 class TestHttpProxyTlsInterception(unittest.TestCase):
 
-    @mock.patch('ssl.wrap_socket')
-    @mock.patch('ssl.create_default_context')
+    @mock.patch('proxy.http.proxy.CertificateAuthority')
+    @mock.patch('proxy.http.proxy.ClientSessionCache')
     @mock.patch('proxy.http.proxy.TcpServerConnection')
-    @mock.patch('subprocess.Popen')
     @mock.patch('selectors.DefaultSelector')
     @mock.patch('socket.fromfd')
     def test_e2e(
             self,
             mock_fromfd: mock.Mock,
             mock_selector: mock.Mock,
-            mock_popen: mock.Mock,
             mock_server_conn: mock.Mock,
-            mock_ssl_context: mock.Mock,
-            mock_ssl_wrap: mock.Mock) -> None:
+            mock_sessions: mock.Mock,
+            mock_ca: mock.Mock) -> None:
         host, port = uuid.uuid4().hex, 443
         netloc = '{0}:{1}'.format(host, port)
 
         self.mock_fromfd = mock_fromfd
         self.mock_selector = mock_selector
-        self.mock_popen = mock_popen
         self.mock_server_conn = mock_server_conn
-        self.mock_ssl_context = mock_ssl_context
-        self.mock_ssl_wrap = mock_ssl_wrap
+        self.mock_sessions = mock_sessions
+        self.mock_ca = mock_ca
+        self.mock_ssl_wrap = mock_ca.get.return_value.context.return_value.wrap_socket
 
         ssl_connection = mock.MagicMock(spec=ssl.SSLSocket)
-        self.mock_ssl_context.return_value.wrap_socket.return_value = ssl_connection
+        self.mock_sessions.get.return_value.wrap.return_value = ssl_connection
         self.mock_ssl_wrap.return_value = mock.MagicMock(spec=ssl.SSLSocket)
         plain_connection = mock.MagicMock(spec=socket.socket)
 
         def mock_connection() -> Any:
-            if self.mock_ssl_context.return_value.wrap_socket.called:
+            if self.mock_sessions.get.return_value.wrap.called:
                 return ssl_connection
             return plain_connection
 
@@ -76,6 +74,7 @@ class TestHttpProxyTlsInterception(unittest.TestCase):
             b'HttpProxyBasePlugin': [self.proxy_plugin],
         }
         self._conn = mock_fromfd.return_value
+        self._conn.send.side_effect = lambda data: len(data)
         self.protocol_handler = HttpProtocolHandler(
             self.fileno, self._addr, flags=self.flags)
         self.protocol_handler.initialize()
@@ -104,16 +103,33 @@ class TestHttpProxyTlsInterception(unittest.TestCase):
         self.plugin.return_value.on_request_complete.return_value = False
         self.plugin.return_value.on_response_chunk.side_effect = lambda chunk: chunk
         self.plugin.return_value.on_client_connection_close.return_value = None
+        self.plugin.return_value.pause_client_reads.return_value = False
+        self.plugin.return_value.deadline.return_value = None
+        self.plugin.return_value.is_inactive.return_value = False
 
         # Prepare mocked HttpProxyBasePlugin
         self.proxy_plugin.return_value.before_upstream_connection.side_effect = lambda r: r
         self.proxy_plugin.return_value.handle_client_request.side_effect = lambda r: r
 
+        self.mock_server_conn.return_value.addr = (host, port)
+        # Upstream handshake waits for server to respond once
+        self.mock_server_conn.return_value.handshake.side_effect = [selectors.EVENT_READ, 0]
+
         self.mock_selector.return_value.select.side_effect = [
             [(selectors.SelectorKey(
                 fileobj=self._conn,
                 fd=self._conn.fileno,
                 events=selectors.EVENT_READ,
+                data=None), selectors.EVENT_READ)],
+            [(selectors.SelectorKey(
+                fileobj=self._conn,
+                fd=self._conn.fileno,
+                events=selectors.EVENT_WRITE,
+                data=None), selectors.EVENT_WRITE)],
+            [(selectors.SelectorKey(
+                fileobj=ssl_connection,
+                fd=ssl_connection.fileno,
+                events=selectors.EVENT_READ,
                 data=None), selectors.EVENT_READ)], ]
         self.protocol_handler.run_once()
 
@@ -129,41 +145,53 @@ class TestHttpProxyTlsInterception(unittest.TestCase):
         self.proxy_plugin.return_value.handle_client_request.assert_called()
 
         self.mock_server_conn.assert_called_with(host, port)
-        self.mock_server_conn.return_value.connection.setblocking.assert_called_with(
-            False)
-
-        self.mock_ssl_context.assert_called_with(ssl.Purpose.SERVER_AUTH)
-        # self.assertEqual(self.mock_ssl_context.return_value.options,
-        # ssl.OP_NO_SSLv2 | ssl.OP_NO_SSLv3 | ssl.OP_NO_TLSv1 |
-        # ssl.OP_NO_TLSv1_1)
-        self.assertEqual(plain_connection.setblocking.call_count, 2)
-        self.mock_ssl_context.return_value.wrap_socket.assert_called_with(
-            plain_connection, server_hostname=host)
-        # TODO: Assert Popen arguments, piping, success condition
-        self.assertEqual(self.mock_popen.call_count, 2)
-        self.assertEqual(ssl_connection.setblocking.call_count, 1)
+
+        self.mock_sessions.get.assert_called_with(self.flags)
+        # Upstream socket is already non-blocking after connect and
+        # handshakes never switch connections to blocking mode
+        plain_connection.setblocking.assert_not_called()
+        ssl_connection.setblocking.assert_not_called()
+        self.mock_sessions.get.return_value.wrap.assert_called_with(
+            plain_connection, (host, port))
         self.assertEqual(
             self.mock_server_conn.return_value._conn,
             ssl_connection)
+
+        # Client reads are paused while upstream handshake waits for server
+        proxy = self.protocol_handler.plugins['HttpProxyPlugin']
+        self.assertTrue(proxy.pause_client_reads())
+        self.assertEqual(proxy.get_descriptors(), ([ssl_connection], []))
+        self.assertEqual(
+            self.protocol_handler.get_events(),
+            {self._conn: selectors.EVENT_WRITE, ssl_connection: selectors.EVENT_READ})
+
+        # Tunnel established response is flushed, client handshake
+        # awaits completion of upstream handshake
+        self.protocol_handler.run_once()
         self._conn.send.assert_called_with(
             HttpProxyPlugin.PROXY_TUNNEL_ESTABLISHED_RESPONSE_PKT)
-        assert self.flags.ca_cert_dir is not None
+        self.mock_ssl_wrap.assert_not_called()
+        self.mock_sessions.get.return_value.handshake_completed.assert_not_called()
+
+        # Upstream handshake completes, client handshake follows
+        self.protocol_handler.run_once()
+        self.mock_sessions.get.return_value.handshake_completed.assert_called_once_with(
+            ssl_connection, (host, port))
+        self.mock_ca.get.assert_called_with(self.flags)
+        self.mock_ca.get.return_value.context.assert_called_once_with(host)
         self.mock_ssl_wrap.assert_called_with(
             self._conn,
             server_side=True,
-            keyfile=self.flags.ca_signing_key_file,
-            certfile=HttpProxyPlugin.generated_cert_file_path(
-                self.flags.ca_cert_dir, host)
+            do_handshake_on_connect=False,
         )
-        self.assertEqual(self._conn.setblocking.call_count, 2)
+        self.mock_ssl_wrap.return_value.do_handshake.assert_called_once()
+        self.assertEqual(self._conn.setblocking.call_count, 1)
+        self.assertFalse(proxy.pause_client_reads())
         self.assertEqual(
             self.protocol_handler.client.connection,
             self.mock_ssl_wrap.return_value)
 
         # Assert connection references for all other plugins is updated
-        self.assertEqual(
-            self.plugin.return_value.client._conn,
-            self.mock_ssl_wrap.return_value)
         self.assertEqual(
             self.proxy_plugin.return_value.client._conn,
             self.mock_ssl_wrap.return_value)
@@ -8,7 +8,9 @@
     :license: BSD, see LICENSE for more details.
 """
 import unittest
+import select
 import selectors
+import socket
 import base64
 
 from typing import cast
@@ -149,7 +151,10 @@ class TestHttpProtocolHandler(unittest.TestCase):
         self.assertEqual(server.queue.call_count, 1)
         server.flush.assert_called_once()
 
-    def test_proxy_connection_failed(self) -> None:
+    @mock.patch('socket.getaddrinfo')
+    def test_proxy_connection_failed(self, mock_getaddrinfo: mock.Mock) -> None:
+        mock_getaddrinfo.side_effect = socket.gaierror(
+            socket.EAI_NONAME, 'Name or service not known')
         self.mock_selector_for_client_read(self.mock_selector)
         self._conn.recv.return_value = CRLF.join([
             b'GET http://unknown.domain HTTP/1.1',
@@ -157,6 +162,21 @@ class TestHttpProtocolHandler(unittest.TestCase):
             CRLF
         ])
         self.protocol_handler.run_once()
+        self.assertFalse(self.protocol_handler.client.has_buffer())
+
+        # Upstream name is resolved off the event loop
+        plugin = cast(HttpProxyPlugin, self.protocol_handler.plugins['HttpProxyPlugin'])
+        assert plugin.server is not None and plugin.server.lookup is not None
+        reader = plugin.server.lookup.reader
+        assert reader is not None
+        select.select([reader], [], [], 1)
+        self.mock_selector.return_value.select.return_value = [(
+            selectors.SelectorKey(
+                fileobj=reader,
+                fd=reader.fileno(),
+                events=selectors.EVENT_READ,
+                data=None), selectors.EVENT_READ), ]
+        self.assertTrue(self.protocol_handler.run_once())
         self.assertEqual(
             self.protocol_handler.client.buffer,
             ProxyConnectionFailed.RESPONSE_PKT)
@@ -275,6 +295,35 @@ class TestHttpProtocolHandler(unittest.TestCase):
         self.protocol_handler.run_once()
         server.flush.assert_called_once()
 
+    def test_deadline_follows_last_activity(self) -> None:
+        self.protocol_handler.last_activity = 1000
+        self.assertEqual(
+            self.protocol_handler.deadline(), 1000 + self.flags.timeout)
+
+    def test_passed_deadline_does_not_busy_loop(self) -> None:
+        # Client stopped reading its buffered response long ago
+        self.protocol_handler.client.queue(b'HTTP/1.1 200 OK\r\n')
+        self.protocol_handler.last_activity = 1000
+        self.mock_selector.return_value.select.return_value = []
+        self.assertFalse(self.protocol_handler.is_inactive())
+        self.assertFalse(self.protocol_handler.run_once())
+        self.mock_selector.return_value.select.assert_called_once_with(timeout=1.0)
+
+    def test_response_chunks_are_passed_to_plugins_once(self) -> None:
+        plugin = mock.MagicMock()
+        self.protocol_handler.plugins = {'mock': plugin}
+        # Client accepts at most 4 bytes per write
+        self._conn.send.side_effect = lambda data: min(len(data), 4)
+        self._conn.sendmsg.side_effect = lambda buffers: min(sum(len(b) for b in buffers), 4)
+        self.protocol_handler.client.queue(b'hello ')
+        self.protocol_handler.client.queue(b'world')
+        self.assertFalse(self.protocol_handler.handle_writables([self._conn]))
+        self.protocol_handler.client.queue(b'!')
+        while self.protocol_handler.client.has_buffer():
+            self.assertFalse(self.protocol_handler.handle_writables([self._conn]))
+        self.assertEqual(plugin.on_response_chunk.call_args_list, [
+            mock.call(b'hello world'), mock.call(b'!')])
+
     def mock_selector_for_client_read_read_server_write(
             self, mock_selector: mock.Mock, server: mock.Mock) -> None:
         mock_selector.return_value.select.side_effect = [
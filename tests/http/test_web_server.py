@@ -127,6 +127,7 @@ class TestWebServerPlugin(unittest.TestCase):
             f.write(html_file_content)
 
         self._conn = mock_fromfd.return_value
+        self._conn.send.side_effect = lambda data: len(data)
         self._conn.recv.return_value = build_http_request(
             b'GET', b'/index.html')
 
@@ -173,6 +174,7 @@ class TestWebServerPlugin(unittest.TestCase):
             mock_fromfd: mock.Mock,
             mock_selector: mock.Mock) -> None:
         self._conn = mock_fromfd.return_value
+        self._conn.send.side_effect = lambda data: len(data)
         self._conn.recv.return_value = build_http_request(
             b'GET', b'/not-found.html')
 
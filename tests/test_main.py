@@ -26,6 +26,17 @@ from proxy.common.constants import DEFAULT_CA_CERT_FILE, DEFAULT_CA_KEY_FILE, DE
 from proxy.common.constants import DEFAULT_PAC_FILE, DEFAULT_PLUGINS, DEFAULT_PID_FILE, DEFAULT_PORT
 from proxy.common.constants import DEFAULT_NUM_WORKERS, DEFAULT_OPEN_FILE_LIMIT, DEFAULT_IPV6_HOSTNAME
 from proxy.common.constants import DEFAULT_SERVER_RECVBUF_SIZE, DEFAULT_CLIENT_RECVBUF_SIZE
+from proxy.common.constants import DEFAULT_REUSE_PORT, DEFAULT_ACCEPT_BATCH_SIZE, DEFAULT_STATS_INTERVAL
+from proxy.common.constants import DEFAULT_LOCAL_EXECUTOR, DEFAULT_THREADLESS_LOOPS, DEFAULT_DISPATCH_POLICY
+from proxy.common.constants import DEFAULT_ASYNCIO, DEFAULT_EVENT_LOOP_POLICY
+from proxy.common.constants import DEFAULT_THREAD_POOL_SIZE, DEFAULT_THREAD_POOL_MAX_INFLIGHT, DEFAULT_THREAD_POOL_QUEUE_SIZE
+from proxy.common.constants import DEFAULT_THREAD_STACK_SIZE, DEFAULT_HIGH_WATERMARK, DEFAULT_LOW_WATERMARK
+from proxy.common.constants import DEFAULT_DISABLE_SPLICE, DEFAULT_POOL_IDLE_TTL, DEFAULT_POOL_MAX_IDLE_PER_HOST
+from proxy.common.constants import DEFAULT_CONNECT_TIMEOUT
+from proxy.common.constants import DEFAULT_DNS_CACHE_TTL, DEFAULT_DNS_NEGATIVE_CACHE_TTL, DEFAULT_DNS_RESOLVER_THREADS
+from proxy.common.constants import DEFAULT_CA_CERT_CACHE_SIZE, DEFAULT_CA_CERT_WARM_UP_FILE, DEFAULT_CA_CERT_WILDCARD
+from proxy.common.constants import DEFAULT_UPSTREAM_TLS_SESSION_CACHE_SIZE, DEFAULT_UPSTREAM_TLS_SESSION_TTL
+from proxy.common.constants import DEFAULT_TLS_INTERCEPTION_BYPASS_FILE
 from proxy.common.constants import COMMA
 from proxy.common.version import __version__
 
@@ -44,6 +55,7 @@ class TestMain(unittest.TestCase):
         mock_args.ca_key_file = DEFAULT_CA_KEY_FILE
         mock_args.ca_cert_file = DEFAULT_CA_CERT_FILE
         mock_args.ca_signing_key_file = DEFAULT_CA_SIGNING_KEY_FILE
+        mock_args.ca_cert_warm_up_file = DEFAULT_CA_CERT_WARM_UP_FILE
         mock_args.pid_file = DEFAULT_PID_FILE
         mock_args.log_file = DEFAULT_LOG_FILE
         mock_args.log_level = DEFAULT_LOG_LEVEL
@@ -66,6 +78,32 @@ class TestMain(unittest.TestCase):
         mock_args.timeout = DEFAULT_TIMEOUT
         mock_args.threadless = DEFAULT_THREADLESS
         mock_args.enable_events = DEFAULT_ENABLE_EVENTS
+        mock_args.reuse_port = DEFAULT_REUSE_PORT
+        mock_args.accept_batch_size = DEFAULT_ACCEPT_BATCH_SIZE
+        mock_args.stats_interval = DEFAULT_STATS_INTERVAL
+        mock_args.local_executor = DEFAULT_LOCAL_EXECUTOR
+        mock_args.threadless_loops = DEFAULT_THREADLESS_LOOPS
+        mock_args.dispatch_policy = DEFAULT_DISPATCH_POLICY
+        mock_args.asyncio = DEFAULT_ASYNCIO
+        mock_args.event_loop_policy = DEFAULT_EVENT_LOOP_POLICY
+        mock_args.thread_pool_size = DEFAULT_THREAD_POOL_SIZE
+        mock_args.thread_pool_max_inflight = DEFAULT_THREAD_POOL_MAX_INFLIGHT
+        mock_args.thread_pool_queue_size = DEFAULT_THREAD_POOL_QUEUE_SIZE
+        mock_args.thread_stack_size = DEFAULT_THREAD_STACK_SIZE
+        mock_args.high_watermark = DEFAULT_HIGH_WATERMARK
+        mock_args.low_watermark = DEFAULT_LOW_WATERMARK
+        mock_args.disable_splice = DEFAULT_DISABLE_SPLICE
+        mock_args.pool_max_idle_per_host = DEFAULT_POOL_MAX_IDLE_PER_HOST
+        mock_args.pool_idle_ttl = DEFAULT_POOL_IDLE_TTL
+        mock_args.connect_timeout = DEFAULT_CONNECT_TIMEOUT
+        mock_args.dns_cache_ttl = DEFAULT_DNS_CACHE_TTL
+        mock_args.dns_negative_cache_ttl = DEFAULT_DNS_NEGATIVE_CACHE_TTL
+        mock_args.dns_resolver_threads = DEFAULT_DNS_RESOLVER_THREADS
+        mock_args.ca_cert_cache_size = DEFAULT_CA_CERT_CACHE_SIZE
+        mock_args.ca_cert_wildcard = DEFAULT_CA_CERT_WILDCARD
+        mock_args.upstream_tls_session_cache_size = DEFAULT_UPSTREAM_TLS_SESSION_CACHE_SIZE
+        mock_args.upstream_tls_session_ttl = DEFAULT_UPSTREAM_TLS_SESSION_TTL
+        mock_args.tls_interception_bypass_file = DEFAULT_TLS_INTERCEPTION_BYPASS_FILE
 
     @mock.patch('time.sleep')
     @mock.patch('proxy.main.load_plugins')
@@ -125,6 +163,32 @@ class TestMain(unittest.TestCase):
             timeout=DEFAULT_TIMEOUT,
             threadless=DEFAULT_THREADLESS,
             enable_events=DEFAULT_ENABLE_EVENTS,
+            reuse_port=DEFAULT_REUSE_PORT,
+            accept_batch_size=DEFAULT_ACCEPT_BATCH_SIZE,
+            stats_interval=DEFAULT_STATS_INTERVAL,
+            local_executor=DEFAULT_LOCAL_EXECUTOR,
+            threadless_loops=DEFAULT_THREADLESS_LOOPS,
+            dispatch_policy=DEFAULT_DISPATCH_POLICY,
+            asyncio=DEFAULT_ASYNCIO,
+            event_loop_policy=DEFAULT_EVENT_LOOP_POLICY,
+            thread_pool_size=DEFAULT_THREAD_POOL_SIZE,
+            thread_pool_max_inflight=DEFAULT_THREAD_POOL_MAX_INFLIGHT,
+            thread_pool_queue_size=DEFAULT_THREAD_POOL_QUEUE_SIZE,
+            thread_stack_size=DEFAULT_THREAD_STACK_SIZE,
+            high_watermark=DEFAULT_HIGH_WATERMARK,
+            low_watermark=DEFAULT_LOW_WATERMARK,
+            disable_splice=DEFAULT_DISABLE_SPLICE,
+            pool_max_idle_per_host=DEFAULT_POOL_MAX_IDLE_PER_HOST,
+            pool_idle_ttl=DEFAULT_POOL_IDLE_TTL,
+            connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+            dns_cache_ttl=DEFAULT_DNS_CACHE_TTL,
+            dns_negative_cache_ttl=DEFAULT_DNS_NEGATIVE_CACHE_TTL,
+            dns_resolver_threads=DEFAULT_DNS_RESOLVER_THREADS,
+            ca_cert_cache_size=DEFAULT_CA_CERT_CACHE_SIZE,
+            ca_cert_wildcard=DEFAULT_CA_CERT_WILDCARD,
+            upstream_tls_session_cache_size=DEFAULT_UPSTREAM_TLS_SESSION_CACHE_SIZE,
+            upstream_tls_session_ttl=DEFAULT_UPSTREAM_TLS_SESSION_TTL,
+            tls_interception_bypass_file=DEFAULT_TLS_INTERCEPTION_BYPASS_FILE,
         )
         mock_acceptor_pool.assert_called_with(
             flags=mock_protocol_config.return_value,
@@ -163,6 +227,71 @@ class TestMain(unittest.TestCase):
         mock_exists.assert_called_with(pid_file)
         mock_remove.assert_called_with(pid_file)
 
+    @mock.patch('time.sleep')
+    @mock.patch('proxy.main.CertificateAuthority')
+    @mock.patch('proxy.main.Flags')
+    @mock.patch('proxy.main.AcceptorPool')
+    def test_ca_certificates_warm_up(
+            self,
+            mock_acceptor_pool: mock.Mock,
+            mock_protocol_config: mock.Mock,
+            mock_ca: mock.Mock,
+            mock_sleep: mock.Mock) -> None:
+        mock_sleep.side_effect = KeyboardInterrupt()
+        with tempfile.NamedTemporaryFile('w', suffix='.txt') as hosts:
+            hosts.write('# Deployed services\nexample.com\n\n10.0.0.1\n')
+            hosts.flush()
+            main(['--ca-key-file', 'ca-key.pem', '--ca-cert-file', 'ca-cert.pem',
+                  '--ca-signing-key-file', 'ca-signing-key.pem', '--ca-cert-warm-up-file', hosts.name])
+        mock_ca.get.assert_called_once_with(mock_protocol_config.return_value)
+        mock_ca.get.return_value.warm_up.assert_called_once_with(['example.com', '10.0.0.1'])
+        mock_acceptor_pool.return_value.setup.assert_called()
+
+    @mock.patch('time.sleep')
+    @mock.patch('proxy.main.InterceptionBypass')
+    @mock.patch('proxy.main.Flags')
+    @mock.patch('proxy.main.AcceptorPool')
+    def test_tls_interception_bypass_is_compiled_before_workers(
+            self,
+            mock_acceptor_pool: mock.Mock,
+            mock_protocol_config: mock.Mock,
+            mock_bypass: mock.Mock,
+            mock_sleep: mock.Mock) -> None:
+        mock_sleep.side_effect = KeyboardInterrupt()
+        manager = mock.Mock()
+        manager.attach_mock(mock_bypass.get, 'bypass')
+        manager.attach_mock(mock_acceptor_pool, 'acceptor_pool')
+        main(['--tls-interception-bypass-file', 'bypass.txt'])
+        self.assertEqual(
+            [name for name, _, _ in manager.mock_calls][:2],
+            ['bypass', 'acceptor_pool'])
+        mock_bypass.get.assert_called_once_with(mock_protocol_config.return_value)
+
+    @mock.patch('time.sleep')
+    @mock.patch('proxy.main.logger')
+    @mock.patch('proxy.main.HAS_CRYPTOGRAPHY', False)
+    @mock.patch('proxy.main.Flags')
+    @mock.patch('proxy.main.AcceptorPool')
+    def test_warns_when_certificates_are_signed_using_openssl(
+            self,
+            mock_acceptor_pool: mock.Mock,
+            mock_protocol_config: mock.Mock,
+            mock_logger: mock.Mock,
+            mock_sleep: mock.Mock) -> None:
+        mock_sleep.side_effect = KeyboardInterrupt()
+        main(['--ca-key-file', 'ca-key.pem', '--ca-cert-file', 'ca-cert.pem',
+              '--ca-signing-key-file', 'ca-signing-key.pem'])
+        mock_logger.warning.assert_called_once()
+        self.assertIn('openssl command', mock_logger.warning.call_args[0][0])
+
+    @mock.patch('builtins.print')
+    def test_ca_certificates_warm_up_requires_tls_interception(
+            self,
+            mock_print: mock.Mock) -> None:
+        with self.assertRaises(SystemExit):
+            main(['--ca-cert-warm-up-file', 'hosts.txt'])
+        mock_print.assert_called_with('--ca-cert-warm-up-file requires TLS interception to be enabled.')
+
     @mock.patch('time.sleep')
     @mock.patch('proxy.main.Flags')
     @mock.patch('proxy.main.AcceptorPool')
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+    proxy.py
+    ~~~~~~~~
+    ⚡⚡⚡ Fast, Lightweight, Programmable Proxy Server in a single Python file.
+
+    :copyright: (c) 2013-present by Abhinav Singh and contributors.
+    :license: BSD, see LICENSE for more details.
+"""
+import json
+import unittest
+import contextlib
+from typing import Any, Dict, Generator
+from unittest import mock
+
+from proxy.core.stats import Stats
+
+
+def isolate_stats(test: unittest.TestCase) -> None:
+    """Starts test with an empty per-process Stats registry, which is due
+    for report.  Registry and report time are restored once test finishes.
+
+    Invoke from setUp."""
+    for patcher in (mock.patch.dict(Stats.registry, clear=True),
+                    mock.patch.object(Stats, 'last_report', 0)):
+        patcher.start()
+        test.addCleanup(patcher.stop)
+
+
+@contextlib.contextmanager
+def logged_stats() -> Generator[Dict[str, Dict[str, Any]], None, None]:
+    """Collects snapshots logged by Stats.report within the block, by name."""
+    logged: Dict[str, Dict[str, Any]] = {}
+    with mock.patch('proxy.core.stats.logger') as mock_logger:
+        yield logged
+    for args, _ in mock_logger.info.call_args_list:
+        logged[args[1]] = json.loads(args[2])